@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CLI 冷启动基准测试
+
+基于 python -X importtime 统计 main.py 各轻量命令的启动耗时与导入开销最大的模块，
+用于确认重量级依赖（openai / pandas / matplotlib / seaborn / embedchain）没有在启动时被导入。
+run 命令另外测量发出第一个请求之前的启动路径：导入 main、解析方法注册表并导入方法模块（不创建实例、不联网）。
+
+用法：
+    python bench_startup.py              # 默认预算 1 秒
+    python bench_startup.py --budget 0.5 --top 15
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent
+MAIN = str(PROJECT_ROOT / "main.py")
+
+# 需要测量的命令行
+COMMANDS = [
+    ["--help"],
+    ["run", "--help"],
+    ["evaluate", "--help"],
+    ["plot", "--help"],
+    ["serve", "--help"],
+]
+
+# run 命令的启动路径：显示名 -> 方法名
+RUN_PATHS = {
+    "run --method light_rag": "light_rag",
+}
+
+# 启动阶段不应出现的重量级模块
+HEAVY_MODULES = ["openai", "pandas", "numpy", "matplotlib", "seaborn", "embedchain", "requests"]
+
+
+def run_path_code(method: str) -> str:
+    """模拟 main.py run --method <method> 在创建方法实例之前的导入过程"""
+    return (f"import sys; sys.path.insert(0, {str(PROJECT_ROOT)!r}); import main; "
+            f"from methods import get_method_class; get_method_class({method!r})")
+
+
+def measure(argv, repeat: int = 3):
+    """运行命令若干次（argv 为 python -X importtime 之后的参数），返回 (最短墙钟时间, 导入耗时列表[(模块, 累计微秒)])"""
+    best = None
+    imports = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", *argv],
+                              capture_output=True, text=True, cwd=PROJECT_ROOT)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+            imports = parse_importtime(proc.stderr)
+    return best, imports
+
+
+def parse_importtime(stderr: str):
+    """解析 -X importtime 输出，返回 [(模块名(保留缩进表示层级), 累计微秒)]"""
+    result = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|", 2)
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        # 模块名前固定有一个空格，其余缩进表示导入层级
+        result.append((parts[2][1:], int(parts[1])))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="main.py 冷启动基准测试")
+    parser.add_argument("--budget", type=float, default=1.0, help="每条命令允许的最长启动时间（秒）")
+    parser.add_argument("--top", type=int, default=10, help="显示导入耗时最多的模块数")
+    parser.add_argument("--repeat", type=int, default=3, help="每条命令重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    targets = [(f"main.py {' '.join(argv)}", [MAIN, *argv]) for argv in COMMANDS]
+    targets += [(f"main.py {label}（启动路径）", ["-c", run_path_code(method)]) for label, method in RUN_PATHS.items()]
+
+    failed = False
+    for label, argv in targets:
+        elapsed, imports = measure(argv, args.repeat)
+        loaded = {name.strip() for name, _ in imports}
+        heavy = [m for m in HEAVY_MODULES if m in loaded]
+        status = "✓" if elapsed <= args.budget and not heavy else "✗"
+        failed |= status == "✗"
+
+        print(f"\n{status} {label}: {elapsed * 1000:.0f} ms (预算 {args.budget * 1000:.0f} ms)")
+        if heavy:
+            print(f"  启动时导入了重量级模块: {', '.join(heavy)}")
+        # 只统计顶层导入（缩进最少的行）
+        top_level = [(name, us) for name, us in imports if not name.startswith("  ")]
+        for name, us in sorted(top_level, key=lambda x: -x[1])[:args.top]:
+            print(f"  {us / 1000:8.1f} ms  {name.strip()}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
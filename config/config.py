@@ -4,7 +4,7 @@
 import os
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Callable, List, Optional, Tuple
 
 # 项目根目录
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -46,6 +46,18 @@ class PathConfig:
 
     # 数据库目录（Naive RAG）
     db_dir: Path = field(default_factory=lambda: PROJECT_ROOT / "data" / "db")
+    # 文档导入清单：记录每个文档的哈希与分块 ID，增量导入时只处理变化的文档
+    ingest_manifest: Path = field(default_factory=lambda: PROJECT_ROOT / "data" / "db" / "ingest_manifest.json")
+    # 内存映射索引快照（Naive RAG 只读快速通路）
+    snapshot_file: Path = field(default_factory=lambda: PROJECT_ROOT / "data" / "naive_rag.snapshot")
+    # 多 worker 共享的任务队列（main.py worker）
+    queue_file: Path = field(default_factory=lambda: PROJECT_ROOT / "output" / "tasks.sqlite3")
+    # 参数扫描（main.py sweep）的索引、各配置点的回答与汇总表
+    sweep_dir: Path = field(default_factory=lambda: PROJECT_ROOT / "output" / "sweep")
+    # 结果文件上下文存储：知识库文档副本与去重的上下文片段
+    context_store_dir: Path = field(default_factory=lambda: PROJECT_ROOT / "output" / "contexts")
+    # 本地评分代理模型（main.py surrogate）
+    surrogate_model: Path = field(default_factory=lambda: PROJECT_ROOT / "output" / "judge_surrogate.json")
 
     def ensure_dirs(self):
         """确保所有目录存在"""
@@ -70,15 +82,20 @@ class EmbedchainConfig:
     collection_name: str = "orchard-pest-rag"
     batch_size: int = 10  # DashScope 限制
 
-    def to_dict(self, db_path: str) -> dict:
-        """转换为 Embedchain 配置字典"""
+    number_documents: int = 3  # 生成答案时使用（并记录为上下文）的分块数（与 embedchain 默认一致）
+    use_snapshot: bool = True  # 存在索引快照时直接使用快照检索，跳过 embedchain 初始化
+    prefetch_embeddings: bool = False  # 快照通路：处理测试集前按块批量 embedding 问题并一次性完成检索
+    embed_batch_size: int = 10  # 单次 embedding 请求的最大文本数（DashScope 限制为 10）
+
+    def to_dict(self, db_path: str, max_tokens: int = None) -> dict:
+        """转换为 Embedchain 配置字典（max_tokens 为空时使用 llm_max_tokens）"""
         return {
             'llm': {
                 'provider': 'openai',
                 'config': {
                     'model': self.llm_model,
                     'temperature': self.llm_temperature,
-                    'max_tokens': self.llm_max_tokens,
+                    'max_tokens': max_tokens or self.llm_max_tokens,
                     'top_p': 1,
                     'stream': False,
                 }
@@ -106,6 +123,36 @@ class EmbedchainConfig:
         }
 
 
+@dataclass
+class LengthBudgetConfig:
+    """回答长度预算：将字数限制换算为生成 token 上限，避免生成大量随后被丢弃的内容"""
+    enabled: bool = True
+    tokens_per_char: float = 1.0  # 中文约 0.6~1 token/字，取偏大值
+    headroom: float = 1.5  # 余量系数，模型略超字数时不至于被截断
+    min_tokens: int = 64
+    max_tokens: int = 1000  # 上限（与原 embedchain llm_max_tokens 一致）
+    # 写入 Naive RAG 问答模板（问题之后一行）的字数提示，不改动用于检索的问题
+    length_hint: str = "（回答不超过 {max_chars} 字）"
+    # LightRAG 查询的 response_type（写入 LightRAG 生成提示词的回答格式要求）
+    lightrag_response_type: str = "单段回答，不超过 {max_chars} 字"
+
+    def max_tokens_for(self, max_chars: int) -> int:
+        """字数限制对应的 max_tokens，未启用时统一使用上限"""
+        if not self.enabled:
+            return self.max_tokens
+        tokens = int(max_chars * self.tokens_per_char * self.headroom)
+        return max(self.min_tokens, min(self.max_tokens, tokens))
+
+
+@dataclass
+class IngestConfig:
+    """知识库文档导入配置（Naive RAG，main.py ingest）"""
+    patterns: Tuple[str, ...] = ("*.txt", "*.md")  # documents_dir 下递归匹配的文档
+    encodings: Tuple[str, ...] = ("utf-8", "gb18030")  # 依次尝试的文本编码
+    workers: int = 0  # 解析 / 清洗 / 分块的进程数，0 表示 CPU 核数
+    embed_workers: int = 4  # 并发 embedding 请求数
+
+
 @dataclass
 class LightRAGConfig:
     """LightRAG 配置"""
@@ -113,6 +160,180 @@ class LightRAGConfig:
     top_k: int = 5
     chunk_top_k: int = 5
 
+    request_timeout: float = 120.0  # 单个请求超时（秒）
+    question_deadline: float = 240.0  # 单题（答案 + 上下文）总时限（秒）
+    hedge: bool = False  # 是否启用对冲请求
+    hedge_quantile: float = 0.95  # 耗时超过该分位数时发出对冲请求
+    hedge_min_samples: int = 10  # 至少积累多少个样本后才启用对冲
+
+    pool_size: int = 64  # 连接池最大连接数
+    keepalive_expiry: float = 30.0  # 空闲长连接保活时长（秒）
+    http2: bool = False  # 是否启用 HTTP/2（改用 httpx，需安装 httpx[http2]）
+
+
+@dataclass
+class LocalMetricConfig:
+    """本地参考指标与自动评分配置"""
+    enabled: bool = True  # 是否计算本地指标并与评分结果一同保存
+    auto_score: bool = False  # 是否对平凡样本自动评分、跳过 LLM Judge（会影响 Faithfulness 等汇总分数，默认关闭）
+    verbatim_threshold: float = 0.95  # 字符 F1 与 ROUGE-L 均达到该值视为与标准答案几乎一致
+    # 与标准答案几乎一致的回答，还需有该比例以上的二元组能在检索上下文中找到才自动给满分，否则仍交给 LLM Judge
+    support_threshold: float = 0.9
+
+
+@dataclass
+class RetrievalMetricConfig:
+    """检索质量指标配置（evaluate --retrieval，无需 LLM）"""
+    ks: Tuple[int, ...] = (1, 3, 5)  # 计算 Recall@k / Precision@k 的 k
+    passage_size: int = 300  # 定位金标准段落时手册的切分长度（字符）
+    gold_threshold: float = 0.5  # 段落 / 上下文覆盖标准答案关键词的比例达到该值视为包含答案
+    min_gold_coverage: float = 0.3  # 没有段落达到阈值时，最佳段落至少需要的覆盖率
+    hit_threshold: float = 0.5  # 金标准段落有该比例的二元组出现在上下文中视为被检索到
+
+
+@dataclass
+class AdaptiveEvalConfig:
+    """序贯提前停止评测配置（evaluate --adaptive）"""
+    confidence: float = 0.95  # 排序结论的整体置信度
+    batch_size: int = 10  # 每批评分的题目数（每题评全部系统），每批后检查一次是否可以停止
+    min_pairs: int = 10  # 每对系统至少积累的配对样本数，之后才开始判断
+    tolerance: float = 0.5  # 差值置信区间落在 ±tolerance 内视为两系统持平
+    budget: int = 0  # 最多 LLM Judge 调用次数，0 表示不限
+    seed: int = 0  # 评分顺序的随机种子
+
+
+@dataclass
+class JudgeConfig:
+    """LLM Judge 请求配置"""
+    # 评语：full 完整评语 / short 限制字数的短评 / none 只输出分数（减少输出 token）
+    # 评语模式不同视为不同的评分 Prompt 版本，切换后已有评分缓存不再复用
+    reason: str = "full"
+    reason_chars: int = 30  # short 模式的评语字数上限
+
+
+@dataclass
+class SurrogateConfig:
+    """本地评分代理模型配置（main.py surrogate / evaluate --surrogate）"""
+    enabled: bool = False  # 评测时对代理模型足够确定的记录跳过 LLM Judge
+    coverage: float = 0.9  # 预测区间的目标覆盖率
+    max_width: float = 1.5  # 三个维度的区间半宽都不超过该值时采用代理评分
+    alpha: float = 1.0  # 岭回归正则化强度
+    folds: int = 5  # 校准区间的交叉验证折数
+    min_train: int = 50  # 训练所需的最少 LLM Judge 评分数
+    seed: int = 0
+    # 训练时是否用无法确定评分 Prompt 版本的历史评分（无缓存键、CSV、补写键的旧版记录），
+    # 按当前 Prompt 版本的评分对待；参与条数记入模型，评测时无需再次开启
+    include_legacy: bool = False
+
+
+@dataclass
+class ContextStoreConfig:
+    """结果文件上下文存储配置"""
+    # 结果文件中以引用（context_refs）代替上下文全文；存储目录不随仓库提交，结果文件需与其一同拷贝，默认关闭
+    enabled: bool = False
+    min_span: int = 32  # 不少于该长度的行才在知识库文档中查找原文，更短的行直接去重存储
+
+
+@dataclass
+class PlotConfig:
+    """绘图配置"""
+    dpi: int = 300
+    preview_dpi: int = 72  # 预览模式下的 DPI
+    workers: int = 4  # 并行渲染图表的进程数
+    n_boot: int = 1000  # bootstrap 置信区间重采样次数
+    ci: float = 95
+
+
+@dataclass
+class StatsConfig:
+    """统计分析配置"""
+    n_resamples: int = 10000  # bootstrap / 置换检验重采样次数
+    ci: float = 95
+    alpha: float = 0.05  # 显著性水平
+    seed: int = 0
+
+
+@dataclass
+class ServeConfig:
+    """服务模式配置（main.py serve）"""
+    host: str = "127.0.0.1"
+    port: int = 8765
+    max_batch: int = 8  # 单次批处理最多合并的请求数
+    batch_window_ms: int = 10  # 收集同批请求的等待窗口
+
+
+@dataclass
+class PipelineConfig:
+    """方法运行的检索 / 生成两阶段流水线配置"""
+    enabled: bool = False
+    retrieval_workers: int = 2
+    generation_workers: int = 4
+    queue_size: int = 8  # 检索结果队列容量，队列满时检索阶段等待（背压）
+    max_in_flight: int = 0  # 已领取但尚未按序产出的题目数上限（含重排缓冲），0 表示 queue_size + 两阶段线程数
+
+
+@dataclass
+class PersistConfig:
+    """持久化写入配置（组提交日志）"""
+    flush_every: int = 32  # 每累计 N 条记录提交一次
+    flush_interval_ms: int = 200  # 最长每隔 T 毫秒提交一次
+    fsync: bool = True  # 提交时是否 fsync
+
+    def log_kwargs(self) -> dict:
+        """转换为 GroupCommitLog 参数"""
+        return {
+            'flush_every': self.flush_every,
+            'flush_interval_ms': self.flush_interval_ms,
+            'fsync': self.fsync,
+        }
+
+
+@dataclass
+class TestsetConfig:
+    """测试集加载配置（支持 .json 数组与 .jsonl，流式读取）"""
+    question_field: str = "问题"  # 问题字段，支持 "a.b" 嵌套写法
+    answer_field: str = "标准答案"  # 标准答案字段
+    # 自定义映射函数 record -> (问题, 标准答案)，设置后优先于上面的字段名
+    mapping: Optional[Callable[[dict], Tuple[str, str]]] = None
+    chunk_size: int = 256  # 流式处理时每批预处理（如批量 embedding）的问题数
+
+
+@dataclass
+class SweepConfig:
+    """参数扫描配置（main.py sweep）"""
+    jobs: int = 4  # 同时运行的配置点数（索引构建同样按此并发）
+    seed: int = 0  # 随机搜索的随机种子
+
+
+@dataclass
+class WorkerConfig:
+    """多进程 / 多主机 worker 配置（main.py worker）"""
+    lease_seconds: float = 600.0  # 任务租约时长，超时未完成的任务可被其他 worker 接手
+    max_attempts: int = 3  # 单个任务最多尝试次数
+    poll_interval: float = 5.0  # 队列暂时为空（其他 worker 仍在执行）时的轮询间隔（秒）
+
+
+@dataclass
+class RetryConfig:
+    """外部调用（LLM、Judge、Embedding、LightRAG）的统一重试策略"""
+    max_attempts: int = 4  # 含首次调用在内的最多尝试次数
+    base_delay: float = 1.0  # 指数退避的初始等待（秒）
+    max_delay: float = 30.0  # 单次退避等待上限（秒），Retry-After 不受此限制
+    jitter: bool = True  # 全抖动：在 [0, 退避时间] 内随机等待，避免并发请求同时重试
+    breaker_threshold: int = 5  # 连续失败多少次后熔断
+    breaker_cooldown: float = 30.0  # 熔断后多久放行一次试探调用（秒）
+
+    def retry_kwargs(self) -> dict:
+        """转换为 Retrier 参数"""
+        return {
+            'max_attempts': self.max_attempts,
+            'base_delay': self.base_delay,
+            'max_delay': self.max_delay,
+            'jitter': self.jitter,
+            'breaker_threshold': self.breaker_threshold,
+            'breaker_cooldown': self.breaker_cooldown,
+        }
+
 
 @dataclass
 class Config:
@@ -120,7 +341,24 @@ class Config:
     api: APIConfig = field(default_factory=APIConfig)
     paths: PathConfig = field(default_factory=PathConfig)
     embedchain: EmbedchainConfig = field(default_factory=EmbedchainConfig)
+    ingest: IngestConfig = field(default_factory=IngestConfig)
+    budget: LengthBudgetConfig = field(default_factory=LengthBudgetConfig)
     lightrag: LightRAGConfig = field(default_factory=LightRAGConfig)
+    persist: PersistConfig = field(default_factory=PersistConfig)
+    local_metrics: LocalMetricConfig = field(default_factory=LocalMetricConfig)
+    retrieval_metrics: RetrievalMetricConfig = field(default_factory=RetrievalMetricConfig)
+    context_store: ContextStoreConfig = field(default_factory=ContextStoreConfig)
+    adaptive: AdaptiveEvalConfig = field(default_factory=AdaptiveEvalConfig)
+    surrogate: SurrogateConfig = field(default_factory=SurrogateConfig)
+    judge: JudgeConfig = field(default_factory=JudgeConfig)
+    plot: PlotConfig = field(default_factory=PlotConfig)
+    stats: StatsConfig = field(default_factory=StatsConfig)
+    serve: ServeConfig = field(default_factory=ServeConfig)
+    pipeline: PipelineConfig = field(default_factory=PipelineConfig)
+    retry: RetryConfig = field(default_factory=RetryConfig)
+    worker: WorkerConfig = field(default_factory=WorkerConfig)
+    testset: TestsetConfig = field(default_factory=TestsetConfig)
+    sweep: SweepConfig = field(default_factory=SweepConfig)
 
     # 测试集配置
     test_types: List[str] = field(default_factory=lambda: ["A", "B"])
@@ -132,24 +370,42 @@ class Config:
     max_answer_chars_A: int = 100  # 数据集 A 的回答长度限制
     max_answer_chars_B: int = 350  # 数据集 B 的回答长度限制
 
-    def __post_init__(self):
-        """初始化后设置环境变量"""
+    _prepared: bool = field(default=False, init=False, repr=False)
+
+    def prepare(self):
+        """设置环境变量并创建目录（幂等）
+
+        不在构造时执行，避免仅导入配置或查看帮助时产生副作用；
+        由方法与评估器在真正开始工作前调用。
+        """
+        if self._prepared:
+            return
         if self.api.openai_api_key:
             os.environ["OPENAI_API_KEY"] = self.api.openai_api_key
         os.environ["OPENAI_API_BASE"] = self.api.openai_base_url
         self.paths.ensure_dirs()
+        self._prepared = True
 
     def get_testset_path(self, test_type: str) -> Path:
-        """获取测试集路径"""
+        """获取测试集路径（优先使用 {type}.jsonl，否则为 {type}.json）"""
+        jsonl_path = self.paths.testset_dir / f"{test_type}.jsonl"
+        if jsonl_path.exists():
+            return jsonl_path
         return self.paths.testset_dir / f"{test_type}.json"
 
     def get_output_path(self, method: str, test_type: str) -> Path:
         """获取输出文件路径"""
         return self.paths.results_dir / f"{method}_output_{test_type}.json"
 
-    def get_document_path(self) -> Path:
-        """获取知识库文档路径"""
-        return self.paths.documents_dir / "经济果林病虫害防治手册.txt"
+    def get_journal_path(self, method: str, test_type: str) -> Path:
+        """获取方法运行日志路径（用于断点续跑）"""
+        return self.paths.results_dir / f"{method}_output_{test_type}.journal.jsonl"
+
+    def get_document_paths(self) -> List[Path]:
+        """获取知识库目录下的全部文档（按相对路径排序）"""
+        docs_dir = self.paths.documents_dir
+        paths = {p for pattern in self.ingest.patterns for p in docs_dir.rglob(pattern) if p.is_file()}
+        return sorted(paths, key=lambda p: p.relative_to(docs_dir).as_posix())
 
     def get_max_chars(self, test_type: str) -> int:
         """根据测试集类型获取答案长度限制"""
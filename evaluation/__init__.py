@@ -1,2 +1,15 @@
-from .evaluator import Evaluator
-from .plotter import plot_results
+import importlib
+
+# 延迟导出：评估依赖 openai，绘图依赖 matplotlib/seaborn，仅在首次访问时导入
+_LAZY_EXPORTS = {
+    "Evaluator": ".evaluator",
+    "plot_results": ".plotter",
+    "ScoreTable": ".score_table",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        module = importlib.import_module(_LAZY_EXPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,137 @@
+"""
+序贯提前停止评测（evaluate --adaptive）
+
+按随机顺序逐题交错评分（同一问题的各系统回答一起评，便于配对比较），每评完一批题目更新置信界：
+    - 每个系统、每个维度的均值置信区间（报告用）
+    - 每对系统、每个维度的配对差值置信区间（停止判断用）：区间不含 0 视为已分出高下，
+      区间落在 [-tolerance, tolerance] 内视为持平；全部系统对在全部维度上都已确定时该测试集停止
+置信水平按 Bonferroni 在系统对 × 维度 × 最多检查次数上分摊，保证多次中途检查后整体仍不低于设定的置信度。
+
+估计对象是该测试集全部题目（有限总体）上的均值。历史进度、评分缓存与本地自动评分得到的分数（known）
+是总体中已确定的部分，不参与抽样；只有需要 LLM Judge 的题目（unknown，共 N_u 题）按随机顺序抽样评分：
+    均值 = (已知部分之和 + N_u × 已抽样均值) / N
+    标准误 = N_u / N × s / √n × √((N_u − n) / (N_u − 1))（有限总体校正，n = N_u 时区间收缩为一点）
+正态近似要求每对系统至少 min_pairs 个抽样配对样本后才开始判断（待评题目已全部评完时直接判断）。
+"""
+import math
+from itertools import combinations
+from statistics import NormalDist
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from .score_table import SCORE_COLS
+
+
+def critical_value(confidence: float, comparisons: int) -> float:
+    """Bonferroni 校正后的双侧正态临界值"""
+    alpha = (1 - confidence) / max(comparisons, 1)
+    return NormalDist().inv_cdf(1 - alpha / 2)
+
+
+def _stratified(known: np.ndarray, sampled: np.ndarray, n_unknown: int, z: float,
+                min_sampled: int = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """已知部分 + 未知部分抽样的有限总体均值及置信区间
+
+    known 为已确定的分数（形状 (k, d)），sampled 为从 n_unknown 个未知题目中抽样评得的分数（形状 (n, d)），
+    返回 (均值, 下界, 上界)。抽样不足 min_sampled 个（且未抽完）时区间为无穷。
+    """
+    dims = len(SCORE_COLS)
+    n, total = len(sampled), len(known) + n_unknown
+    if total == 0 or (n == 0 and n_unknown > 0):
+        return np.full(dims, np.nan), np.full(dims, -np.inf), np.full(dims, np.inf)
+    known_sum = known.sum(axis=0) if len(known) else np.zeros(dims)
+    unknown_sum = n_unknown * sampled.mean(axis=0) if n else np.zeros(dims)
+    mean = (known_sum + unknown_sum) / total
+    if n >= n_unknown:
+        return mean, mean, mean
+    if n < max(min_sampled, 2):
+        return mean, np.full(dims, -np.inf), np.full(dims, np.inf)
+    fpc = math.sqrt((n_unknown - n) / (n_unknown - 1))
+    half = z * n_unknown / total * sampled.std(axis=0, ddof=1) / math.sqrt(n) * fpc
+    return mean, mean - half, mean + half
+
+
+def _matrix(rows: list) -> np.ndarray:
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(SCORE_COLS))
+
+
+def system_bounds(known: Dict[str, Dict[str, tuple]], sampled: Dict[str, Dict[str, tuple]],
+                  unknown: Dict[str, Set[str]], z: float) -> List[dict]:
+    """各系统各维度的均值置信区间
+
+    known / sampled 为 {系统: {问题: 三维分数}}（已确定 / 抽样评得），unknown 为 {系统: 需要 LLM Judge 的问题}。
+    """
+    rows = []
+    for system in sorted(known):
+        system_known = {q: v for q, v in known[system].items() if q not in unknown.get(system, ())}
+        system_sampled = sampled.get(system, {})
+        n_unknown = len(unknown.get(system, ()))
+        if not system_known and not system_sampled:
+            continue
+        mean, low, high = _stratified(_matrix(list(system_known.values())), _matrix(list(system_sampled.values())),
+                                      n_unknown, z)
+        for j, col in enumerate(SCORE_COLS):
+            rows.append({"System": system, "Score": col, "n": len(system_known) + len(system_sampled),
+                         "n_unknown": n_unknown, "mean": float(mean[j]),
+                         "ci_low": float(low[j]), "ci_high": float(high[j])})
+    return rows
+
+
+def pair_decisions(known: Dict[str, Dict[str, tuple]], sampled: Dict[str, Dict[str, tuple]],
+                   unknown: Dict[str, Set[str]], z: float, tolerance: float, min_pairs: int) -> List[dict]:
+    """两两配对比较：差值 = System_A - System_B，decision 为 A>B / A<B / tie / open
+
+    两个系统都已确定分数的题目为已知部分；任一系统需要 LLM Judge 的题目为未知部分，两者都评完的计为抽样样本。
+    """
+    rows = []
+    for sys_a, sys_b in combinations(sorted(known), 2):
+        unknown_a, unknown_b = unknown.get(sys_a, set()), unknown.get(sys_b, set())
+        scores_a = {**known[sys_a], **sampled.get(sys_a, {})}
+        scores_b = {**known[sys_b], **sampled.get(sys_b, {})}
+        common = (known[sys_a].keys() | unknown_a) & (known[sys_b].keys() | unknown_b)
+        open_questions = common & (unknown_a | unknown_b)
+        fixed = sorted(common - open_questions)
+        drawn = sorted(q for q in open_questions if q in scores_a and q in scores_b)
+        known_diffs = _matrix([scores_a[q] for q in fixed]) - _matrix([scores_b[q] for q in fixed])
+        sampled_diffs = _matrix([scores_a[q] for q in drawn]) - _matrix([scores_b[q] for q in drawn])
+        mean, low, high = _stratified(known_diffs, sampled_diffs, len(open_questions), z, min_pairs)
+        for j, col in enumerate(SCORE_COLS):
+            if low[j] > 0:
+                decision = "A>B"
+            elif high[j] < 0:
+                decision = "A<B"
+            elif -tolerance <= low[j] and high[j] <= tolerance:
+                decision = "tie"
+            else:
+                decision = "open"
+            rows.append({"System_A": sys_a, "System_B": sys_b, "Score": col, "n_known": len(fixed),
+                         "n_unknown": len(open_questions), "n_pairs": len(drawn),
+                         "mean_diff": float(mean[j]), "diff_ci_low": float(low[j]),
+                         "diff_ci_high": float(high[j]), "decision": decision})
+    return rows
+
+
+def is_settled(decisions: List[dict]) -> bool:
+    """全部系统对在全部维度上都已确定排序（或持平）"""
+    return all(d["decision"] != "open" for d in decisions)
+
+
+def print_adaptive_report(report: dict):
+    """打印提前停止评测的结果"""
+    import pandas as pd
+
+    print("\n" + "=" * 60)
+    print(f"序贯评测结果（置信度 {report['confidence']:.0%}，持平容差 ±{report['tolerance']}）")
+    print("=" * 60)
+    for test_type, info in report["types"].items():
+        status = "排序已确定" if info["settled"] else "未确定（预算用尽或题目评完）"
+        print(f"\n【类型 {test_type}】{status}，LLM Judge 调用 {info['judged']} 次，省去 {info['avoided']} 次")
+        if info["decisions"]:
+            view = pd.DataFrame(info["decisions"])
+            for col in ["mean_diff", "diff_ci_low", "diff_ci_high"]:
+                view[col] = view[col].round(2)
+            print(view.to_string(index=False))
+    print(f"\n合计: LLM Judge 调用 {report['judged']} 次，省去 {report['avoided']} 次"
+          f"（需要 LLM 评分的记录共 {report['pending']} 条）")
+    print("=" * 60 + "\n")
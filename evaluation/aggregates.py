@@ -0,0 +1,281 @@
+"""
+评分的在线增量汇总
+
+按 (System, Type, 维度) 维护运行中的样本数、均值与方差（Welford 算法），每条评分记录到达时 O(1) 更新，
+摘要直接由这些统计量给出，无需重建 DataFrame 或分组。
+    - 与进度文件语义一致：同一 (System, Type, Question) 以最后一条记录为准，被替换的旧分数会先移除
+    - 同时保存各分数值的出现次数，用于给出 min / max / 分位数（分数为 0-10 的整数，计数表很小）
+    - 快照保存在进度文件旁（evaluation_aggregates.json），记录已处理到的进度文件字节偏移；
+      加载时只读取偏移之后新追加的记录（如其他 worker 合并的评分），进度文件被改写时才全量重建
+"""
+import json
+import math
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.wal import log_fingerprint
+from .score_table import SCORE_COLS
+
+AGGREGATES_FILE = "evaluation_aggregates.json"
+SNAPSHOT_VERSION = 1
+_FINGERPRINT_BYTES = 256  # 校验进度文件未被改写：快照偏移之前若干字节的哈希
+
+
+def _score(value) -> int:
+    """与评分表的类型转换一致：无法解析的分数记为 0，其余四舍五入取整"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0
+    return 0 if math.isnan(value) else int(round(value))
+
+
+class RunningStat:
+    """可增删样本的 Welford 运行统计量"""
+
+    __slots__ = ("n", "mean", "m2", "counts")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0, counts: Dict[int, int] = None):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.counts = defaultdict(int, counts or {})
+
+    def add(self, x: int):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.counts[x] += 1
+
+    def remove(self, x: int):
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            self.counts.clear()
+            return
+        old_mean = self.mean
+        self.n -= 1
+        self.mean = (old_mean * (self.n + 1) - x) / self.n
+        self.m2 = max(self.m2 - (x - self.mean) * (x - old_mean), 0.0)
+        self.counts[x] -= 1
+        if not self.counts[x]:
+            del self.counts[x]
+
+    def merge(self, other: "RunningStat") -> "RunningStat":
+        """合并两组统计量（Chan 并行算法），返回新对象"""
+        n = self.n + other.n
+        if not n:
+            return RunningStat()
+        delta = other.mean - self.mean
+        counts = defaultdict(int, self.counts)
+        for value, count in other.counts.items():
+            counts[value] += count
+        return RunningStat(n, self.mean + delta * other.n / n,
+                           self.m2 + other.m2 + delta * delta * self.n * other.n / n, counts)
+
+    @property
+    def variance(self) -> float:
+        """样本方差（与 pandas 的 std 一致，ddof=1）"""
+        return self.m2 / (self.n - 1) if self.n > 1 else float("nan")
+
+    def quantile(self, q: float) -> float:
+        """由计数表按线性插值计算分位数（与 pandas 默认方式一致）"""
+        if not self.n:
+            return float("nan")
+        pos = q * (self.n - 1)
+        lower, upper = math.floor(pos), math.ceil(pos)
+        values = {}
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            for index in (lower, upper):
+                if index not in values and index < seen:
+                    values[index] = value
+            if upper in values:
+                break
+        return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+    def describe(self) -> Dict[str, float]:
+        """与 DataFrame.describe() 相同的字段"""
+        summary = {"count": float(self.n), "mean": self.mean if self.n else float("nan"),
+                   "std": math.sqrt(self.variance) if self.n > 1 else float("nan")}
+        summary["min"] = float(min(self.counts)) if self.n else float("nan")
+        for q in (0.25, 0.5, 0.75):
+            summary[f"{q:.0%}"] = self.quantile(q)
+        summary["max"] = float(max(self.counts)) if self.n else float("nan")
+        return summary
+
+    def to_list(self) -> list:
+        return [self.n, self.mean, self.m2, {str(k): v for k, v in self.counts.items()}]
+
+    @classmethod
+    def from_list(cls, data: list) -> "RunningStat":
+        n, mean, m2, counts = data
+        return cls(n, mean, m2, {int(k): v for k, v in counts.items()})
+
+
+class ScoreAggregates:
+    """按 (System, Type, 维度) 增量维护的评分统计"""
+
+    def __init__(self):
+        self.stats: Dict[Tuple[str, str, str], RunningStat] = defaultdict(RunningStat)
+        # (System, Type, Question) -> 当前计入统计的分数，用于替换旧记录
+        self.members: Dict[Tuple[str, str, str], Tuple[int, ...]] = {}
+        self.offset = 0  # 已处理到的进度文件字节偏移
+        self.fingerprint = ""
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def update(self, record: dict) -> bool:
+        """计入一条评分记录（同一问题的旧记录先移除），记录格式无效时返回 False"""
+        try:
+            key = (str(record["System"]), str(record.get("Type", "")), str(record["Question"]))
+        except (KeyError, TypeError):
+            return False
+        scores = tuple(_score(record.get(col)) for col in SCORE_COLS)
+        previous = self.members.pop(key, None)
+        if previous is not None:
+            for col, value in zip(SCORE_COLS, previous):
+                self.stats[(key[0], key[1], col)].remove(value)
+        for col, value in zip(SCORE_COLS, scores):
+            self.stats[(key[0], key[1], col)].add(value)
+        self.members[key] = scores
+        return True
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "ScoreAggregates":
+        aggregates = cls()
+        for record in records:
+            aggregates.update(record)
+        return aggregates
+
+    def means(self, system: str, test_type: str) -> Dict[str, float]:
+        """某个 (System, Type) 当前各维度的均值"""
+        return {col: self.stats[(system, test_type, col)].mean for col in SCORE_COLS
+                if self.stats.get((system, test_type, col)) and self.stats[(system, test_type, col)].n}
+
+    def _grouped(self, by_type: bool) -> Dict[tuple, Dict[str, RunningStat]]:
+        groups = defaultdict(lambda: defaultdict(RunningStat))
+        for (system, test_type, col), stat in sorted(self.stats.items()):
+            if not stat.n:
+                continue
+            key = (system, test_type) if by_type else system
+            groups[key][col] = groups[key][col].merge(stat)
+        return groups
+
+    def summary(self) -> dict:
+        """与 Evaluator.get_summary 相同结构的摘要：分组均值与总体描述统计"""
+        if not self.members:
+            return {}
+        by_system_type = self._grouped(by_type=True)
+        by_system = self._grouped(by_type=False)
+        overall = {col: RunningStat() for col in SCORE_COLS}
+        for stats in by_system.values():
+            for col, stat in stats.items():
+                overall[col] = overall[col].merge(stat)
+        return {
+            "by_system_type": {col: {k: round(v[col].mean, 2) for k, v in by_system_type.items()}
+                               for col in SCORE_COLS},
+            "by_system": {col: {k: round(v[col].mean, 2) for k, v in by_system.items()} for col in SCORE_COLS},
+            "overall": {col: {k: round(v, 2) for k, v in overall[col].describe().items()} for col in SCORE_COLS},
+        }
+
+    # ---------- 持久化 ----------
+
+    @staticmethod
+    def _fingerprint(progress_file: Path, offset: int) -> str:
+        return log_fingerprint(progress_file, offset, _FINGERPRINT_BYTES)
+
+    def catch_up(self, progress_file: Path) -> int:
+        """读取进度文件中偏移之后追加的完整记录，返回读取的记录数"""
+        progress_file = Path(progress_file)
+        if not progress_file.exists():
+            return 0
+        count = 0
+        with open(progress_file, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # 未写完的行留到下次
+                self.offset += len(line)
+                try:
+                    count += self.update(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+        self.fingerprint = self._fingerprint(progress_file, self.offset)
+        return count
+
+    @classmethod
+    def load(cls, snapshot_file: Path, progress_file: Path) -> "ScoreAggregates":
+        """读取快照并补上之后追加的记录；没有快照或进度文件被改写时由进度文件全量重建"""
+        aggregates = cls()
+        snapshot_file, progress_file = Path(snapshot_file), Path(progress_file)
+        try:
+            with open(snapshot_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            size = progress_file.stat().st_size if progress_file.exists() else 0
+            if (data.get("version") == SNAPSHOT_VERSION and data["offset"] <= size
+                    and cls._fingerprint(progress_file, data["offset"]) == data["fingerprint"]):
+                aggregates.offset = data["offset"]
+                aggregates.fingerprint = data["fingerprint"]
+                for system, test_type, col, stat in data["stats"]:
+                    aggregates.stats[(system, test_type, col)] = RunningStat.from_list(stat)
+                aggregates.members = {(s, t, q): tuple(scores) for s, t, q, scores in data["members"]}
+        except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+            aggregates = cls()
+        aggregates.catch_up(progress_file)
+        return aggregates
+
+    def save(self, snapshot_file: Path):
+        """写出快照（先写临时文件再替换）"""
+        snapshot_file = Path(snapshot_file)
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "offset": self.offset,
+            "fingerprint": self.fingerprint,
+            "stats": [[*key, stat.to_list()] for key, stat in self.stats.items() if stat.n],
+            "members": [[*key, list(scores)] for key, scores in self.members.items()],
+        }
+        snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = snapshot_file.with_suffix(snapshot_file.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        tmp_path.replace(snapshot_file)
+
+
+def load_aggregates(config, save: bool = False) -> ScoreAggregates:
+    """按配置加载评测进度的增量汇总；save=True 时补读新记录后写回快照"""
+    output_dir = config.paths.output_dir
+    snapshot_file = output_dir / AGGREGATES_FILE
+    aggregates = ScoreAggregates.load(snapshot_file, output_dir / "evaluation_progress.jsonl")
+    if save:
+        aggregates.save(snapshot_file)
+    return aggregates
+
+
+def _frame(table: Dict[str, dict], index_names: List[str]):
+    import pandas as pd
+
+    df = pd.DataFrame(table)
+    if isinstance(df.index, pd.MultiIndex) or len(index_names) == 1:
+        df.index.names = index_names
+    return df
+
+
+def print_summary(summary: dict):
+    """打印统计摘要"""
+    print("\n" + "=" * 60)
+    print("评测统计摘要")
+    print("=" * 60)
+    if not summary:
+        print("没有评测数据")
+    else:
+        print("\n【按系统和类型分组的平均分】")
+        print(_frame(summary["by_system_type"], ["System", "Type"]))
+        print("\n【按系统整体平均分】")
+        print(_frame(summary["by_system"], ["System"]))
+        print("\n【总体统计】")
+        print(_frame(summary["overall"], [None]))
+    print("=" * 60 + "\n")
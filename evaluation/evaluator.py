@@ -1,20 +1,41 @@
 """
 LLM Judge 评估模块
 """
+import hashlib
 import json
+import math
+import random
 import sys
+import threading
+from collections import defaultdict
 from pathlib import Path
-from typing import List, Set, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from openai import OpenAI
 from tqdm import tqdm
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import Config
+from methods.base import ERROR_ANSWER
+from utils import ResponseParseError, get_log, get_retrier, load_results, migrate_pretty_log, read_log
+from .aggregates import AGGREGATES_FILE, ScoreAggregates
+from .local_metrics import compute_local_metrics, metrics_for_row
+from .score_table import ScoreTable, SCORE_COLS, records_to_frame
+from .surrogate import SURROGATE_METHOD, load_surrogate
 
-# 评分 Prompt 模板
-JUDGE_PROMPT = """
-你是一位植物病理学专家和严厉的阅卷老师。请根据以下三个维度给 AI 的回答打分（1-10分）。
+# 自动评分记录的 Method 标记（与 LLM_Judge 并列）
+AUTO_METHOD = "Local_Auto"
+
+# 视为无效回答、可直接判为最低分的内容
+TRIVIAL_ANSWERS = {"", ERROR_ANSWER, "No answer found."}
+
+# 评分 Prompt 版本，修改评分 Prompt 或解析逻辑时需递增，使缓存的评分失效
+JUDGE_PROMPT_VERSION = "v2"
+
+# 评分请求的静态部分（角色、评分维度、输出格式）全部放在 system 消息中，
+# 对同一评语模式逐字节不变，可被服务端的前缀缓存复用；user 消息只包含每条记录的输入数据，
+# 且按 问题 → 标准答案 → 参考资料 → 回答 排列，同一问题的各系统回答连续评分时共享更长的前缀。
+JUDGE_RUBRIC = """你是一位植物病理学专家和严厉的阅卷老师，是一个只输出 JSON 的评测系统。请根据以下三个维度给 AI 的回答打分（1-10分）。
 
 ### 评分维度：
 1. **忠实度 (Faithfulness)**: 回答是否严格基于参考资料(Context)？如果没有参考资料，请检查是否存在幻觉。
@@ -22,21 +43,108 @@ JUDGE_PROMPT = """
 3. **答案有用性 (Relevance)**: 回答是否直接解决了问题，没有废话？
 
 ### 输入数据：
-【问题】: {question}
-【参考资料 (Contexts)】: {contexts}
-【标准答案 (Ground Truth)】: {ground_truth}
-【AI 回答】: {answer}
+用户消息依次给出【问题】、【标准答案 (Ground Truth)】、【参考资料 (Contexts)】与【AI 回答】。
 
 ### 输出格式 (JSON):
 {{
     "faithfulness_score": <int 1-10>,
     "comprehensiveness_score": <int 1-10>,
-    "relevance_score": <int 1-10>,
-    "reason": "<简短评语>"
+    "relevance_score": <int 1-10>{reason_field}
 }}
 
-注意：必须严格返回 JSON 格式，不要有任何额外文字。
-"""
+注意：必须严格返回 JSON 格式，不要有任何额外文字。"""
+
+# 各评语模式在输出格式中对应的 reason 字段
+REASON_FIELDS = {
+    "full": ',\n    "reason": "<简短评语>"',
+    "short": ',\n    "reason": "<不超过 {reason_chars} 字的评语>"',
+    "none": "",
+}
+
+JUDGE_INPUT = """【问题】: {question}
+【标准答案 (Ground Truth)】: {ground_truth}
+【参考资料 (Contexts)】: {contexts}
+【AI 回答】: {answer}"""
+
+
+def prompt_version(reason: str) -> str:
+    """评分 Prompt 版本：评语模式会影响评分输出，视为不同版本"""
+    return JUDGE_PROMPT_VERSION if reason == "full" else f"{JUDGE_PROMPT_VERSION}-{reason}"
+
+
+def judge_system_prompt(reason: str = "full", reason_chars: int = 30) -> str:
+    """评分请求的静态前缀"""
+    if reason not in REASON_FIELDS:
+        raise ValueError(f"未知的评语模式: {reason}（可选 {', '.join(REASON_FIELDS)}）")
+    return JUDGE_RUBRIC.format(reason_field=REASON_FIELDS[reason].format(reason_chars=reason_chars))
+
+
+def judge_user_prompt(entry: dict) -> str:
+    """评分请求中每条记录的输入数据"""
+    ctx = entry.get("contexts", [])
+    ctx_str = "\n".join(ctx) if isinstance(ctx, list) else str(ctx)
+    if not ctx_str or ctx == [""]:
+        ctx_str = "无检索上下文 (Pure LLM)，基于常识回答"
+    return JUDGE_INPUT.format(
+        question=entry['question'],
+        ground_truth=entry['standard_answer'],
+        contexts=ctx_str,
+        answer=entry['answer']
+    )
+
+
+def cached_tokens(usage) -> int:
+    """响应中命中服务端前缀缓存的 prompt token 数（兼容 prompt_tokens_details 与 prompt_cache_hit_tokens）"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens")
+    else:
+        cached = getattr(details, "cached_tokens", None)
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    return cached or 0
+
+
+def is_failed(record: dict) -> bool:
+    """评分调用失败的记录（三项均为 0）"""
+    return all(not record.get(col) for col in SCORE_COLS)
+
+
+def judge_key(judge_model: str, entry: dict, version: str = JUDGE_PROMPT_VERSION) -> str:
+    """评分缓存键：评分模型、Prompt 版本与全部评分输入的内容哈希"""
+    payload = json.dumps([
+        judge_model,
+        version,
+        entry.get('question', ''),
+        entry.get('contexts', []),
+        entry.get('standard_answer', ''),
+        entry.get('answer', ''),
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def read_progress(progress_file: Path) -> Tuple[Dict[Tuple, dict], Dict[str, dict]]:
+    """读取评测进度，返回 ((System, Type, Question) -> 最新记录, 评分缓存键 -> LLM Judge 记录)
+
+    早期版本写出的多行缩进格式进度文件先一次性改写为 JSONL（原文件保留为 .pretty）。
+    """
+    migrated = migrate_pretty_log(progress_file)
+    if migrated:
+        print(f"已将多行格式的进度文件转换为 JSONL（{migrated} 条记录）: {progress_file}")
+    latest = {}
+    judge_cache = {}
+    for data in read_log(progress_file):
+        try:
+            key = (data["System"], data.get("Type", ""), data["Question"])
+        except (KeyError, TypeError):
+            continue
+        latest.pop(key, None)
+        latest[key] = data
+        judge_key = data.get("Judge_Key")
+        # 补写键的旧版记录出自旧版评分 Prompt，只用于判断回答是否变化，不作为评分缓存复用
+        if judge_key and data.get("Method") == "LLM_Judge" and not is_failed(data) and not data.get("Legacy"):
+            judge_cache[judge_key] = data
+    return latest, judge_cache
 
 
 class Evaluator:
@@ -46,12 +154,18 @@ class Evaluator:
         if config is None:
             from config import default_config
             config = default_config
+        config.prepare()
         self.config = config
         self._init_client()
 
         # 进度文件路径
         self.progress_file = config.paths.output_dir / "evaluation_progress.jsonl"
         self.results_file = config.paths.output_dir / "final_evaluation_results.csv"
+        self.aggregates_file = config.paths.output_dir / AGGREGATES_FILE
+        self.score_table = ScoreTable(config.paths.output_dir / "scores")
+        self.judge_cache: Dict[str, dict] = {}
+        self.aggregates: Optional[ScoreAggregates] = None
+        self.surrogate = load_surrogate(config) if config.surrogate.enabled else None
 
     def _init_client(self):
         """初始化评分模型客户端"""
@@ -59,66 +173,109 @@ class Evaluator:
         if not api_key:
             raise ValueError("请设置环境变量 ZAI_API_KEY 或 OPENAI_API_KEY")
 
+        # 重试由 self.retrier 统一负责（退避、Retry-After、熔断），关闭 SDK 自带的重试
         self.client = OpenAI(
             api_key=api_key,
-            base_url=self.config.api.judge_base_url
+            base_url=self.config.api.judge_base_url,
+            max_retries=0
         )
+        self.retrier = get_retrier("judge", **self.config.retry.retry_kwargs())
+        judge_config = self.config.judge
+        self.system_prompt = judge_system_prompt(judge_config.reason, judge_config.reason_chars)
+        self.prompt_version = prompt_version(judge_config.reason)
+        self.usage = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
+
+    def _record_usage(self, response):
+        """累计一次评分调用的用量（含命中前缀缓存的 token 数）"""
+        usage = getattr(response, "usage", None)
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            if usage is not None:
+                self.usage["prompt_tokens"] += usage.prompt_tokens or 0
+                self.usage["cached_tokens"] += cached_tokens(usage)
+                self.usage["completion_tokens"] += usage.completion_tokens or 0
+
+    def print_usage(self):
+        """打印 LLM Judge 调用与 token 用量（含前缀缓存命中比例）"""
+        usage = self.usage
+        if not usage["calls"]:
+            return
+        share = usage["cached_tokens"] / usage["prompt_tokens"] if usage["prompt_tokens"] else 0.0
+        print(f"LLM Judge 用量: {usage['calls']} 次调用，prompt {usage['prompt_tokens']} tokens"
+              f"（缓存命中 {usage['cached_tokens']}，{share:.1%}），completion {usage['completion_tokens']} tokens")
 
     def _evaluate_single(self, entry: dict) -> dict:
         """评估单条记录"""
-        ctx = entry.get("contexts", [])
-        ctx_str = "\n".join(ctx) if isinstance(ctx, list) else str(ctx)
-        if not ctx_str or ctx == [""]:
-            ctx_str = "无检索上下文 (Pure LLM)，基于常识回答"
-
-        prompt = JUDGE_PROMPT.format(
-            question=entry['question'],
-            contexts=ctx_str,
-            ground_truth=entry['standard_answer'],
-            answer=entry['answer']
+        prompt = judge_user_prompt(entry)
+
+        try:
+            return self.retrier.call(self._judge, prompt)
+        except json.JSONDecodeError as e:
+            print(f"JSON 解析错误: {e}")
+            return self.error_result(f"JSON解析失败: {str(e)}")
+        except Exception as e:
+            print(f"LLM Judge Error: {e}")
+            return self.error_result(f"Error: {str(e)}")
+
+    def _judge(self, prompt: str) -> dict:
+        """调用一次评分模型并解析结果，解析失败抛出 JSONDecodeError / ResponseParseError 以便重试"""
+        response = self.client.chat.completions.create(
+            model=self.config.api.judge_model_name,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0,
+            response_format={"type": "json_object"}
         )
-
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.config.api.judge_model_name,
-                    messages=[
-                        {"role": "system", "content": "你是一个只输出 JSON 的评测系统，不要输出任何其他内容。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0,
-                    response_format={"type": "json_object"}
-                )
-
-                content = response.choices[0].message.content.strip()
-                # 清理可能的 markdown 标记
-                if content.startswith("```json"):
-                    content = content.replace("```json", "").replace("```", "").strip()
-
-                result = json.loads(content)
-                print(result)
-
-                # 验证必要字段
-                required_fields = ["faithfulness_score", "comprehensiveness_score", "relevance_score"]
-                if all(field in result for field in required_fields):
-                    return result
-                else:
-                    raise ValueError("返回的 JSON 缺少必要字段")
-
-            except json.JSONDecodeError as e:
-                print(f"JSON 解析错误 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt == max_retries - 1:
-                    return self._error_result(f"JSON解析失败: {str(e)}")
-            except Exception as e:
-                print(f"LLM Judge Error (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt == max_retries - 1:
-                    return self._error_result(f"Error: {str(e)}")
-
-        return self._error_result("未知错误")
-
-    def _error_result(self, reason: str) -> dict:
-        """返回错误结果"""
+        self._record_usage(response)
+
+        content = response.choices[0].message.content.strip()
+        # 清理可能的 markdown 标记
+        if content.startswith("```json"):
+            content = content.replace("```json", "").replace("```", "").strip()
+
+        result = json.loads(content)
+
+        # 验证必要字段
+        required_fields = ["faithfulness_score", "comprehensiveness_score", "relevance_score"]
+        if not all(field in result for field in required_fields):
+            raise ResponseParseError("返回的 JSON 缺少必要字段")
+        return result
+
+    def _auto_score(self, entry: dict, metrics: dict) -> dict:
+        """对平凡样本直接给分，无法判定时返回 None 交给 LLM Judge"""
+        lm_config = self.config.local_metrics
+        if not lm_config.auto_score:
+            return None
+
+        if (entry.get('answer') or "").strip() in TRIVIAL_ANSWERS:
+            return {
+                "faithfulness_score": 1,
+                "comprehensiveness_score": 1,
+                "relevance_score": 1,
+                "reason": "自动评分：回答为空或处理失败"
+            }
+
+        # Faithfulness 衡量回答是否有检索上下文支撑：只有上下文覆盖了回答时才自动给满分，
+        # 无上下文（NaN）或支撑不足的逐字回答仍交给 LLM Judge
+        threshold = lm_config.verbatim_threshold
+        support = metrics.get('Local_ContextSupport')
+        supported = support is not None and not math.isnan(support) and support >= lm_config.support_threshold
+        if metrics['Local_CharF1'] >= threshold and metrics['Local_RougeL'] >= threshold and supported:
+            return {
+                "faithfulness_score": 10,
+                "comprehensiveness_score": 10,
+                "relevance_score": 10,
+                "reason": "自动评分：回答与标准答案几乎一致，且完全由检索上下文支撑"
+            }
+
+        return None
+
+    @staticmethod
+    def error_result(reason: str) -> dict:
+        """评分失败时的结果（三项为 0，下次评测会重新评分）"""
         return {
             "faithfulness_score": 0,
             "comprehensiveness_score": 0,
@@ -127,116 +284,401 @@ class Evaluator:
         }
 
     def _save_progress(self, record: dict):
-        """实时追加保存一条记录"""
-        self.progress_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.progress_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-    def _load_progress(self) -> Tuple[List[dict], Set[Tuple]]:
-        """加载已完成的进度"""
-        processed = set()
-        results = []
-        if self.progress_file.exists():
-            with open(self.progress_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    try:
-                        data = json.loads(line)
-                        key = (data["System"], data["Question"], data["Method"])
-                        processed.add(key)
-                        results.append(data)
-                    except:
-                        continue
-        return results, processed
-
-    def evaluate_all(self) -> List[dict]:
+        """追加一条记录到进度日志（组提交，按批刷盘）"""
+        log = get_log(self.progress_file, **self.config.persist.log_kwargs())
+        log.append(record)
+
+    def _close_progress(self):
+        """刷盘并关闭进度日志"""
+        get_log(self.progress_file, **self.config.persist.log_kwargs()).close()
+
+    def judge_key_for(self, entry: dict) -> str:
+        """评分缓存键：评分模型、Prompt 版本与全部评分输入的内容哈希"""
+        return judge_key(self.config.api.judge_model_name, entry, self.prompt_version)
+
+    @staticmethod
+    def _is_failed(record: dict) -> bool:
+        """评分调用失败的记录（三项均为 0）不作为有效结果缓存"""
+        return is_failed(record)
+
+    def load_progress(self, backfill: bool = True) -> Tuple[List[dict], Dict[Tuple, Optional[str]]]:
+        """加载已完成的进度
+
+        同一 (System, Type, Question) 有多条记录时以最后一条为准（回答变化后重新评分会追加新记录）。
+        返回有效记录列表，以及每条记录对应的评分缓存键（旧版进度没有缓存键时为 None）。
+        同时根据带缓存键的 LLM Judge 记录构建内容寻址的评分缓存 self.judge_cache。
+        backfill=False 时不为旧版记录补写缓存键（只读加载，如多 worker 各自载入评分缓存）。
+        """
+        latest, self.judge_cache = read_progress(self.progress_file)
+        if backfill:
+            self._backfill_legacy_keys(latest)
+        processed = {key: data.get("Judge_Key") for key, data in latest.items()
+                     if not self._is_failed(data)}
+        return list(latest.values()), processed
+
+    def _backfill_legacy_keys(self, latest: Dict[Tuple, dict]) -> int:
+        """为旧版进度中没有缓存键的记录补写键（按当前输出文件计算），返回补写条数
+
+        补写的记录追加到进度文件并标记 Legacy，此后回答或上下文变化时会像新记录一样重新评分。
+        输出文件中已不存在的问题保持原样。
+        """
+        legacy = defaultdict(dict)
+        for key, data in latest.items():
+            if not data.get("Judge_Key") and not self._is_failed(data):
+                legacy[key[:2]][key[2]] = key
+        count = 0
+        for (system, test_type), questions in legacy.items():
+            output_path = self.config.get_output_path(system, test_type)
+            if not output_path.exists():
+                continue
+            for item in load_results(self.config, output_path):
+                key = questions.get(item.get('question'))
+                if key is None:
+                    continue
+                record = dict(latest[key], Judge_Key=self.judge_key_for(item), Legacy=True)
+                self._save_progress(record)
+                latest[key] = record
+                count += 1
+        if count:
+            self._close_progress()
+            print(f"已为 {count} 条旧版进度记录补写评分缓存键")
+        return count
+
+    def evaluate_all(self, export_csv: bool = False) -> List[dict]:
         """评估所有方法的所有测试集"""
-        import pandas as pd
-
+        # 重试统计只反映本次评测（Retrier 在进程内共享）
+        self.retrier.reset_stats()
         # 加载历史进度
-        all_results, processed_keys = self._load_progress()
-        print(f"=== 已加载历史进度: {len(all_results)} 条记录 ===")
+        results, processed_keys = self.load_progress()
+        self.score_table.sync(results, self.progress_file)
+        self.aggregates = ScoreAggregates.load(self.aggregates_file, self.progress_file)
+        print(f"=== 已加载历史进度: {len(results)} 条记录，评分缓存 {len(self.judge_cache)} 条 ===")
         print("=== 开始评测流程 ===\n")
 
-        for method in self.config.methods:
-            for test_type in self.config.test_types:
-                output_path = self.config.get_output_path(method, test_type)
-
-                if not output_path.exists():
-                    print(f"跳过: {output_path.name} 不存在")
-                    continue
-
-                print(f"\n{'=' * 60}")
-                print(f"正在评测: {method} - 类型 {test_type}")
-                print(f"{'=' * 60}")
-
-                try:
-                    with open(output_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                except Exception as e:
-                    print(f"错误：无法读取 {output_path.name}: {e}")
-                    continue
-
-                if not data:
-                    print(f"警告：{output_path.name} 为空")
-                    continue
-
-                # LLM Judge 评分
-                print(f"  > 正在运行 LLM Judge ({len(data)} 条)...")
-                for item in tqdm(data, desc="LLM Judge"):
-                    key = (method, item['question'], "LLM_Judge")
-                    if key in processed_keys:
-                        continue
-
-                    scores = self._evaluate_single(item)
-
-                    record = {
-                        "System": method,
-                        "Type": test_type,
-                        "Question": item['question'],
-                        "Method": "LLM_Judge",
-                        "Score_Faithfulness": scores.get('faithfulness_score', 0),
-                        "Score_Comprehensiveness": scores.get('comprehensiveness_score', 0),
-                        "Score_Relevance": scores.get('relevance_score', 0),
-                        "Reason": scores.get('reason', '')
-                    }
+        latest = {(r["System"], r.get("Type", ""), r["Question"]): r for r in results}
+        superseded = False
+        try:
+            for method in self.config.methods:
+                for test_type in self.config.test_types:
+                    new_records = self._evaluate_testset(method, test_type, processed_keys)
+                    for record in new_records:
+                        key = (record["System"], record["Type"], record["Question"])
+                        superseded |= latest.pop(key, None) is not None
+                        latest[key] = record
+                    # 每个测试集评完后增量追加到评分表；有旧记录被替换时在最后整体重建
+                    if not superseded:
+                        self.score_table.append(new_records)
+        finally:
+            # 正常结束或 Ctrl+C 中断时都保证进度落盘，评分表与进度保持一致
+            self._close_progress()
+            if superseded:
+                self.score_table.rebuild(list(latest.values()))
+            self.score_table.mark_synced(self.progress_file)
+            # 补读本次写入（及其他进程追加）的记录以推进快照偏移，已计入的记录重复计入结果不变
+            self.aggregates.catch_up(self.progress_file)
+            self.aggregates.save(self.aggregates_file)
+
+        all_results = list(latest.values())
 
-                    self._save_progress(record)
-                    all_results.append(record)
-                    processed_keys.add(key)
-
-        # 保存最终结果为 CSV
         if all_results:
-            df = pd.DataFrame(all_results)
-            df.to_csv(self.results_file, index=False, encoding='utf-8-sig')
             print(f"\n{'=' * 60}")
-            print(f"评测完成！共 {len(df)} 条记录")
-            print(f"结果已保存至: {self.results_file}")
+            print(f"评测完成！共 {len(all_results)} 条记录")
+            print(f"评分表已更新: {self.score_table.table_dir}")
+            retry_stats = self.retrier.stats()
+            if retry_stats["retries"] or retry_stats["failed"] or retry_stats["rejected"]:
+                print(f"LLM Judge 重试统计: {retry_stats}")
+            self.print_usage()
+            if export_csv:
+                self.export_csv()
             print(f"{'=' * 60}\n")
         else:
             print("\n没有生成评测数据。")
 
         return all_results
 
-    def get_summary(self, results: List[dict] = None) -> dict:
-        """获取评测摘要"""
-        import pandas as pd
+    def _evaluate_testset(self, method: str, test_type: str,
+                          processed_keys: Dict[Tuple, Optional[str]]) -> List[dict]:
+        """评估单个方法在单个测试集上的结果，返回新增的评分记录"""
+        output_path = self.config.get_output_path(method, test_type)
+
+        if not output_path.exists():
+            print(f"跳过: {output_path.name} 不存在")
+            return []
+
+        print(f"\n{'=' * 60}")
+        print(f"正在评测: {method} - 类型 {test_type}")
+        print(f"{'=' * 60}")
+
+        try:
+            data = load_results(self.config, output_path)
+        except Exception as e:
+            print(f"错误：无法读取 {output_path.name}: {e}")
+            return []
+
+        if not data:
+            print(f"警告：{output_path.name} 为空")
+            return []
+
+        pending, pending_keys = self.select_pending(method, test_type, data, processed_keys)
+        if not pending:
+            return []
+
+        # 本地指标：对整个待评集合一次性批量计算
+        local_metrics = compute_local_metrics(pending) if self.config.local_metrics.enabled else None
+
+        # LLM Judge 评分
+        print(f"  > 正在运行 LLM Judge ({len(pending)}/{len(data)} 条待评)...")
+        new_records = []
+        auto_count = 0
+        cached_count = 0
+        surrogate_count = 0
+        progress = tqdm(pending, desc="LLM Judge")
+        for i, item in enumerate(progress):
+            metrics = metrics_for_row(local_metrics, i) if local_metrics is not None else {}
+            judge_key = pending_keys[i]
+
+            record, source = self.score_item(method, test_type, item, judge_key, metrics)
+            auto_count += source == "auto"
+            cached_count += source == "cache"
+            surrogate_count += source == "surrogate"
+
+            self._save_progress(record)
+            new_records.append(record)
+            if self.aggregates is not None:
+                # 实时摘要：当前方法与测试集各维度的运行均值
+                self.aggregates.update(record)
+                means = self.aggregates.means(method, test_type)
+                progress.set_postfix_str(" ".join(f"{col.split('_')[1][0]}={v:.2f}" for col, v in means.items()))
+            if not self._is_failed(record):
+                processed_keys[(method, test_type, item['question'])] = judge_key
+                if record["Method"] == "LLM_Judge":
+                    self.judge_cache[judge_key] = record
+
+        if auto_count:
+            print(f"  > 本地自动评分 {auto_count} 条，跳过了对应的 LLM Judge 调用")
+        if cached_count:
+            print(f"  > 命中评分缓存 {cached_count} 条，跳过了对应的 LLM Judge 调用")
+        if surrogate_count:
+            print(f"  > 代理模型足够确定 {surrogate_count} 条，跳过了对应的 LLM Judge 调用")
+
+        return new_records
+
+    def evaluate_adaptive(self, budget: Optional[int] = None) -> dict:
+        """序贯提前停止评测：随机交错逐题评分，系统排序在设定置信度下确定（或预算用尽）后停止
+
+        历史进度、本地自动评分与命中评分缓存的记录不消耗调用，作为总体中已确定的部分先全部计入，
+        置信区间只反映需要 LLM Judge 的记录中尚未抽到的部分；未评的记录不写入进度，
+        之后运行完整的 evaluate 仍会补评。返回包含各测试集停止状态与省去调用数的报告。
+        """
+        from .adaptive import critical_value, is_settled, pair_decisions, print_adaptive_report, system_bounds
+
+        ac = self.config.adaptive
+        budget = ac.budget if budget is None else budget
+        rng = random.Random(ac.seed)
+        # 重试统计只反映本次评测（Retrier 在进程内共享）
+        self.retrier.reset_stats()
+        results, processed_keys = self.load_progress()
+        self.score_table.sync(results, self.progress_file)
+        self.aggregates = ScoreAggregates.load(self.aggregates_file, self.progress_file)
+        print(f"=== 已加载历史进度: {len(results)} 条记录，评分缓存 {len(self.judge_cache)} 条 ===")
+
+        latest = {(r["System"], r.get("Type", ""), r["Question"]): r for r in results}
+        new_records = []
+        superseded = False
+        report = {"confidence": ac.confidence, "tolerance": ac.tolerance, "pending": 0, "judged": 0, "avoided": 0,
+                  "types": {}}
+
+        def commit(record: dict, scores: Dict[str, Dict[str, tuple]]):
+            nonlocal superseded
+            self._save_progress(record)
+            key = (record["System"], record["Type"], record["Question"])
+            superseded |= latest.pop(key, None) is not None
+            latest[key] = record
+            new_records.append(record)
+            self.aggregates.update(record)
+            if not self._is_failed(record):
+                processed_keys[key] = record["Judge_Key"]
+                scores[record["System"]][record["Question"]] = tuple(record[col] for col in SCORE_COLS)
+                if record["Method"] == "LLM_Judge":
+                    self.judge_cache[record["Judge_Key"]] = record
+
+        try:
+            for test_type in self.config.test_types:
+                known: Dict[str, Dict[str, tuple]] = {}  # 系统 -> {问题: 三维分数}（无需 LLM Judge 即确定）
+                sampled: Dict[str, Dict[str, tuple]] = {}  # 系统 -> {问题: 三维分数}（序贯评测中评得）
+                unknown: Dict[str, set] = {}  # 系统 -> 需要 LLM Judge 的问题
+                queue = defaultdict(list)  # 问题 -> 需要 LLM Judge 的各系统记录
+                for method in self.config.methods:
+                    output_path = self.config.get_output_path(method, test_type)
+                    if not output_path.exists():
+                        continue
+                    data = load_results(self.config, output_path)
+                    pending, pending_keys = self.select_pending(method, test_type, data, processed_keys)
+                    stale = {item['question'] for item in pending}
+                    known[method], sampled[method], unknown[method] = {}, {}, set()
+                    for item in data:
+                        record = latest.get((method, test_type, item['question']))
+                        if item['question'] not in stale and record and not self._is_failed(record):
+                            known[method][item['question']] = tuple(record[col] for col in SCORE_COLS)
+
+                    local_metrics = compute_local_metrics(pending) if self.config.local_metrics.enabled else None
+                    for i, item in enumerate(pending):
+                        metrics = metrics_for_row(local_metrics, i) if local_metrics is not None else {}
+                        if self._score_locally(test_type, item, pending_keys[i], metrics) is not None:
+                            commit(self.score_item(method, test_type, item, pending_keys[i], metrics)[0], known)
+                        else:
+                            queue[item['question']].append((method, item, pending_keys[i], metrics))
+                            unknown[method].add(item['question'])
+                if len(known) < 2:
+                    continue
 
-        if results is None:
-            results, _ = self._load_progress()
+                order = list(queue)
+                rng.shuffle(order)
+                total = sum(len(v) for v in queue.values())
+                looks = math.ceil(len(order) / max(ac.batch_size, 1)) + 1
+                pairs = len(known) * (len(known) - 1) // 2
+                z = critical_value(ac.confidence, pairs * len(SCORE_COLS) * looks)
+
+                judged = done = 0
+                decisions = pair_decisions(known, sampled, unknown, z, ac.tolerance, ac.min_pairs)
+                settled = is_settled(decisions)
+                exhausted = False
+                print(f"\n正在序贯评测: 类型 {test_type}，{len(known)} 个系统，{total} 条记录需要 LLM Judge")
+                with tqdm(total=total, desc=f"LLM Judge {test_type}") as progress:
+                    for start in range(0, len(order), max(ac.batch_size, 1)):
+                        if settled or exhausted:
+                            break
+                        for question in order[start:start + ac.batch_size]:
+                            for method, item, judge_key, metrics in queue[question]:
+                                if budget and report["judged"] + judged >= budget:
+                                    exhausted = True
+                                    break
+                                record, source = self.score_item(method, test_type, item, judge_key, metrics)
+                                judged += source == "judge"
+                                done += 1
+                                commit(record, sampled)
+                                progress.update()
+                            if exhausted:
+                                break
+                        decisions = pair_decisions(known, sampled, unknown, z, ac.tolerance, ac.min_pairs)
+                        settled = is_settled(decisions)
+
+                report["types"][test_type] = {
+                    "settled": settled, "judged": judged, "avoided": total - done,
+                    "bounds": system_bounds(known, sampled, unknown, z), "decisions": decisions,
+                }
+                report["pending"] += total
+                report["judged"] += judged
+                report["avoided"] += total - done
+                if exhausted:
+                    print(f"已达到 LLM Judge 调用预算 {budget}")
+                    break
+        finally:
+            self._close_progress()
+            if superseded:
+                self.score_table.rebuild(list(latest.values()))
+            else:
+                self.score_table.append(new_records)
+            self.score_table.mark_synced(self.progress_file)
+            self.aggregates.catch_up(self.progress_file)
+            self.aggregates.save(self.aggregates_file)
+
+        report["usage"] = dict(self.usage)
+        print_adaptive_report(report)
+        self.print_usage()
+        return report
+
+    def select_pending(self, method: str, test_type: str, data: List[dict],
+                       processed_keys: Dict[Tuple, Optional[str]]) -> Tuple[List[dict], List[str]]:
+        """只保留新增的、或回答/上下文等评分输入发生变化的记录，返回 (待评记录, 评分缓存键)"""
+        pending, pending_keys = [], []
+        for item in data:
+            judge_key = self.judge_key_for(item)
+            record_key = (method, test_type, item['question'])
+            if record_key in processed_keys:
+                done_key = processed_keys[record_key]
+                # 没有缓存键的旧版记录只剩输出文件中已不存在的问题（其余已在加载进度时补写）
+                if done_key is None or done_key == judge_key:
+                    continue
+            pending.append(item)
+            pending_keys.append(judge_key)
+        return pending, pending_keys
+
+    def _score_locally(self, test_type: str, item: dict, judge_key: str,
+                       metrics: dict) -> Optional[Tuple[dict, str, str]]:
+        """无需调用 LLM Judge 的评分（本地自动评分 / 评分缓存 / 代理模型），返回 (分数, 评分方式, 来源)"""
+        scores = self._auto_score(item, metrics) if metrics else None
+        if scores is not None:
+            return scores, AUTO_METHOD, "auto"
+        if judge_key in self.judge_cache:
+            cached = self.judge_cache[judge_key]
+            scores = {
+                "faithfulness_score": cached["Score_Faithfulness"],
+                "comprehensiveness_score": cached["Score_Comprehensiveness"],
+                "relevance_score": cached["Score_Relevance"],
+                "reason": cached.get("Reason", ""),
+            }
+            return scores, "LLM_Judge", "cache"
+        if self.surrogate is not None:
+            scores = self.surrogate.score(item, self.config.get_max_chars(test_type), metrics)
+            if scores is not None:
+                return scores, SURROGATE_METHOD, "surrogate"
+        return None
+
+    def score_item(self, method: str, test_type: str, item: dict, judge_key: str,
+                   metrics: dict) -> Tuple[dict, str]:
+        """为单条结果生成评分记录，返回 (记录, 来源)，来源为 auto / cache / surrogate / judge"""
+        local = self._score_locally(test_type, item, judge_key, metrics)
+        if local is not None:
+            scores, judge_method, source = local
+        else:
+            scores = self._evaluate_single(item)
+            judge_method, source = "LLM_Judge", "judge"
 
-        if not results:
-            return {}
+        return self.build_record(method, test_type, item, judge_method, scores, judge_key, metrics), source
+
+    @staticmethod
+    def build_record(method: str, test_type: str, item: dict, judge_method: str, scores: dict,
+                     judge_key: str, metrics: dict) -> dict:
+        """组装写入进度文件的评分记录"""
+        return {
+            "System": method,
+            "Type": test_type,
+            "Question": item['question'],
+            "Method": judge_method,
+            "Score_Faithfulness": scores.get('faithfulness_score', 0),
+            "Score_Comprehensiveness": scores.get('comprehensiveness_score', 0),
+            "Score_Relevance": scores.get('relevance_score', 0),
+            "Reason": scores.get('reason', ''),
+            "Judge_Key": judge_key,
+            **metrics
+        }
 
-        df = pd.DataFrame(results)
-        score_cols = ['Score_Faithfulness', 'Score_Comprehensiveness', 'Score_Relevance']
+    def export_csv(self) -> Path:
+        """按需将评分表导出为 CSV"""
+        count = self.score_table.export_csv(self.results_file)
+        print(f"已导出 {count} 条记录至: {self.results_file}")
+        return self.results_file
 
-        for col in score_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    def get_summary(self, results: List[dict] = None) -> dict:
+        """获取评测摘要（由增量汇总给出，不重新读取评分历史）"""
+        if results is not None:
+            return ScoreAggregates.from_records(results).summary()
+        if self.aggregates is None:
+            self.aggregates = ScoreAggregates.load(self.aggregates_file, self.progress_file)
+        return self.aggregates.summary()
+
+    def get_statistics(self, results: List[dict] = None) -> dict:
+        """计算各系统的 bootstrap 置信区间及两两配对置换检验"""
+        from .stats import compare_systems, system_cis
+
+        df = self.score_table.load() if results is None else records_to_frame(results)
+        if df.empty:
+            return {}
 
-        summary = {
-            "by_system_type": df.groupby(['System', 'Type'])[score_cols].mean().round(2).to_dict(),
-            "by_system": df.groupby('System')[score_cols].mean().round(2).to_dict(),
-            "overall": df[score_cols].describe().round(2).to_dict()
+        stats_config = self.config.stats
+        kwargs = {"n_resamples": stats_config.n_resamples, "ci": stats_config.ci, "seed": stats_config.seed}
+        return {
+            "cis": system_cis(df, **kwargs),
+            "comparisons": compare_systems(df, **kwargs),
         }
-
-        return summary
@@ -0,0 +1,184 @@
+"""
+本地参考指标模块（无需调用 LLM）
+
+以 NumPy 批量方式计算回答与标准答案/检索上下文之间的文本重合度指标：
+    - char_f1: 字符级 F1（多重集合重合）
+    - rouge_l: 字符级 ROUGE-L F 值（最长公共子序列）
+    - key_term_recall: 标准答案关键词（去除问题中已出现的字符二元组）在回答中的召回率
+    - context_support: 回答字符二元组在检索上下文中出现的比例（忠实度近似，无上下文时为 NaN）
+文本先去除空白与标点，再转为 Unicode 码位数组参与计算。
+"""
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+# 码位最多 21 位，行号放在高位，组合成唯一的 int64 键
+_CP_BITS = 21
+_BIGRAM_BITS = 2 * _CP_BITS
+
+LOCAL_METRIC_COLS = ['Local_CharF1', 'Local_RougeL', 'Local_KeyTermRecall', 'Local_ContextSupport']
+
+
+def _codepoints(text: str) -> np.ndarray:
+    """去除空白标点后转为码位数组"""
+    cleaned = _NON_WORD.sub("", text or "")
+    return np.frombuffer(cleaned.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+
+
+def _flatten(seqs: List[np.ndarray]):
+    """拼接码位数组，返回 (码位, 行号)"""
+    lengths = np.fromiter((len(s) for s in seqs), dtype=np.int64, count=len(seqs))
+    values = np.concatenate(seqs) if seqs else np.zeros(0, dtype=np.int64)
+    rows = np.repeat(np.arange(len(seqs), dtype=np.int64), lengths)
+    return values, rows, lengths
+
+
+def _bigram_keys(seqs: List[np.ndarray]) -> np.ndarray:
+    """每行的去重字符二元组键（行号 << 42 | 二元组）"""
+    values, rows, _ = _flatten(seqs)
+    if len(values) < 2:
+        return np.zeros(0, dtype=np.int64)
+    # 相邻且属于同一行的字符才构成二元组
+    same_row = rows[1:] == rows[:-1]
+    bigrams = (values[:-1] << _CP_BITS) | values[1:]
+    keys = (rows[1:] << _BIGRAM_BITS) | bigrams
+    return np.unique(keys[same_row])
+
+
+def _rows_of(keys: np.ndarray) -> np.ndarray:
+    return keys >> _BIGRAM_BITS
+
+
+def char_f1(answers: List[np.ndarray], references: List[np.ndarray]) -> np.ndarray:
+    """字符级 F1"""
+    n = len(answers)
+    a_vals, a_rows, a_len = _flatten(answers)
+    r_vals, r_rows, r_len = _flatten(references)
+
+    a_keys, a_counts = np.unique((a_rows << _CP_BITS) | a_vals, return_counts=True)
+    r_keys, r_counts = np.unique((r_rows << _CP_BITS) | r_vals, return_counts=True)
+    common, a_idx, r_idx = np.intersect1d(a_keys, r_keys, assume_unique=True, return_indices=True)
+    overlap = np.bincount(common >> _CP_BITS, weights=np.minimum(a_counts[a_idx], r_counts[r_idx]),
+                          minlength=n)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(a_len > 0, overlap / a_len, 0.0)
+        recall = np.where(r_len > 0, overlap / r_len, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return f1
+
+
+def _lcs_lengths(answers: List[np.ndarray], references: List[np.ndarray]) -> np.ndarray:
+    """批量计算最长公共子序列长度
+
+    逐个回答字符推进 DP 行，每一行对整个批次和所有参考位置一次性计算：
+    候选值 c[j] = max(dp[j], match[j] * (dp[j-1] + 1))，新行为 c 的前缀最大值。
+    """
+    n = len(answers)
+    la = max((len(a) for a in answers), default=0)
+    lr = max((len(r) for r in references), default=0)
+    if n == 0 or la == 0 or lr == 0:
+        return np.zeros(n, dtype=np.int64)
+
+    # 用不同的负数填充，保证填充位置永不匹配
+    a_mat = np.full((n, la), -1, dtype=np.int64)
+    r_mat = np.full((n, lr), -2, dtype=np.int64)
+    for i, (a, r) in enumerate(zip(answers, references)):
+        a_mat[i, :len(a)] = a
+        r_mat[i, :len(r)] = r
+
+    dp = np.zeros((n, lr + 1), dtype=np.int32)
+    for i in range(la):
+        match = r_mat == a_mat[:, i:i + 1]
+        candidate = np.maximum(dp[:, 1:], np.where(match, dp[:, :-1] + 1, 0))
+        dp[:, 1:] = np.maximum.accumulate(candidate, axis=1)
+    return dp[:, -1].astype(np.int64)
+
+
+def rouge_l(answers: List[np.ndarray], references: List[np.ndarray], batch_size: int = 64) -> np.ndarray:
+    """字符级 ROUGE-L F 值（按长度排序分批，减少填充浪费）"""
+    n = len(answers)
+    lcs = np.zeros(n, dtype=np.int64)
+    order = np.argsort([len(a) * 4096 + len(r) for a, r in zip(answers, references)], kind="stable")
+    for start in range(0, n, batch_size):
+        idx = order[start:start + batch_size]
+        lcs[idx] = _lcs_lengths([answers[i] for i in idx], [references[i] for i in idx])
+
+    a_len = np.array([len(a) for a in answers], dtype=np.float64)
+    r_len = np.array([len(r) for r in references], dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(a_len > 0, lcs / a_len, 0.0)
+        recall = np.where(r_len > 0, lcs / r_len, 0.0)
+        f = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return f
+
+
+def _coverage(targets: np.ndarray, pool: np.ndarray, n: int) -> np.ndarray:
+    """每行 targets 中的二元组有多少比例出现在同一行的 pool 中（targets 为空时为 NaN）"""
+    total = np.bincount(_rows_of(targets), minlength=n).astype(np.float64)
+    hit = np.bincount(_rows_of(targets[np.isin(targets, pool, assume_unique=True)]), minlength=n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, hit / total, np.nan)
+
+
+def key_terms(references: List[np.ndarray], questions: Optional[List[np.ndarray]] = None) -> np.ndarray:
+    """标准答案关键词（带行号的二元组键）
+
+    关键词取标准答案中的字符二元组，并去掉问题里已经出现过的部分，
+    避免回答仅复述问题就获得召回；若去除后为空则退回使用全部二元组。
+    """
+    ref_keys = _bigram_keys(references)
+    if questions is None:
+        return ref_keys
+    terms = ref_keys[~np.isin(ref_keys, _bigram_keys(questions), assume_unique=True)]
+    # 关键词被全部去除的行回退为全部二元组
+    empty_rows = np.bincount(_rows_of(terms), minlength=len(references)) == 0
+    return np.union1d(terms, ref_keys[empty_rows[_rows_of(ref_keys)]])
+
+
+def key_term_recall(answers: List[np.ndarray], references: List[np.ndarray],
+                    questions: Optional[List[np.ndarray]] = None) -> np.ndarray:
+    """标准答案关键词在回答中的召回率"""
+    recall = _coverage(key_terms(references, questions), _bigram_keys(answers), len(answers))
+    return np.nan_to_num(recall, nan=0.0)
+
+
+def context_support(answers: List[np.ndarray], contexts: List[np.ndarray]) -> np.ndarray:
+    """回答中有多少比例的二元组能在检索上下文中找到（无上下文时为 NaN）"""
+    n = len(answers)
+    support = _coverage(_bigram_keys(answers), _bigram_keys(contexts), n)
+    has_context = np.array([len(c) > 0 for c in contexts])
+    return np.where(has_context, support, np.nan)
+
+
+def _join_contexts(ctx) -> str:
+    if isinstance(ctx, list):
+        return "\n".join(c for c in ctx if c)
+    return str(ctx or "")
+
+
+def compute_local_metrics(entries: List[dict]) -> Dict[str, np.ndarray]:
+    """对一批结果记录（question/answer/standard_answer/contexts）计算全部本地指标"""
+    answers = [_codepoints(e.get("answer", "")) for e in entries]
+    references = [_codepoints(e.get("standard_answer", "")) for e in entries]
+    questions = [_codepoints(e.get("question", "")) for e in entries]
+    contexts = [_codepoints(_join_contexts(e.get("contexts", []))) for e in entries]
+
+    return {
+        'Local_CharF1': char_f1(answers, references),
+        'Local_RougeL': rouge_l(answers, references),
+        'Local_KeyTermRecall': key_term_recall(answers, references, questions),
+        'Local_ContextSupport': context_support(answers, contexts),
+    }
+
+
+def metrics_for_row(metrics: Dict[str, np.ndarray], i: int) -> dict:
+    """取出第 i 条记录的指标（保留 4 位小数，NaN 转为 None 以便写入 JSON）"""
+    row = {}
+    for col, values in metrics.items():
+        value = float(values[i])
+        row[col] = None if np.isnan(value) else round(value, 4)
+    return row
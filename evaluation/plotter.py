@@ -1,19 +1,40 @@
 """
 评测结果绘图模块
+
+绘图前先用 NumPy 一次性计算各组均值与 bootstrap 置信区间，
+各图表在独立的工作进程中并行渲染；图表输入数据的哈希未变化时跳过重绘。
 """
+import hashlib
 import json
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, List
+
+import matplotlib
 
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import seaborn as sns
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import Config
+from .aggregates import ScoreAggregates, load_aggregates, print_summary
+from .score_table import ScoreTable, SCORE_COLS, records_to_frame
+from .stats import bootstrap_ci
+
+# 柱状图定义：(文件名, 分数列, 调色板, 标题)
+BAR_CHARTS = [
+    ("chart_comprehensiveness", "Score_Comprehensiveness", "viridis", "Comprehensiveness Comparison (1-10 Scale)"),
+    ("chart_faithfulness", "Score_Faithfulness", "magma", "Faithfulness Comparison (1-10 Scale)"),
+    ("chart_relevance", "Score_Relevance", "coolwarm", "Relevance Comparison (1-10 Scale)"),
+]
+HEATMAP_CHART = "chart_heatmap"
 
-SCORE_COLS = ['Score_Faithfulness', 'Score_Comprehensiveness', 'Score_Relevance']
+# 记录各图表输入哈希的文件
+HASH_FILE = ".chart_hashes.json"
 
 
 def setup_plot_style():
@@ -40,115 +61,159 @@ def load_results(progress_file: Path) -> List[dict]:
     return results
 
 
-def plot_results(config: Config = None, results: List[dict] = None):
-    """绘制所有评测图表"""
+def aggregate_scores(df: pd.DataFrame, n_boot: int = 1000, ci: float = 95) -> pd.DataFrame:
+    """按 (System, Type) 计算各分数列的均值、置信区间与样本数"""
+    rng = np.random.default_rng(0)
+    rows = []
+    for (system, test_type), group in df.groupby(['System', 'Type'], observed=True, sort=True):
+        values = group[SCORE_COLS].to_numpy(dtype=np.float64)
+        low, high = bootstrap_ci(values, n_boot=n_boot, ci=ci, rng=rng)
+        means = values.mean(axis=0)
+        for j, col in enumerate(SCORE_COLS):
+            rows.append({
+                "System": str(system), "Type": str(test_type), "Score": col, "n": len(values),
+                "mean": float(means[j]), "ci_low": float(low[j]), "ci_high": float(high[j]),
+            })
+    return pd.DataFrame(rows)
+
+
+def _chart_inputs(df: pd.DataFrame, agg: pd.DataFrame) -> Dict[str, dict]:
+    """整理每张图表所需的最小输入数据（可序列化，用于哈希与传给工作进程）"""
+    inputs = {}
+    for name, col, palette, title in BAR_CHARTS:
+        sub = agg[agg["Score"] == col]
+        inputs[name] = {
+            "kind": "bar", "palette": palette, "title": title,
+            "rows": sub[["System", "Type", "mean", "ci_low", "ci_high"]].round(6).to_dict(orient="records"),
+        }
+    heatmap = df.groupby('System', observed=True)[SCORE_COLS].mean()
+    inputs[HEATMAP_CHART] = {
+        "kind": "heatmap",
+        "index": [str(i) for i in heatmap.index],
+        "columns": list(heatmap.columns),
+        "values": heatmap.round(6).to_numpy().tolist(),
+    }
+    return inputs
+
+
+def _input_hash(chart_input: dict, dpi: int) -> str:
+    payload = json.dumps({"input": chart_input, "dpi": dpi}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _render_chart(chart_input: dict, chart_path: str, dpi: int) -> str:
+    """在工作进程中渲染单张图表"""
+    setup_plot_style()
+
+    if chart_input["kind"] == "bar":
+        rows = pd.DataFrame(chart_input["rows"])
+        systems = list(dict.fromkeys(rows["System"]))
+        types = sorted(rows["Type"].unique())
+        colors = sns.color_palette(chart_input["palette"], len(types))
+        width = 0.8 / len(types)
+        x = np.arange(len(systems))
+
+        fig, ax = plt.subplots(figsize=(12, 6))
+        for k, test_type in enumerate(types):
+            sub = rows[rows["Type"] == test_type].set_index("System").reindex(systems)
+            means = sub["mean"].to_numpy()
+            yerr = np.vstack([means - sub["ci_low"].to_numpy(), sub["ci_high"].to_numpy() - means])
+            ax.bar(x - 0.4 + width * (k + 0.5), means, width, yerr=yerr, color=colors[k],
+                   label=test_type, capsize=0, error_kw={"elinewidth": 2.5, "ecolor": "0.26"})
+        ax.set_xticks(x)
+        ax.set_xticklabels(systems)
+        ax.set_title(chart_input["title"], fontsize=14, fontweight='bold')
+        ax.set_xlabel("System", fontsize=12)
+        ax.set_ylabel("Score", fontsize=12)
+        ax.set_ylim(0, 10.5)
+        ax.legend(title="Type")
+    else:
+        heatmap_data = pd.DataFrame(chart_input["values"], index=chart_input["index"],
+                                    columns=chart_input["columns"])
+        heatmap_data.index.name = "System"
+        fig, ax = plt.subplots(figsize=(10, 8))
+        sns.heatmap(heatmap_data, annot=True, fmt='.2f', cmap='YlGnBu',
+                    linewidths=0.5, vmin=0, vmax=10, ax=ax)
+        ax.set_title("Average Scores Heatmap by System", fontsize=14, fontweight='bold')
+
+    fig.tight_layout()
+    fig.savefig(chart_path, dpi=dpi)
+    plt.close(fig)
+    return chart_path
+
+
+def plot_results(config: Config = None, results: List[dict] = None, preview: bool = False,
+                 force: bool = False):
+    """绘制所有评测图表
+
+    preview=True 时以低 DPI 输出 *_preview.png 预览图；force=True 时忽略哈希强制重绘。
+    """
     if config is None:
         from config import default_config
         config = default_config
 
-    # 加载数据
+    # 加载数据：优先读取列式评分表，没有时回退到进度文件
     if results is None:
-        progress_file = config.paths.output_dir / "evaluation_progress.jsonl"
-        results = load_results(progress_file)
-
-    if not results:
+        df = ScoreTable(config.paths.output_dir / "scores").load()
+        if df.empty:
+            progress_file = config.paths.output_dir / "evaluation_progress.jsonl"
+            results = load_results(progress_file)
+            df = records_to_frame(results) if results else df
+    else:
+        df = records_to_frame(results) if results else None
+
+    if df is None or df.empty:
         print("没有找到评测数据，无法绘图")
         return
 
-    print(f"成功加载 {len(results)} 条评测记录")
+    print(f"成功加载 {len(df)} 条评测记录")
 
-    # 转换为 DataFrame
-    df = pd.DataFrame(results)
-
-    # 转换分数列为数字类型
-    for col in SCORE_COLS:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-    # 设置绘图样式
-    setup_plot_style()
+    plot_config = config.plot
+    dpi = plot_config.preview_dpi if preview else plot_config.dpi
+    suffix = "_preview" if preview else ""
 
     # 确保输出目录存在
     charts_dir = config.paths.charts_dir
     charts_dir.mkdir(parents=True, exist_ok=True)
 
-    # 1. 完整性对比 (Comprehensiveness)
-    plt.figure(figsize=(12, 6))
-    sns.barplot(data=df, x="System", y="Score_Comprehensiveness", hue="Type", palette="viridis")
-    plt.title("Comprehensiveness Comparison (1-10 Scale)", fontsize=14, fontweight='bold')
-    plt.xlabel("System", fontsize=12)
-    plt.ylabel("Score", fontsize=12)
-    plt.ylim(0, 10.5)
-    plt.legend(title="Type")
-    plt.tight_layout()
-    chart_path = charts_dir / "chart_comprehensiveness.png"
-    plt.savefig(chart_path, dpi=300)
-    print(f"✓ 图表已生成: {chart_path}")
-    plt.close()
-
-    # 2. 忠实度对比 (Faithfulness)
-    plt.figure(figsize=(12, 6))
-    sns.barplot(data=df, x="System", y="Score_Faithfulness", hue="Type", palette="magma")
-    plt.title("Faithfulness Comparison (1-10 Scale)", fontsize=14, fontweight='bold')
-    plt.xlabel("System", fontsize=12)
-    plt.ylabel("Score", fontsize=12)
-    plt.ylim(0, 10.5)
-    plt.legend(title="Type")
-    plt.tight_layout()
-    chart_path = charts_dir / "chart_faithfulness.png"
-    plt.savefig(chart_path, dpi=300)
-    print(f"✓ 图表已生成: {chart_path}")
-    plt.close()
-
-    # 3. 相关性对比 (Relevance)
-    plt.figure(figsize=(12, 6))
-    sns.barplot(data=df, x="System", y="Score_Relevance", hue="Type", palette="coolwarm")
-    plt.title("Relevance Comparison (1-10 Scale)", fontsize=14, fontweight='bold')
-    plt.xlabel("System", fontsize=12)
-    plt.ylabel("Score", fontsize=12)
-    plt.ylim(0, 10.5)
-    plt.legend(title="Type")
-    plt.tight_layout()
-    chart_path = charts_dir / "chart_relevance.png"
-    plt.savefig(chart_path, dpi=300)
-    print(f"✓ 图表已生成: {chart_path}")
-    plt.close()
-
-    # 4. 热力图
-    plt.figure(figsize=(10, 8))
-    heatmap_data = df.groupby('System')[SCORE_COLS].mean()
-    sns.heatmap(heatmap_data, annot=True, fmt='.2f', cmap='YlGnBu',
-                linewidths=0.5, vmin=0, vmax=10)
-    plt.title("Average Scores Heatmap by System", fontsize=14, fontweight='bold')
-    plt.tight_layout()
-    chart_path = charts_dir / "chart_heatmap.png"
-    plt.savefig(chart_path, dpi=300)
-    print(f"✓ 图表已生成: {chart_path}")
-    plt.close()
-
-    # 打印统计摘要
-    print_summary(df)
-
-
-def print_summary(df: pd.DataFrame):
-    """打印统计摘要"""
-    print("\n" + "=" * 60)
-    print("评测统计摘要")
-    print("=" * 60)
-
-    # 按系统和类型分组统计
-    print("\n【按系统和类型分组的平均分】")
-    print(df.groupby(['System', 'Type'])[SCORE_COLS].mean().round(2))
-
-    # 按系统整体统计
-    print("\n【按系统整体平均分】")
-    print(df.groupby('System')[SCORE_COLS].mean().round(2))
-
-    # 总体统计
-    print("\n【总体统计】")
-    print(df[SCORE_COLS].describe().round(2))
-
-    print("=" * 60 + "\n")
+    # 一次性计算聚合值与置信区间
+    agg = aggregate_scores(df, n_boot=plot_config.n_boot, ci=plot_config.ci)
+    inputs = _chart_inputs(df, agg)
+
+    # 对比输入哈希，跳过未变化的图表
+    hash_path = charts_dir / HASH_FILE
+    try:
+        old_hashes = json.loads(hash_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        old_hashes = {}
+    new_hashes = dict(old_hashes)
+
+    jobs = []
+    for name, chart_input in inputs.items():
+        chart_path = charts_dir / f"{name}{suffix}.png"
+        digest = _input_hash(chart_input, dpi)
+        new_hashes[chart_path.name] = digest
+        if not force and old_hashes.get(chart_path.name) == digest and chart_path.exists():
+            print(f"- 图表未变化，跳过: {chart_path}")
+            continue
+        jobs.append((chart_input, str(chart_path), dpi))
+
+    if jobs:
+        workers = min(plot_config.workers, len(jobs))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_render_chart, *job) for job in jobs]
+                rendered = [f.result() for f in futures]
+        else:
+            rendered = [_render_chart(*job) for job in jobs]
+        for chart_path in rendered:
+            print(f"✓ 图表已生成: {chart_path}")
+
+    hash_path.write_text(json.dumps(new_hashes, indent=2), encoding="utf-8")
+
+    # 打印统计摘要（增量汇总，不再对 DataFrame 重复分组）
+    aggregates = ScoreAggregates.from_records(results) if results is not None else load_aggregates(config)
+    print_summary(aggregates.summary())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""
+检索质量指标（无需调用 LLM）
+
+以标准答案为参照，在知识库手册中定位"金标准段落"，再检查各方法检索到的 contexts：
+    - 金标准段落：手册按段落切分后，标准答案关键词（local_metrics.key_terms）覆盖率达到
+      gold_threshold 的段落；没有段落达到阈值时取覆盖率最高且不低于 min_gold_coverage 的一段，
+      仍没有则该题不计入 recall
+    - 相关上下文：包含某个金标准段落（段落中 hit_threshold 以上的二元组出现在上下文中），
+      或自身覆盖了 gold_threshold 以上的标准答案关键词
+    - Recall@k: 前 k 个上下文命中的金标准段落占比
+    - MRR: 第一个相关上下文排名的倒数（前 max(ks) 个上下文中没有时为 0）
+    - Precision@k: 前 k 个上下文中相关上下文的比例
+全部计算以带行号的二元组键批量完成，整个测试集秒级完成、零成本，适合快速迭代检索器。
+LightRAG 的上下文是一整段拼接文本（只有 1 个），其 @k 指标等同于 @1。
+"""
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from utils import load_results
+from .local_metrics import _BIGRAM_BITS, _bigram_keys, _codepoints, _rows_of, key_terms
+
+_BIGRAM_MASK = (1 << _BIGRAM_BITS) - 1
+_BLOCK = 256  # 每批处理的记录数，控制中间数组大小
+
+_passage_cache: Dict[tuple, "Handbook"] = {}
+
+
+class Handbook:
+    """切分为段落的知识库文档及其二元组键"""
+
+    def __init__(self, passages: List[str]):
+        self.passages = passages
+        keys = _bigram_keys([_codepoints(p) for p in passages])
+        self.rows = _rows_of(keys)
+        self.bigrams = keys & _BIGRAM_MASK
+        self.counts = np.bincount(self.rows, minlength=len(passages))
+        self.starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+
+def load_handbook(config: Config) -> Handbook:
+    """读取并切分 documents_dir 下的全部文档（文档未变化时复用）"""
+    from methods.ingest import clean_text, split_text
+
+    rm = config.retrieval_metrics
+    paths = config.get_document_paths()
+    cache_key = (tuple((str(p), p.stat().st_mtime) for p in paths), rm.passage_size)
+    if cache_key not in _passage_cache:
+        passages = []
+        for path in paths:
+            raw = path.read_bytes()
+            for encoding in config.ingest.encodings:
+                try:
+                    text = raw.decode(encoding)
+                    break
+                except UnicodeDecodeError:
+                    continue
+            else:
+                print(f"警告: 无法解码 {path.name}，已跳过")
+                continue
+            passages.extend(split_text(clean_text(text), rm.passage_size, 0))
+        _passage_cache[cache_key] = Handbook(passages)
+    return _passage_cache[cache_key]
+
+
+def _expand(starts: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """将若干 [start, start + length) 区间展开，返回 (所属区间编号, 元素下标)"""
+    groups = np.repeat(np.arange(len(lengths)), lengths)
+    offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return groups, np.repeat(starts, lengths) + offsets
+
+
+def _gold(terms: np.ndarray, n: int, handbook: Handbook, rm) -> Tuple[np.ndarray, np.ndarray]:
+    """每条记录的金标准段落，返回 (记录下标, 段落下标) 对，按记录排序"""
+    term_rows = _rows_of(terms)
+    term_bigrams = terms & _BIGRAM_MASK
+    term_count = np.bincount(term_rows, minlength=n)
+
+    # 关键词 × 段落的覆盖矩阵，词表只取本批关键词
+    vocab, inverse = np.unique(term_bigrams, return_inverse=True)
+    queries = np.zeros((n, len(vocab)), dtype=np.float32)
+    queries[term_rows, inverse] = 1
+    in_vocab = np.isin(handbook.bigrams, vocab)
+    passages = np.zeros((len(handbook), len(vocab)), dtype=np.float32)
+    passages[handbook.rows[in_vocab], np.searchsorted(vocab, handbook.bigrams[in_vocab])] = 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coverage = (queries @ passages.T) / term_count[:, None]
+    coverage = np.nan_to_num(coverage, nan=0.0)
+
+    gold = coverage >= rm.gold_threshold
+    # 没有段落达到阈值时退回覆盖率最高的一段
+    best = coverage.argmax(axis=1) if len(handbook) else np.zeros(n, dtype=np.int64)
+    fallback = ~gold.any(axis=1) & (coverage.max(axis=1, initial=0) >= rm.min_gold_coverage)
+    gold[np.flatnonzero(fallback), best[fallback]] = True
+    return np.nonzero(gold)
+
+
+def _block_metrics(entries: List[dict], handbook: Handbook, rm) -> Dict[str, np.ndarray]:
+    n = len(entries)
+    max_k = max(rm.ks)
+    terms = key_terms([_codepoints(e.get("standard_answer", "")) for e in entries],
+                      [_codepoints(e.get("question", "")) for e in entries])
+    term_count = np.bincount(_rows_of(terms), minlength=n)
+    term_starts = np.concatenate([[0], np.cumsum(term_count)[:-1]]).astype(np.int64)
+    term_bigrams = terms & _BIGRAM_MASK
+
+    # 展平前 max_k 个非空上下文
+    ctx_texts, ctx_rec, ctx_rank = [], [], []
+    for r, entry in enumerate(entries):
+        contexts = entry.get("contexts") or []
+        contexts = [c for c in (contexts if isinstance(contexts, list) else [contexts]) if c][:max_k]
+        ctx_texts.extend(contexts)
+        ctx_rec.extend([r] * len(contexts))
+        ctx_rank.extend(range(len(contexts)))
+    nc = len(ctx_texts)
+    ctx_rec = np.array(ctx_rec, dtype=np.int64)
+    ctx_rank = np.array(ctx_rank, dtype=np.int64)
+    n_ctx = np.bincount(ctx_rec, minlength=n)
+    ctx_keys = _bigram_keys([_codepoints(t) for t in ctx_texts])
+
+    # 上下文自身对标准答案关键词的覆盖率
+    ctx_ids, idx = _expand(term_starts[ctx_rec], term_count[ctx_rec])
+    hit = np.isin((ctx_ids << _BIGRAM_BITS) | term_bigrams[idx], ctx_keys)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        term_coverage = np.bincount(ctx_ids[hit], minlength=nc) / term_count[ctx_rec]
+    relevant = np.nan_to_num(term_coverage, nan=0.0) >= rm.gold_threshold
+
+    # 上下文 × 金标准段落：段落二元组出现在上下文中的比例
+    gold_rec, gold_passage = _gold(terms, n, handbook, rm)
+    gold_count = np.bincount(gold_rec, minlength=n)
+    gold_starts = np.concatenate([[0], np.cumsum(gold_count)[:-1]]).astype(np.int64)
+    pair_ctx, idx = _expand(gold_starts[ctx_rec], gold_count[ctx_rec])
+    pair_passage = gold_passage[idx]
+    pair_ids, idx = _expand(handbook.starts[pair_passage], handbook.counts[pair_passage])
+    hit = np.isin((pair_ctx[pair_ids] << _BIGRAM_BITS) | handbook.bigrams[idx], ctx_keys)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        containment = np.bincount(pair_ids[hit], minlength=len(pair_ctx)) / handbook.counts[pair_passage]
+    pair_hit = np.nan_to_num(containment, nan=0.0) >= rm.hit_threshold
+    relevant |= np.bincount(pair_ctx[pair_hit], minlength=nc) > 0
+
+    ranked = np.zeros((n, max_k), dtype=bool)
+    ranked[ctx_rec, ctx_rank] = relevant
+    no_ctx = n_ctx == 0
+    metrics = {}
+
+    # 每个被命中的金标准段落的最早命中排名
+    hit_rec = ctx_rec[pair_ctx[pair_hit]]
+    hit_key = hit_rec * max(len(handbook), 1) + pair_passage[pair_hit]
+    hit_rank = ctx_rank[pair_ctx[pair_hit]]
+    order = np.lexsort((hit_rank, hit_key))
+    _, first = np.unique(hit_key[order], return_index=True)
+    first_rec, first_rank = hit_rec[order][first], hit_rank[order][first]
+    for k in rm.ks:
+        found = np.bincount(first_rec[first_rank < k], minlength=n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            metrics[f"Recall@{k}"] = np.where((gold_count > 0) & ~no_ctx, found / gold_count, np.nan)
+
+    has_relevant = ranked.any(axis=1)
+    metrics["MRR"] = np.where(no_ctx, np.nan, np.where(has_relevant, 1.0 / (ranked.argmax(axis=1) + 1), 0.0))
+    for k in rm.ks:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            metrics[f"Precision@{k}"] = np.where(no_ctx, np.nan,
+                                                 ranked[:, :k].sum(axis=1) / np.minimum(k, n_ctx))
+    metrics["Gold_Passages"] = gold_count.astype(np.float64)
+    return metrics
+
+
+def compute_retrieval_metrics(entries: List[dict], handbook: Handbook, rm) -> Dict[str, np.ndarray]:
+    """对一批结果记录（question/standard_answer/contexts）逐条计算检索指标（无上下文的记录为 NaN）"""
+    blocks = [_block_metrics(entries[i:i + _BLOCK], handbook, rm) for i in range(0, len(entries), _BLOCK)]
+    if not blocks:
+        return {}
+    return {col: np.concatenate([b[col] for b in blocks]) for col in blocks[0]}
+
+
+def summarize(metrics: Dict[str, np.ndarray]) -> dict:
+    """各指标的均值（忽略 NaN），以及参与计算的记录数"""
+    summary = {}
+    for col, values in metrics.items():
+        valid = values[~np.isnan(values)]
+        summary[col] = round(float(valid.mean()), 4) if len(valid) else None
+    if "MRR" in metrics:
+        summary["Scored"] = int((~np.isnan(metrics["MRR"])).sum())
+    return summary
+
+
+def evaluate_retrieval(config: Config, methods: Optional[List[str]] = None,
+                       test_types: Optional[List[str]] = None):
+    """对已生成的结果文件计算检索指标，返回汇总 DataFrame 并保存为 CSV"""
+    import pandas as pd
+
+    handbook = load_handbook(config)
+    print(f"知识库切分为 {len(handbook)} 个段落（段落长度 {config.retrieval_metrics.passage_size}）")
+    rows = []
+    for method in methods or config.methods:
+        for test_type in test_types or config.test_types:
+            output_path = config.get_output_path(method, test_type)
+            if not output_path.exists():
+                continue
+            records = load_results(config, output_path)
+            summary = summarize(compute_retrieval_metrics(records, handbook, config.retrieval_metrics))
+            if not summary.get("Scored"):
+                continue  # 没有检索上下文（如 Pure LLM）
+            rows.append({"System": method, "Type": test_type, "Questions": len(records), **summary})
+
+    df = pd.DataFrame(rows)
+    if df.empty:
+        print("没有可计算检索指标的结果（需要包含 contexts 的输出文件）。")
+        return df
+    result_path = config.paths.output_dir / "retrieval_metrics.csv"
+    df.to_csv(result_path, index=False, encoding="utf-8-sig")
+    print(df.to_string(index=False))
+    print(f"\n检索指标已保存至: {result_path}")
+    return df
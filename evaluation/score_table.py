@@ -0,0 +1,148 @@
+"""
+列式评分表模块
+
+评分结果以 Parquet 分片的形式增量追加到 output/scores/ 目录：
+System/Type/Method 为类别列，三个分数列为整数列，本地指标列为浮点列，加载和分组无需再做类型转换。
+CSV 仅在需要时通过 export_csv 导出。
+评分表目录下的 sync.json 记录上次同步时进度文件的字节偏移与指纹，进度文件被追加或改写后重建评分表。
+"""
+import json
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+from utils.wal import log_fingerprint
+from .local_metrics import LOCAL_METRIC_COLS
+
+SCORE_COLS = ['Score_Faithfulness', 'Score_Comprehensiveness', 'Score_Relevance']
+CATEGORY_COLS = ['System', 'Type', 'Method']
+TEXT_COLS = ['Question', 'Reason']
+BASE_COLS = ['System', 'Type', 'Question', 'Method'] + SCORE_COLS + ['Reason']
+
+
+def records_to_frame(records: List[dict]) -> pd.DataFrame:
+    """将评分记录列表转换为带类型的 DataFrame"""
+    df = pd.DataFrame(records)
+    for col in BASE_COLS:
+        if col not in df.columns:
+            df[col] = 0 if col in SCORE_COLS else ""
+    return apply_schema(df)
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """统一列类型：类别列、整数分数列、字符串文本列"""
+    for col in SCORE_COLS:
+        if df[col].dtype.kind not in "iu":
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).round()
+        df[col] = df[col].astype('int8')
+    for col in LOCAL_METRIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    for col in CATEGORY_COLS:
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str).astype('category')
+    for col in TEXT_COLS:
+        df[col] = df[col].fillna("").astype(str)
+    return df
+
+
+class ScoreTable:
+    """基于 Parquet 分片的增量评分表"""
+
+    PART_PATTERN = "part-*.parquet"
+    SYNC_FILE = "sync.json"
+
+    def __init__(self, table_dir: Path):
+        self.table_dir = Path(table_dir)
+
+    def _parts(self) -> List[Path]:
+        """按写入顺序返回所有分片文件"""
+        if not self.table_dir.exists():
+            return []
+        return sorted(self.table_dir.glob(self.PART_PATTERN))
+
+    def _next_part_path(self) -> Path:
+        """生成下一个分片的文件名"""
+        parts = self._parts()
+        index = int(parts[-1].stem.split("-")[1]) + 1 if parts else 0
+        return self.table_dir / f"part-{index:06d}.parquet"
+
+    def __len__(self) -> int:
+        """从 Parquet 元数据读取总行数，不加载数据"""
+        import pyarrow.parquet as pq
+        return sum(pq.read_metadata(p).num_rows for p in self._parts())
+
+    def append(self, records: List[dict]):
+        """将一批评分记录追加为一个新分片"""
+        if not records:
+            return
+        self.table_dir.mkdir(parents=True, exist_ok=True)
+        df = records_to_frame(records)
+        df.to_parquet(self._next_part_path(), index=False)
+
+    def rebuild(self, records: List[dict]):
+        """清空并用给定记录重建评分表"""
+        for part in self._parts():
+            part.unlink()
+        self.append(records)
+
+    def compact(self):
+        """将所有分片合并为单个分片"""
+        parts = self._parts()
+        if len(parts) <= 1:
+            return
+        df = self.load()
+        tmp_path = self.table_dir / "compact.tmp"
+        df.to_parquet(tmp_path, index=False)
+        for part in parts:
+            part.unlink()
+        tmp_path.rename(self.table_dir / f"part-{0:06d}.parquet")
+
+    @staticmethod
+    def _progress_state(progress_file: Path) -> dict:
+        """进度文件当前的字节偏移与指纹"""
+        progress_file = Path(progress_file)
+        offset = progress_file.stat().st_size if progress_file.exists() else 0
+        return {"offset": offset, "fingerprint": log_fingerprint(progress_file, offset)}
+
+    def _read_sync_state(self) -> dict:
+        try:
+            with open(self.table_dir / self.SYNC_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def mark_synced(self, progress_file: Path):
+        """记录评分表已与进度文件的当前内容一致"""
+        self.table_dir.mkdir(parents=True, exist_ok=True)
+        state = {**self._progress_state(progress_file), "rows": len(self)}
+        with open(self.table_dir / self.SYNC_FILE, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    def sync(self, records: List[dict], progress_file: Path):
+        """进度文件自上次同步后被追加、改写或替换（偏移、指纹或行数不一致）时重建评分表"""
+        state = self._read_sync_state()
+        expected = {**self._progress_state(progress_file), "rows": len(records)}
+        if state != expected or len(self) != len(records):
+            self.rebuild(records)
+            self.mark_synced(progress_file)
+
+    def load(self) -> pd.DataFrame:
+        """加载全部分片为带类型的 DataFrame"""
+        parts = self._parts()
+        if not parts:
+            return records_to_frame([])
+        frames = [pd.read_parquet(p) for p in parts]
+        # 各分片的类别集合可能不同，合并后重新统一为类别列
+        for frame in frames:
+            for col in CATEGORY_COLS:
+                frame[col] = frame[col].astype(str)
+        return apply_schema(pd.concat(frames, ignore_index=True))
+
+    def export_csv(self, csv_path: Path) -> int:
+        """按需导出为 CSV，返回导出行数"""
+        df = self.load()
+        csv_path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+        return len(df)
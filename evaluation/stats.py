@@ -0,0 +1,137 @@
+"""
+评测结果统计分析模块
+
+全部以 NumPy 矩阵运算实现，一次生成全部重采样：
+    - bootstrap_ci: 各 (System, Type, 维度) 均值的 bootstrap 置信区间
+    - paired_permutation_test: 同一测试集上两系统按问题配对的符号翻转置换检验
+p 值同时给出 Holm 多重比较校正结果，用于区分真实差异与随机波动。
+"""
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from .score_table import SCORE_COLS
+
+
+def bootstrap_ci(values: np.ndarray, n_boot: int = 1000, ci: float = 95,
+                 rng: np.random.Generator = None) -> np.ndarray:
+    """向量化 bootstrap 均值置信区间
+
+    values 形状为 (n, k)，一次性生成 (n_boot, n) 的重采样下标矩阵，
+    返回形状为 (2, k) 的 [下界, 上界]。
+    """
+    if rng is None:
+        rng = np.random.default_rng(0)
+    n = len(values)
+    if n < 2:
+        mean = values.mean(axis=0) if n else np.zeros(values.shape[1])
+        return np.vstack([mean, mean])
+    idx = rng.integers(0, n, size=(n_boot, n))
+    boot_means = values[idx].mean(axis=1)
+    alpha = (100 - ci) / 2
+    return np.percentile(boot_means, [alpha, 100 - alpha], axis=0)
+
+
+def paired_permutation_test(diffs: np.ndarray, n_resamples: int = 10000,
+                            rng: np.random.Generator = None) -> np.ndarray:
+    """配对差值的双侧符号翻转置换检验
+
+    diffs 形状为 (n, k)，原假设下每个配对差值的符号可随机翻转；
+    生成 (n_resamples, n) 的 ±1 矩阵，与差值矩阵相乘即得到全部置换统计量。
+    返回形状为 (k,) 的 p 值。
+    """
+    if rng is None:
+        rng = np.random.default_rng(0)
+    n = len(diffs)
+    if n == 0:
+        return np.ones(diffs.shape[1])
+    observed = np.abs(diffs.mean(axis=0))
+    signs = rng.integers(0, 2, size=(n_resamples, n), dtype=np.int8) * 2 - 1
+    perm_means = np.abs(signs @ diffs) / n
+    # 浮点误差容忍，保证与观测值相等的置换被计入
+    extreme = (perm_means >= observed - 1e-12).sum(axis=0)
+    return (extreme + 1) / (n_resamples + 1)
+
+
+def holm_adjust(p_values: np.ndarray) -> np.ndarray:
+    """Holm-Bonferroni 多重比较校正"""
+    m = len(p_values)
+    if m == 0:
+        return p_values
+    order = np.argsort(p_values)
+    adjusted = np.minimum(1.0, np.maximum.accumulate(p_values[order] * (m - np.arange(m))))
+    result = np.empty(m)
+    result[order] = adjusted
+    return result
+
+
+def system_cis(df: pd.DataFrame, n_resamples: int = 10000, ci: float = 95, seed: int = 0) -> pd.DataFrame:
+    """各 (System, Type) 在每个评分维度上的均值与 bootstrap 置信区间"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for (system, test_type), group in df.groupby(['System', 'Type'], observed=True, sort=True):
+        values = group[SCORE_COLS].to_numpy(dtype=np.float64)
+        low, high = bootstrap_ci(values, n_boot=n_resamples, ci=ci, rng=rng)
+        means = values.mean(axis=0)
+        for j, col in enumerate(SCORE_COLS):
+            rows.append({
+                "System": str(system), "Type": str(test_type), "Score": col, "n": len(values),
+                "mean": means[j], "ci_low": low[j], "ci_high": high[j],
+            })
+    return pd.DataFrame(rows)
+
+
+def compare_systems(df: pd.DataFrame, n_resamples: int = 10000, ci: float = 95, seed: int = 0) -> pd.DataFrame:
+    """同一测试集内两两比较系统：配对差值均值、差值置信区间与置换检验 p 值"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for test_type, type_df in df.groupby('Type', observed=True, sort=True):
+        # 问题 × 系统 的分数宽表，按问题配对
+        wide = type_df.pivot_table(index='Question', columns='System', values=SCORE_COLS,
+                                   aggfunc='last', observed=True)
+        systems = sorted(type_df['System'].astype(str).unique())
+        for sys_a, sys_b in combinations(systems, 2):
+            a = wide.xs(sys_a, axis=1, level='System')[SCORE_COLS]
+            b = wide.xs(sys_b, axis=1, level='System')[SCORE_COLS]
+            paired = a.notna().all(axis=1) & b.notna().all(axis=1)
+            diffs = (a[paired] - b[paired]).to_numpy(dtype=np.float64)
+            p_values = paired_permutation_test(diffs, n_resamples=n_resamples, rng=rng)
+            low, high = bootstrap_ci(diffs, n_boot=n_resamples, ci=ci, rng=rng) if len(diffs) \
+                else (np.full(len(SCORE_COLS), np.nan),) * 2
+            means = diffs.mean(axis=0) if len(diffs) else np.full(len(SCORE_COLS), np.nan)
+            for j, col in enumerate(SCORE_COLS):
+                rows.append({
+                    "Type": str(test_type), "Score": col, "System_A": sys_a, "System_B": sys_b,
+                    "n_pairs": len(diffs), "mean_diff": means[j],
+                    "diff_ci_low": low[j], "diff_ci_high": high[j], "p_value": p_values[j],
+                })
+
+    result = pd.DataFrame(rows)
+    if not result.empty:
+        result["p_holm"] = holm_adjust(result["p_value"].to_numpy())
+    return result
+
+
+def print_stats(cis: pd.DataFrame, comparisons: pd.DataFrame, alpha: float = 0.05):
+    """打印置信区间与显著性检验结果"""
+    print("\n" + "=" * 60)
+    print("统计分析（bootstrap 置信区间 + 配对置换检验）")
+    print("=" * 60)
+
+    if not cis.empty:
+        print("\n【均值与置信区间】")
+        view = cis.assign(CI=cis.apply(lambda r: f"[{r.ci_low:.2f}, {r.ci_high:.2f}]", axis=1))
+        print(view.pivot_table(index=['System', 'Type'], columns='Score', values='CI', aggfunc='first'))
+
+    if not comparisons.empty:
+        print(f"\n【两两比较】（差值 = System_A - System_B，Holm 校正后 p < {alpha} 标记为 *）")
+        view = comparisons.copy()
+        view["sig"] = np.where(view["p_holm"] < alpha, "*", "")
+        for col in ["mean_diff", "diff_ci_low", "diff_ci_high"]:
+            view[col] = view[col].round(2)
+        for col in ["p_value", "p_holm"]:
+            view[col] = view[col].round(4)
+        print(view.to_string(index=False))
+
+    print("=" * 60 + "\n")
@@ -0,0 +1,310 @@
+"""
+本地评分代理模型（main.py surrogate 训练，evaluate --surrogate 使用）
+
+用历史 LLM Judge 评分训练一个只依赖 CPU 特征的轻量模型，预测三个维度的分数并给出校准的不确定度：
+    - 特征：本地文本重合度指标（local_metrics）、回答 / 标准答案 / 上下文长度、回答占长度限制的比例等
+    - 模型：标准化特征上的岭回归，三个维度共用特征
+    - 不确定度：归一化的分割共形预测，由 K 折交叉验证的样本外残差估计，
+      另用一个岭回归预测残差大小，使区间宽度随样本难度变化
+评测时三个维度的预测区间半宽都不超过 max_width 的记录直接采用代理评分（Method 为 Local_Surrogate），
+其余记录仍交给 LLM Judge。代理模型与训练时的评分模型、Prompt 版本绑定，二者变化后需要重新训练。
+无法确定 Prompt 版本的历史评分（无缓存键的记录、CSV、补写键的旧版记录）默认不参与训练；
+训练时开启 surrogate.include_legacy（surrogate --include-legacy）则视为当前 Prompt 版本的评分参与训练，
+参与的条数记入模型（meta.legacy_records），评测时直接使用该模型并提示其中含旧版评分。
+"""
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from utils import load_results, read_log
+from .local_metrics import LOCAL_METRIC_COLS, compute_local_metrics
+from .score_table import SCORE_COLS
+
+SURROGATE_METHOD = "Local_Surrogate"
+MODEL_VERSION = 1
+
+FEATURE_NAMES = LOCAL_METRIC_COLS + [
+    "has_context", "log_answer_len", "log_reference_len", "log_context_len", "n_contexts",
+    "length_ratio", "budget_ratio",
+]
+
+
+def _context_list(entry: dict) -> List[str]:
+    ctx = entry.get("contexts") or []
+    return [c for c in (ctx if isinstance(ctx, list) else [ctx]) if c]
+
+
+def build_features(entries: List[dict], max_chars: List[int],
+                   metrics: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+    """评分输入 -> 特征矩阵 (n, len(FEATURE_NAMES))；metrics 为已算好的本地指标（可省略）"""
+    if metrics is None:
+        metrics = compute_local_metrics(entries)
+    n = len(entries)
+    features = np.zeros((n, len(FEATURE_NAMES)), dtype=np.float64)
+    for j, col in enumerate(LOCAL_METRIC_COLS):
+        features[:, j] = np.nan_to_num(np.asarray(metrics[col], dtype=np.float64), nan=0.0)
+    for i, entry in enumerate(entries):
+        contexts = _context_list(entry)
+        answer_len = len(entry.get("answer") or "")
+        reference_len = len(entry.get("standard_answer") or "")
+        features[i, 4:] = [
+            1.0 if contexts else 0.0,
+            math.log1p(answer_len),
+            math.log1p(reference_len),
+            math.log1p(sum(len(c) for c in contexts)),
+            len(contexts),
+            answer_len / max(reference_len, 1),
+            answer_len / max(max_chars[i], 1),
+        ]
+    return features
+
+
+def _ridge(x: np.ndarray, y: np.ndarray, alpha: float) -> np.ndarray:
+    """带截距的岭回归（截距不参与惩罚），返回 (d + 1, k) 的系数"""
+    xb = np.hstack([np.ones((len(x), 1)), x])
+    penalty = alpha * np.eye(xb.shape[1])
+    penalty[0, 0] = 0
+    return np.linalg.solve(xb.T @ xb + penalty, xb.T @ y)
+
+
+def _apply(x: np.ndarray, coef: np.ndarray) -> np.ndarray:
+    return coef[0] + x @ coef[1:]
+
+
+class JudgeSurrogate:
+    """岭回归评分代理 + 归一化共形区间"""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray, coef: np.ndarray, sigma_coef: np.ndarray,
+                 quantile: np.ndarray, max_width: float, meta: dict = None):
+        self.mean = mean
+        self.scale = scale
+        self.coef = coef
+        self.sigma_coef = sigma_coef
+        self.quantile = quantile  # 每个维度的共形分位数（残差 / 预测残差）
+        self.max_width = max_width
+        self.meta = meta or {}
+
+    _SIGMA_FLOOR = 0.25  # 预测残差的下限，避免区间宽度被压到 0
+
+    @staticmethod
+    def _fit_once(x: np.ndarray, y: np.ndarray, alpha: float):
+        mean, scale = x.mean(axis=0), x.std(axis=0)
+        scale[scale == 0] = 1
+        z = (x - mean) / scale
+        coef = _ridge(z, y, alpha)
+        return mean, scale, coef
+
+    @classmethod
+    def fit(cls, x: np.ndarray, y: np.ndarray, alpha: float = 1.0, folds: int = 5, coverage: float = 0.9,
+            max_width: float = 1.5, seed: int = 0, meta: dict = None) -> Tuple["JudgeSurrogate", dict]:
+        """训练并用 K 折交叉验证校准区间，返回 (模型, 交叉验证报告)"""
+        n = len(x)
+        fold_of = np.random.default_rng(seed).permutation(n) % max(2, min(folds, n))
+        k = fold_of.max() + 1
+
+        # 第一轮：样本外预测与残差
+        oof = np.zeros_like(y)
+        for f in range(k):
+            train, test = fold_of != f, fold_of == f
+            mean, scale, coef = cls._fit_once(x[train], y[train], alpha)
+            oof[test] = _apply((x[test] - mean) / scale, coef)
+        residual = np.abs(y - oof)
+
+        # 第二轮：样本外的残差大小预测，得到归一化的一致性分数
+        sigma = np.zeros_like(y)
+        for f in range(k):
+            train, test = fold_of != f, fold_of == f
+            mean, scale, coef = cls._fit_once(x[train], residual[train], alpha)
+            sigma[test] = np.maximum(_apply((x[test] - mean) / scale, coef), cls._SIGMA_FLOOR)
+        scores = residual / sigma
+        level = min(1.0, math.ceil((n + 1) * coverage) / n)
+        quantile = np.quantile(scores, level, axis=0, method="higher")
+
+        mean, scale, coef = cls._fit_once(x, y, alpha)
+        sigma_coef = _ridge((x - mean) / scale, residual, alpha)
+        model = cls(mean, scale, coef, sigma_coef, quantile, max_width, meta)
+
+        # 交叉验证报告：区间覆盖率、可直接采用代理评分的比例及其误差
+        half = sigma * quantile
+        confident = (half <= max_width).all(axis=1)
+        error = np.abs(np.clip(np.rint(oof), 1, 10) - y)
+        confident_mae = error[confident].mean(axis=0).round(3).tolist() if confident.any() else [None] * y.shape[1]
+        report = {
+            "records": n,
+            "mae": dict(zip(SCORE_COLS, error.mean(axis=0).round(3).tolist())),
+            "coverage": dict(zip(SCORE_COLS, (residual <= half).mean(axis=0).round(3).tolist())),
+            "confident_share": round(float(confident.mean()), 3),
+            "confident_mae": dict(zip(SCORE_COLS, confident_mae)),
+        }
+        return model, report
+
+    def predict(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (预测分数, 区间半宽)，形状均为 (n, 3)"""
+        z = (x - self.mean) / self.scale
+        prediction = _apply(z, self.coef)
+        half = np.maximum(_apply(z, self.sigma_coef), self._SIGMA_FLOOR) * self.quantile
+        return prediction, half
+
+    def score(self, entry: dict, max_chars: int, metrics: dict = None) -> Optional[dict]:
+        """足够确定时返回评分（与 LLM Judge 结果格式相同），否则返回 None"""
+        row_metrics = {col: np.array([metrics[col]]) for col in LOCAL_METRIC_COLS} \
+            if metrics and all(col in metrics for col in LOCAL_METRIC_COLS) else None
+        prediction, half = self.predict(build_features([entry], [max_chars], row_metrics))
+        if (half[0] > self.max_width).any():
+            return None
+        scores = np.clip(np.rint(prediction[0]), 1, 10).astype(int)
+        return {
+            "faithfulness_score": int(scores[0]),
+            "comprehensiveness_score": int(scores[1]),
+            "relevance_score": int(scores[2]),
+            "reason": "代理评分：" + "，".join(f"{p:.1f}±{h:.1f}" for p, h in zip(prediction[0], half[0])),
+        }
+
+    def save(self, path: Path):
+        data = {
+            "version": MODEL_VERSION,
+            "features": FEATURE_NAMES,
+            "mean": self.mean.tolist(), "scale": self.scale.tolist(),
+            "coef": self.coef.tolist(), "sigma_coef": self.sigma_coef.tolist(),
+            "quantile": self.quantile.tolist(), "max_width": self.max_width,
+            "meta": self.meta,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> "JudgeSurrogate":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MODEL_VERSION or data.get("features") != FEATURE_NAMES:
+            raise ValueError("代理模型版本或特征与当前代码不一致，请重新训练")
+        arrays = {k: np.asarray(data[k], dtype=np.float64)
+                  for k in ("mean", "scale", "coef", "sigma_coef", "quantile")}
+        return cls(max_width=data["max_width"], meta=data.get("meta", {}), **arrays)
+
+
+def _read_history(path: Path) -> List[dict]:
+    """额外的历史评分：评分表导出的 CSV 或 JSONL 进度文件"""
+    path = Path(path)
+    if path.suffix == ".csv":
+        import pandas as pd
+        return pd.read_csv(path).to_dict(orient="records")
+    return list(read_log(path))
+
+
+def _is_legacy(record: dict) -> bool:
+    """评分 Prompt 版本无法确定的记录（无缓存键，或缓存键为加载进度时按当前版本补写）"""
+    key = record.get("Judge_Key")
+    return not (isinstance(key, str) and key) or bool(record.get("Legacy"))
+
+
+def training_data(config: Config, history: List[Path] = ()) -> Tuple[List[dict], np.ndarray, int]:
+    """历史 LLM Judge 评分与结果文件中的评分输入配对，返回 (评分输入, 分数矩阵, 旧版记录数)
+
+    同一 (System, Type, Question) 以进度文件中的记录为准；记录的评分缓存键与当前回答不一致时
+    （回答已重新生成）跳过；未开启 surrogate.include_legacy 时跳过旧版记录（旧版记录数为跳过的条数，
+    开启时为参与训练的条数）。
+    """
+    from .evaluator import is_failed, judge_key, prompt_version, read_progress
+
+    records = {}
+    for path in history:
+        for r in _read_history(path):
+            records[(str(r.get("System")), str(r.get("Type")), str(r.get("Question")))] = r
+    latest, _ = read_progress(config.paths.output_dir / "evaluation_progress.jsonl")
+    records.update(latest)
+    records = {k: r for k, r in records.items() if r.get("Method") == "LLM_Judge" and not is_failed(r)}
+
+    version = prompt_version(config.judge.reason)
+    entries, targets = [], []
+    legacy = 0
+    for system, test_type in sorted({k[:2] for k in records}):
+        output_path = config.get_output_path(system, test_type)
+        if not output_path.exists():
+            continue
+        for item in load_results(config, output_path):
+            record = records.get((system, test_type, item["question"]))
+            if record is None:
+                continue
+            if _is_legacy(record):
+                legacy += 1
+                if not config.surrogate.include_legacy:
+                    continue
+            elif record["Judge_Key"] != judge_key(config.api.judge_model_name, item, version):
+                continue
+            entries.append(dict(item, test_type=test_type))
+            targets.append([float(record[col]) for col in SCORE_COLS])
+    return entries, np.array(targets, dtype=np.float64).reshape(len(targets), len(SCORE_COLS)), legacy
+
+
+def _expected_meta(config: Config) -> dict:
+    from .evaluator import prompt_version
+
+    return {"judge_model": config.api.judge_model_name, "prompt_version": prompt_version(config.judge.reason)}
+
+
+def train_surrogate(config: Config, history: List[Path] = ()) -> Tuple[Optional[JudgeSurrogate], dict]:
+    """训练代理模型并保存，返回 (模型, 交叉验证报告)；训练样本不足时模型为 None"""
+    sc = config.surrogate
+    entries, y, legacy = training_data(config, history)
+    if legacy and sc.include_legacy:
+        print(f"训练样本中有 {legacy} 条无法确定评分 Prompt 版本的旧版记录，按当前 Prompt 版本的评分使用")
+    elif legacy:
+        print(f"已跳过 {legacy} 条无法确定评分 Prompt 版本的旧版记录（--include-legacy 可纳入训练）")
+        legacy = 0
+    if len(entries) < sc.min_train:
+        print(f"训练样本不足: {len(entries)} 条（至少需要 {sc.min_train} 条 LLM Judge 评分）")
+        return None, {"records": len(entries)}
+    x = build_features(entries, [config.get_max_chars(e["test_type"]) for e in entries])
+    meta = _expected_meta(config)
+    meta["legacy_records"] = legacy
+    model, report = JudgeSurrogate.fit(x, y, alpha=sc.alpha, folds=sc.folds, coverage=sc.coverage,
+                                       max_width=sc.max_width, seed=sc.seed, meta=meta)
+    model.save(config.paths.surrogate_model)
+    print(f"代理模型已保存至: {config.paths.surrogate_model}")
+    return model, report
+
+
+def load_surrogate(config: Config) -> Optional[JudgeSurrogate]:
+    """加载代理模型；不存在或与当前评分模型 / Prompt 版本不一致时返回 None
+
+    训练时纳入的旧版评分（meta.legacy_records）是训练时的显式选择，加载时只提示不拒绝。
+    """
+    path = config.paths.surrogate_model
+    if not path.exists():
+        print(f"警告: 代理模型不存在（{path}），请先运行 python main.py surrogate")
+        return None
+    try:
+        model = JudgeSurrogate.load(path)
+    except (OSError, ValueError, KeyError, json.JSONDecodeError) as e:
+        print(f"警告: 无法加载代理模型: {e}")
+        return None
+    if any(model.meta.get(k) != v for k, v in _expected_meta(config).items()):
+        print("警告: 代理模型的评分模型或 Prompt 版本与当前配置不一致，已停用，请重新训练")
+        return None
+    if model.meta.get("legacy_records"):
+        print(f"注意: 代理模型训练样本中含 {model.meta['legacy_records']} 条旧版评分（训练时 --include-legacy）")
+    model.max_width = config.surrogate.max_width
+    return model
+
+
+def print_surrogate_report(report: dict):
+    """打印交叉验证报告"""
+    print("\n" + "=" * 60)
+    print(f"代理模型交叉验证（{report['records']} 条历史评分）")
+    print("=" * 60)
+    if "mae" not in report:
+        print("未训练")
+    else:
+        print(f"平均绝对误差（取整后）: {report['mae']}")
+        print(f"预测区间覆盖率: {report['coverage']}")
+        print(f"可直接采用代理评分的比例: {report['confident_share']:.1%}，这部分的平均绝对误差: "
+              f"{report['confident_mae']}")
+    print("=" * 60 + "\n")
@@ -9,6 +9,11 @@ RAG 评测框架主入口
     python main.py evaluate                               # 评估所有结果
     python main.py plot                                   # 绘制图表
     python main.py pipeline                               # 完整流程（运行+评估+绘图）
+    python main.py serve                                  # 常驻 HTTP 查询服务
+    python main.py ingest                                 # 增量导入知识库文档（Naive RAG）
+    python main.py export-index                           # 导出 Naive RAG 索引快照
+    python main.py worker                                 # 从共享任务队列领取任务（可多进程 / 多主机）
+    python main.py sweep --param embedchain.chunk_size=500,1000  # RAG 配置参数扫描
 """
 import argparse
 import sys
@@ -18,12 +23,15 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config import Config
-from methods import get_method, METHOD_REGISTRY
-from evaluation import Evaluator, plot_results
+
+# 注意：methods / evaluation 依赖较重（openai、pandas、matplotlib 等），
+# 统一在各子命令内部按需导入，保证 --help 等轻量命令快速启动。
 
 
 def cmd_run(args, config: Config):
     """运行指定方法生成回答"""
+    from methods import get_method, METHOD_REGISTRY
+
     if args.all:
         methods_to_run = config.methods
     elif args.method:
@@ -36,6 +44,10 @@ def cmd_run(args, config: Config):
 
     # 临时修改配置
     config.test_types = test_types
+    if getattr(args, "batch_embed", False):
+        config.embedchain.prefetch_embeddings = True
+    if getattr(args, "pipeline", False):
+        config.pipeline.enabled = True
 
     for method_name in methods_to_run:
         if method_name not in METHOD_REGISTRY:
@@ -58,25 +70,145 @@ def cmd_run(args, config: Config):
 
 def cmd_evaluate(args, config: Config):
     """评估所有方法的结果"""
+    if getattr(args, "retrieval", False):
+        # 只计算检索指标：不调用 LLM，秒级完成
+        from evaluation.retrieval_metrics import evaluate_retrieval
+
+        config.prepare()
+        evaluate_retrieval(config)
+        return
+
+    from evaluation import Evaluator
+
+    if getattr(args, "surrogate", False):
+        config.surrogate.enabled = True
+    if getattr(args, "adaptive", False):
+        # 序贯提前停止：系统排序确定后不再评分
+        if args.confidence:
+            config.adaptive.confidence = args.confidence
+        Evaluator(config).evaluate_adaptive(budget=args.budget)
+        return
+
     print("\n" + "=" * 70)
     print("开始评估流程")
     print("=" * 70)
 
     evaluator = Evaluator(config)
-    results = evaluator.evaluate_all()
+    results = evaluator.evaluate_all(export_csv=getattr(args, "csv", False))
 
     if results:
-        summary = evaluator.get_summary(results)
+        from evaluation.aggregates import print_summary
+
+        print_summary(evaluator.get_summary())
+        if getattr(args, "stats", False):
+            from evaluation.stats import print_stats
+            stats = evaluator.get_statistics(results)
+            print_stats(stats["cis"], stats["comparisons"], alpha=config.stats.alpha)
         print("\n评测完成！")
 
 
+def cmd_surrogate(args, config: Config):
+    """用历史 LLM Judge 评分训练本地评分代理模型"""
+    from evaluation.surrogate import print_surrogate_report, train_surrogate
+
+    config.prepare()
+    if args.include_legacy:
+        config.surrogate.include_legacy = True
+    _, report = train_surrogate(config, [Path(p) for p in args.history or []])
+    print_surrogate_report(report)
+
+
 def cmd_plot(args, config: Config):
     """绘制评测结果图表"""
+    from evaluation import plot_results
+
     print("\n" + "=" * 70)
     print("开始绘制图表")
     print("=" * 70)
 
-    plot_results(config)
+    plot_results(config, preview=getattr(args, "preview", False), force=getattr(args, "force", False))
+
+
+def cmd_serve(args, config: Config):
+    """启动常驻查询服务"""
+    from serving import serve
+
+    method_names = [m.strip() for m in args.method.split(",")] if args.method else None
+    serve(config, method_names, host=args.host, port=args.port)
+
+
+def cmd_ingest(args, config: Config):
+    """增量导入知识库目录下的文档到 Naive RAG 向量库"""
+    from methods.ingest import ingest_documents
+
+    if args.workers:
+        config.ingest.workers = args.workers
+    ingest_documents(config, rebuild=args.rebuild)
+
+
+def cmd_export_index(args, config: Config):
+    """将 Naive RAG 向量库导出为内存映射索引快照"""
+    from methods.snapshot import export_from_chroma
+
+    config.prepare()
+    export_from_chroma(config)
+
+
+def cmd_compact(args, config: Config):
+    """将已有结果文件中的上下文全文转换为上下文存储引用"""
+    from utils import compact_results
+
+    saved = compact_results(config)
+    for name, size in saved.items():
+        print(f"{name}: 减少 {size / 1024:.1f} KB")
+    if not saved:
+        print("没有需要转换的结果文件")
+    else:
+        print(f"转换后的结果文件依赖上下文存储 {config.paths.context_store_dir}，拷贝结果时需一并拷贝")
+
+
+def cmd_worker(args, config: Config):
+    """多 worker 分片运行：入队、执行、合并与查看队列状态"""
+    from workers import Worker, enqueue_answers, enqueue_judging, merge_results, open_queue, print_status
+
+    config.prepare()
+    queue = open_queue(config)
+    methods = [m.strip() for m in args.method.split(",")] if args.method else config.methods
+    test_types = [t.strip() for t in args.testset.split(",")] if args.testset else config.test_types
+
+    if args.status:
+        print_status(queue)
+    elif args.merge:
+        merge_results(config, queue)
+    elif args.enqueue or args.enqueue_judge:
+        if args.enqueue:
+            total = enqueue_answers(config, queue, methods, test_types, judge=args.judge)
+            print(f"共新增 {total} 个 answer 任务")
+        if args.enqueue_judge:
+            total = enqueue_judging(config, queue, methods, test_types)
+            print(f"共新增 {total} 个 judge 任务")
+    else:
+        kinds = [k.strip() for k in args.kinds.split(",")] if args.kinds else None
+        Worker(config, queue, kinds).run(exit_when_idle=not args.watch, merge=not args.no_merge)
+    queue.close()
+
+
+def cmd_sweep(args, config: Config):
+    """RAG 配置参数扫描：网格 / 随机搜索，并发运行各配置点并汇总"""
+    from methods import METHOD_REGISTRY
+    from sweep import parse_space, run_sweep
+
+    space = parse_space(args.param, Path(args.space) if args.space else None)
+    methods = [m.strip() for m in args.method.split(",")] if args.method else config.methods
+    unknown = [m for m in methods if m not in METHOD_REGISTRY]
+    if unknown:
+        print(f"未知方法: {unknown}，可用方法: {list(METHOD_REGISTRY.keys())}")
+        return
+    test_types = [t.strip() for t in args.testset.split(",")] if args.testset else config.test_types
+    if args.seed is not None:
+        config.sweep.seed = args.seed
+    run_sweep(config, space, methods, test_types, samples=args.random, jobs=args.jobs,
+              force=args.force, judge=args.judge)
 
 
 def cmd_pipeline(args, config: Config):
@@ -114,9 +246,25 @@ def main():
   python main.py run --method naive_rag,light_rag      # 运行多个方法
   python main.py run --all                             # 运行所有方法
   python main.py evaluate                              # 评估已生成的结果
+  python main.py evaluate --csv                        # 评估并导出 CSV
+  python main.py evaluate --stats                      # 评估并输出置信区间与显著性检验
+  python main.py evaluate --retrieval                  # 只计算检索指标（对照标准答案定位手册段落，无需 LLM）
+  python main.py evaluate --adaptive --budget 200      # 序贯评测：系统排序确定后提前停止
+  python main.py surrogate                             # 用历史评分训练本地评分代理模型
+  python main.py evaluate --surrogate                  # 代理模型确定的记录跳过 LLM Judge
   python main.py plot                                  # 绘制图表
+  python main.py plot --preview                        # 低 DPI 快速预览图表
   python main.py pipeline                              # 完整流程
   python main.py pipeline --skip-run                   # 跳过生成，只评估和绘图
+  python main.py serve --method naive_rag --port 8765  # 常驻服务，通过 HTTP 查询
+  python main.py ingest                                # 增量导入 data/documents 下新增或修改的文档
+  python main.py ingest --rebuild                      # 清空向量库后全量重新导入
+  python main.py export-index                          # 导出索引快照，Naive RAG 冷启动改走快照
+  python main.py worker --enqueue --judge              # 为所有方法创建回答任务（回答完成后自动评分）
+  python main.py worker                                # 启动一个 worker，可在多个终端 / 主机上同时运行
+  python main.py worker --status                       # 查看任务队列状态
+  python main.py sweep -m naive_rag --param embedchain.chunk_size=500,1000 --param embedchain.number_documents=3,5
+  python main.py sweep -m light_rag --param lightrag.mode=mix,local,global --param lightrag.top_k=5,10,20 --random 4
         """
     )
 
@@ -130,12 +278,26 @@ def main():
     run_parser.add_argument("--all", "-a", action="store_true", help="运行所有方法")
     run_parser.add_argument("--testset", "-t", type=str, help="测试集类型，如 A,B")
     run_parser.add_argument("--quiet", "-q", action="store_true", help="静默模式，不打印详细输出")
+    run_parser.add_argument("--pipeline", action="store_true", help="检索与生成分阶段流水线并行处理")
+    run_parser.add_argument("--batch-embed", action="store_true", help="Naive RAG 预先批量 embedding 全部问题并批量检索")
 
     # evaluate 命令
     eval_parser = subparsers.add_parser("evaluate", help="评估结果")
+    eval_parser.add_argument("--csv", action="store_true", help="评估完成后额外导出 CSV 结果文件")
+    eval_parser.add_argument("--stats", action="store_true", help="输出 bootstrap 置信区间与系统间显著性检验")
+    eval_parser.add_argument("--retrieval", action="store_true",
+                             help="只计算检索指标 Recall@k / MRR / Precision@k（无需 LLM）")
+    eval_parser.add_argument("--surrogate", action="store_true",
+                             help="代理模型足够确定的记录直接采用代理评分，跳过 LLM Judge（需先运行 surrogate）")
+    eval_parser.add_argument("--adaptive", action="store_true",
+                             help="序贯评测：随机交错评分，系统排序在设定置信度下确定后提前停止")
+    eval_parser.add_argument("--budget", type=int, help="与 --adaptive 同用：最多 LLM Judge 调用次数")
+    eval_parser.add_argument("--confidence", type=float, help="与 --adaptive 同用：排序结论的置信度，如 0.95")
 
     # plot 命令
     plot_parser = subparsers.add_parser("plot", help="绘制图表")
+    plot_parser.add_argument("--preview", action="store_true", help="低 DPI 快速预览")
+    plot_parser.add_argument("--force", action="store_true", help="忽略缓存，强制重绘所有图表")
 
     # pipeline 命令
     pipe_parser = subparsers.add_parser("pipeline", help="完整流程")
@@ -144,6 +306,55 @@ def main():
     pipe_parser.add_argument("--skip-plot", action="store_true", help="跳过绘图步骤")
     pipe_parser.add_argument("--quiet", "-q", action="store_true", help="静默模式")
 
+    # serve 命令
+    serve_parser = subparsers.add_parser("serve", help="启动常驻 HTTP 查询服务")
+    serve_parser.add_argument("--method", "-m", type=str, help="要加载的方法，多个用逗号分隔（默认全部）")
+    serve_parser.add_argument("--host", type=str, help="监听地址")
+    serve_parser.add_argument("--port", type=int, help="监听端口")
+
+    # ingest 命令
+    ingest_parser = subparsers.add_parser("ingest", help="增量导入知识库文档（Naive RAG）")
+    ingest_parser.add_argument("--rebuild", action="store_true", help="清空向量库与导入清单后全量重新导入")
+    ingest_parser.add_argument("--workers", "-w", type=int, help="解析与分块的进程数（默认 CPU 核数）")
+
+    # export-index 命令
+    subparsers.add_parser("export-index", help="导出 Naive RAG 内存映射索引快照")
+
+    # surrogate 命令
+    surrogate_parser = subparsers.add_parser("surrogate", help="用历史 LLM Judge 评分训练本地评分代理模型")
+    surrogate_parser.add_argument("--history", action="append",
+                                  help="额外的历史评分文件（评分表导出的 CSV 或 JSONL），可重复")
+    surrogate_parser.add_argument("--include-legacy", action="store_true",
+                                  help="同时使用无法确定评分 Prompt 版本的旧版评分（按当前 Prompt 版本对待）")
+
+    # compact 命令
+    subparsers.add_parser("compact", help="将已有结果文件的上下文全文转换为上下文存储引用")
+
+    # worker 命令
+    worker_parser = subparsers.add_parser("worker", help="从共享任务队列领取任务的 worker（多进程 / 多主机）")
+    worker_parser.add_argument("--enqueue", action="store_true", help="为尚未回答的问题创建 answer 任务后退出")
+    worker_parser.add_argument("--judge", action="store_true", help="与 --enqueue 同用：回答完成后自动创建评分任务")
+    worker_parser.add_argument("--enqueue-judge", action="store_true", help="为已有结果中待评分的记录创建 judge 任务后退出")
+    worker_parser.add_argument("--method", "-m", type=str, help="入队的方法，多个用逗号分隔（默认全部）")
+    worker_parser.add_argument("--testset", "-t", type=str, help="入队的测试集类型，如 A,B")
+    worker_parser.add_argument("--kinds", type=str, help="只领取指定类型的任务，如 answer 或 judge")
+    worker_parser.add_argument("--watch", action="store_true", help="队列为空时不退出，持续等待新任务")
+    worker_parser.add_argument("--no-merge", action="store_true", help="退出时不合并结果（稍后用 --merge 统一合并）")
+    worker_parser.add_argument("--merge", action="store_true", help="将已完成的结果合并进输出文件与评测进度后退出")
+    worker_parser.add_argument("--status", action="store_true", help="查看任务队列状态")
+
+    # sweep 命令
+    sweep_parser = subparsers.add_parser("sweep", help="RAG 配置参数扫描（网格 / 随机搜索）")
+    sweep_parser.add_argument("--param", "-p", action="append", help="搜索维度 key=v1,v2，可重复，如 lightrag.top_k=5,10")
+    sweep_parser.add_argument("--space", type=str, help="搜索空间 JSON 文件：{配置路径: [候选值, ...]}")
+    sweep_parser.add_argument("--method", "-m", type=str, help="参与扫描的方法，多个用逗号分隔（默认全部）")
+    sweep_parser.add_argument("--testset", "-t", type=str, help="测试集类型，如 A,B")
+    sweep_parser.add_argument("--random", type=int, help="随机搜索：从网格中随机抽取的配置点数")
+    sweep_parser.add_argument("--seed", type=int, help="随机搜索的随机种子")
+    sweep_parser.add_argument("--jobs", "-j", type=int, help="并发运行的配置点数")
+    sweep_parser.add_argument("--force", action="store_true", help="忽略已缓存的回答，重新运行全部配置点")
+    sweep_parser.add_argument("--judge", action="store_true", help="额外用 LLM Judge 为各配置点评分")
+
     args = parser.parse_args()
 
     if not args.command:
@@ -166,6 +377,13 @@ def main():
         "evaluate": cmd_evaluate,
         "plot": cmd_plot,
         "pipeline": cmd_pipeline,
+        "serve": cmd_serve,
+        "ingest": cmd_ingest,
+        "export-index": cmd_export_index,
+        "compact": cmd_compact,
+        "surrogate": cmd_surrogate,
+        "worker": cmd_worker,
+        "sweep": cmd_sweep,
     }
 
     try:
@@ -1,18 +1,34 @@
-from .base import BaseMethod, TestRecord
-from .light_rag import LightRAGMethod
-from .naive_rag import NaiveRAGMethod
-from .pure_llm import PureLLMMethod
+import importlib
 
-# 方法注册表
+from .base import BaseMethod, TestRecord, ERROR_ANSWER
+
+# 方法注册表：方法名 -> (模块名, 类名)，按需导入，避免启动时加载所有依赖
 METHOD_REGISTRY = {
-    "pure_llm": PureLLMMethod,
-    "naive_rag": NaiveRAGMethod,
-    "light_rag": LightRAGMethod,
+    "pure_llm": ("pure_llm", "PureLLMMethod"),
+    "naive_rag": ("naive_rag", "NaiveRAGMethod"),
+    "light_rag": ("light_rag", "LightRAGMethod"),
 }
 
+# 延迟导出的方法类
+_LAZY_CLASSES = {class_name: name for name, (_, class_name) in METHOD_REGISTRY.items()}
 
-def get_method(method_name: str, config=None):
-    """获取指定方法的实例"""
+
+def get_method_class(method_name: str):
+    """导入并返回指定方法的类"""
     if method_name not in METHOD_REGISTRY:
         raise ValueError(f"未知的方法: {method_name}。可用方法: {list(METHOD_REGISTRY.keys())}")
-    return METHOD_REGISTRY[method_name](config)
+    module_name, class_name = METHOD_REGISTRY[method_name]
+    module = importlib.import_module(f".{module_name}", __name__)
+    return getattr(module, class_name)
+
+
+def get_method(method_name: str, config=None):
+    """获取指定方法的实例"""
+    return get_method_class(method_name)(config)
+
+
+def __getattr__(name):
+    """支持 from methods import PureLLMMethod 等写法，首次访问时才导入对应模块"""
+    if name in _LAZY_CLASSES:
+        return get_method_class(_LAZY_CLASSES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,15 +3,39 @@
 """
 import json
 import sys
+import threading
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
 from tqdm import tqdm
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import Config
+from utils import get_log, get_retrier, iter_chunks, open_testset, read_log, save_results
+
+# 处理失败时写入的占位回答
+ERROR_ANSWER = "Error occurred during processing."
+
+
+def _journal_offsets(journal_path: Path) -> Dict[str, int]:
+    """运行日志中每个问题最后一条完整记录的字节偏移"""
+    offsets = {}
+    if not journal_path.exists():
+        return offsets
+    with open(journal_path, "rb") as f:
+        offset = 0
+        for line in f:
+            try:
+                question = json.loads(line).get("question")
+            except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                question = None
+            if question and line.endswith(b"\n"):
+                offsets[question] = offset
+            offset += len(line)
+    return offsets
 
 
 @dataclass
@@ -34,12 +58,20 @@ class BaseMethod(ABC):
     """所有方法的基类"""
 
     name: str = "base"
+    # 实例能否被多个线程同时调用（用于服务模式下的并发批处理）
+    concurrent_safe: bool = False
 
     def __init__(self, config: Config = None):
         if config is None:
             from config import default_config
             config = default_config
+        config.prepare()
         self.config = config
+        # 外部调用统一经由该方法的 Retrier（退避重试 + 熔断）
+        self.retrier = get_retrier(self.name, **config.retry.retry_kwargs())
+        # 生成用量：调用次数、token 数与因 max_tokens 被截断的次数
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "truncated": 0}
+        self._usage_lock = threading.Lock()
 
     @abstractmethod
     def get_answer(self, question: str, max_chars: int = 200) -> str:
@@ -50,60 +82,180 @@ class BaseMethod(ABC):
         """获取检索到的上下文（默认返回空列表）"""
         return []
 
-    def process_testset(self, test_type: str, verbose: bool = True) -> List[TestRecord]:
-        """处理测试集"""
-        testset_path = self.config.get_testset_path(test_type)
-        output_path = self.config.get_output_path(self.name, test_type)
-        max_chars = self.config.get_max_chars(test_type)
+    def max_tokens(self, max_chars: int) -> int:
+        """字数限制对应的生成 token 上限"""
+        return self.config.budget.max_tokens_for(max_chars)
 
-        if not testset_path.exists():
-            raise FileNotFoundError(f"测试集文件不存在: {testset_path}")
+    def _record_usage(self, response):
+        """累计一次 chat completion 的用量"""
+        usage = getattr(response, "usage", None)
+        truncated = any(getattr(c, "finish_reason", None) == "length" for c in response.choices or [])
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["truncated"] += int(truncated)
+            if usage is not None:
+                self.usage["prompt_tokens"] += usage.prompt_tokens or 0
+                self.usage["completion_tokens"] += usage.completion_tokens or 0
+
+    def prefetch(self, questions: List[str]):
+        """在逐题处理前批量预处理一批待答问题（测试集按块流式读取，每块调用一次；默认不做任何事）"""
+        pass
 
-        with open(testset_path, "r", encoding="utf-8") as f:
-            test_data = json.load(f)
+    def answer_with_contexts(self, question: str, max_chars: int = 200) -> Tuple[str, List[str]]:
+        """同时返回答案与检索上下文"""
+        answer = self.get_answer(question, max_chars)
+        return answer, self.get_contexts(question)
 
-        records = []
-        iterator = tqdm(test_data, desc=f"{self.name} - {test_type}") if verbose else test_data
+    def answer_batch(self, questions: List[str], max_chars: List[int]) -> List[Tuple[str, List[str]]]:
+        """批量回答一组问题
 
-        for item in iterator:
-            question = item.get("问题", "")
-            standard_answer = item.get("标准答案", "")
+        默认实现：线程安全的方法并发调用，否则逐个调用。
+        后端支持真正批处理的子类可以覆盖此方法。
+        """
+        if self.concurrent_safe and len(questions) > 1:
+            with ThreadPoolExecutor(max_workers=len(questions)) as pool:
+                return list(pool.map(self.answer_with_contexts, questions, max_chars))
+        return [self.answer_with_contexts(q, m) for q, m in zip(questions, max_chars)]
 
-            if not question:
-                continue
+    def retrieve(self, question: str) -> Any:
+        """流水线检索阶段（默认无独立检索阶段，返回 None）
 
+        子类覆盖 retrieve / generate 时须保证二者无实例级状态、可被多个线程同时调用。
+        """
+        return None
+
+    def generate(self, question: str, retrieved: Any, max_chars: int = 200) -> Tuple[str, List[str]]:
+        """流水线生成阶段，返回 (答案, 上下文)（默认直接调用 answer_with_contexts）"""
+        return self.answer_with_contexts(question, max_chars)
+
+    def _answer_sequential(self, pending: Iterable[Tuple[str, str]], max_chars: int) -> Iterator[tuple]:
+        """逐题处理，产出 ((问题, 标准答案), 答案, 上下文, 异常)"""
+        for item in pending:
             try:
-                answer = self.get_answer(question, max_chars)
-                contexts = self.get_contexts(question)
-                if verbose:
-                    print(f"\nQ: {question}\nA: {answer}\n")
+                answer, contexts = self.answer_with_contexts(item[0], max_chars)
+                yield item, answer, contexts, None
             except Exception as e:
-                print(f"Error processing question: {question}\n{e}")
-                answer = "Error occurred during processing."
-                contexts = []
-
-            record = TestRecord(
-                question=question,
-                answer=answer,
-                standard_answer=standard_answer,
-                contexts=contexts
-            )
-            records.append(record)
-
-        # 保存结果
-        self._save_results(records, output_path)
-        return records
-
-    def _save_results(self, records: List[TestRecord], output_path: Path):
-        """保存测试结果"""
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        data = [r.to_dict() for r in records]
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f"结果已保存至: {output_path}")
+                yield item, None, None, e
+
+    def _answer_pipelined(self, pending: Iterable[Tuple[str, str]], max_chars: int) -> Iterator[tuple]:
+        """检索与生成分阶段并行处理，按原顺序产出 ((问题, 标准答案), 答案, 上下文, 异常)"""
+        from .pipeline import run_pipeline
+
+        pipeline_config = self.config.pipeline
+        staged = type(self).generate is not BaseMethod.generate
+        # 未实现独立阶段且非线程安全的方法只能单线程生成
+        generation_workers = pipeline_config.generation_workers if staged or self.concurrent_safe else 1
+
+        outcomes = run_pipeline(
+            pending,
+            retrieve=lambda item: self.retrieve(item[0]),
+            generate=lambda item, retrieved: self.generate(item[0], retrieved, max_chars),
+            retrieval_workers=pipeline_config.retrieval_workers,
+            generation_workers=generation_workers,
+            queue_size=pipeline_config.queue_size,
+            max_in_flight=pipeline_config.max_in_flight or None,
+        )
+        for item, result, error in outcomes:
+            if error is not None:
+                yield item, None, None, error
+            else:
+                yield item, result[0], result[1], None
+
+    def process_testset(self, test_type: str, verbose: bool = True) -> Path:
+        """处理测试集，返回结果文件路径
+
+        测试集流式读取，回答逐条写入运行日志；结束后按测试集顺序从日志逐条读回并流式写出结果文件。
+        内存中只保留 问题 -> 日志偏移 的索引，不保留回答与上下文。
+        """
+        output_path = self.config.get_output_path(self.name, test_type)
+        max_chars = self.config.get_max_chars(test_type)
+        # 运行报告只统计本次运行（Retrier 在进程内共享）
+        self.retrier.reset_stats()
+
+        # 测试集流式读取（.json / .jsonl），读到第一条即开始处理
+        testset = open_testset(self.config, test_type)
+
+        # 运行日志：每答完一题即写入，中断后重跑可从日志续跑
+        journal_path = self.config.get_journal_path(self.name, test_type)
+        answered = {r["question"] for r in read_log(journal_path)
+                    if r.get("question") and r.get("answer") != ERROR_ANSWER}
+        if answered:
+            print(f"从运行日志恢复 {len(answered)} 条已完成记录: {journal_path.name}")
+        journal = get_log(journal_path, **self.config.persist.log_kwargs())
+
+        def pending():
+            """待处理的问题（跳过日志中已完成的问题），按块交给方法做批量预处理（如批量 embedding + 批量检索）"""
+            todo = ((q, a) for q, a in testset if q not in answered)
+            for chunk in iter_chunks(todo, self.config.testset.chunk_size):
+                self.prefetch([q for q, _ in chunk])
+                yield from chunk
+
+        if self.config.pipeline.enabled:
+            outcomes = self._answer_pipelined(pending(), max_chars)
+        else:
+            outcomes = self._answer_sequential(pending(), max_chars)
+        if verbose:
+            outcomes = tqdm(outcomes, desc=f"{self.name} - {test_type}")
+
+        try:
+            for (question, standard_answer), answer, contexts, error in outcomes:
+                if error is not None:
+                    print(f"Error processing question: {question}\n{error}")
+                    answer = ERROR_ANSWER
+                    contexts = []
+                elif verbose:
+                    print(f"\nQ: {question}\nA: {answer}\n")
+
+                record = TestRecord(
+                    question=question,
+                    answer=answer,
+                    standard_answer=standard_answer,
+                    contexts=contexts
+                )
+                journal.append(record.to_dict())
+        finally:
+            journal.close()
+
+        # 再次流式读取测试集，按原顺序从运行日志读回结果并写出，完整结果落盘后运行日志不再需要
+        offsets = _journal_offsets(journal_path)
+        with open(journal_path, "rb") as f:
+            def ordered():
+                for q, _ in open_testset(self.config, test_type):
+                    if q in offsets:
+                        f.seek(offsets[q])
+                        yield json.loads(f.readline())
+
+            self._save_results(ordered(), output_path)
+        journal_path.unlink(missing_ok=True)
+        self._print_run_report()
+        return output_path
+
+    def run_report(self) -> dict:
+        """本次运行的附加统计信息（如延迟分布、重试次数），默认包含重试与生成用量统计"""
+        report = {}
+        stats = self.retrier.stats()
+        if stats["calls"]:
+            report["retries"] = stats
+        if self.usage["calls"]:
+            report["generation"] = dict(self.usage)
+        return report
+
+    def _print_run_report(self):
+        """打印运行报告"""
+        report = self.run_report()
+        if not report:
+            return
+        print(f"\n【{self.name} 运行报告】")
+        for key, value in report.items():
+            print(f"  - {key}: {value}")
+
+    def _save_results(self, records: Iterable[dict], output_path: Path):
+        """保存测试结果（逐条写出）"""
+        count = save_results(self.config, output_path, records)
+        print(f"结果已保存至: {output_path}（{count} 条）")
 
     def run_all(self, verbose: bool = True) -> dict:
-        """运行所有测试集"""
+        """运行所有测试集，返回 {测试集类型: 结果文件路径}"""
         results = {}
         for test_type in self.config.test_types:
             print(f"\n{'=' * 60}")
@@ -0,0 +1,336 @@
+"""
+Naive RAG 知识库增量导入
+
+发现 documents_dir 下的全部文档，在进程池中并行完成解析、清洗与分块，
+embedding 后写入 Chroma 集合。导入清单（manifest）记录每个文档的大小、修改时间、
+内容哈希与分块 ID：
+    - 大小与修改时间未变的文档直接跳过，不读取内容
+    - 内容哈希未变（仅被 touch）的文档只更新清单
+    - 新增 / 修改的文档重新分块，分块 ID 由内容决定，只有新出现的分块需要 embedding，
+      不再出现的旧分块从集合中删除
+    - 已删除的文档，其分块从集合中删除
+导入耗时随 CPU 核数与变更量扩展，而不随语料总量增长。
+向量库有变化且存在索引快照时自动重新导出快照（失败时删除旧快照）。
+分块参数或 embedding 模型变化时清单失效，自动全量重建；--rebuild 可强制重建。
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+
+MANIFEST_VERSION = 1
+# 分块时依次尝试的分隔符（与 embedchain 使用的递归字符切分一致，补充中文标点）
+SEPARATORS = ("\n\n", "\n", "。", "！", "？", "；", "，", " ", "")
+_UPSERT_BATCH = 1000  # Chroma 单次写入上限约为 5000 条
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\ufeff]")
+
+
+def clean_text(text: str) -> str:
+    """统一换行、去除控制字符与行尾空白、压缩多余空行"""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL_CHARS.sub("", text)
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _merge(pieces: List[str], chunk_size: int, chunk_overlap: int) -> List[str]:
+    """将小片段拼接为不超过 chunk_size 的分块，相邻分块保留约 chunk_overlap 的重叠"""
+    chunks, window, total = [], [], 0
+    for piece in pieces:
+        if window and total + len(piece) > chunk_size:
+            chunks.append("".join(window))
+            while window and (total > chunk_overlap or total + len(piece) > chunk_size):
+                total -= len(window.pop(0))
+        window.append(piece)
+        total += len(piece)
+    if window:
+        chunks.append("".join(window))
+    return chunks
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int, separators=SEPARATORS) -> List[str]:
+    """递归字符切分：优先按段落、其次按行与句子切分，分隔符保留在片段末尾"""
+    separator, rest = separators[-1], ()
+    for i, sep in enumerate(separators):
+        if sep == "" or sep in text:
+            separator, rest = sep, separators[i + 1:]
+            break
+    if separator:
+        parts = text.split(separator)
+        pieces = [p + separator for p in parts[:-1]] + [parts[-1]]
+    else:
+        pieces = list(text)
+
+    chunks, small = [], []
+    for piece in pieces:
+        if not piece:
+            continue
+        if len(piece) <= chunk_size:
+            small.append(piece)
+            continue
+        if small:
+            chunks.extend(_merge(small, chunk_size, chunk_overlap))
+            small = []
+        chunks.extend(split_text(piece, chunk_size, chunk_overlap, rest) if rest else [piece])
+    if small:
+        chunks.extend(_merge(small, chunk_size, chunk_overlap))
+    return [c.strip() for c in chunks if c.strip()]
+
+
+def chunk_ids(source: str, chunks: List[str]) -> List[str]:
+    """由文档路径与分块内容生成 ID（同一文档内重复的分块按出现次序区分）"""
+    seen: Dict[str, int] = {}
+    ids = []
+    for text in chunks:
+        occurrence = seen.get(text, 0)
+        seen[text] = occurrence + 1
+        ids.append(hashlib.sha256(f"{source}\0{occurrence}\0{text}".encode("utf-8")).hexdigest())
+    return ids
+
+
+def parse_document(path: str, source: str, chunk_size: int, chunk_overlap: int,
+                   encodings: Tuple[str, ...]) -> dict:
+    """读取、清洗并分块单个文档（在子进程中执行），返回清单条目与分块"""
+    raw = Path(path).read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    for encoding in encodings:
+        try:
+            text = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError(f"无法以 {'/'.join(encodings)} 解码: {source}")
+    chunks = split_text(clean_text(text), chunk_size, chunk_overlap)
+    return {
+        "source": source,
+        "sha256": digest,
+        "chunks": chunks,
+        "chunk_ids": chunk_ids(source, chunks),
+    }
+
+
+class Manifest:
+    """导入清单：{相对路径: {size, mtime, sha256, chunk_ids}}"""
+
+    def __init__(self, path: Path, settings: dict):
+        self.path = Path(path)
+        self.settings = settings
+        self.files: Dict[str, dict] = {}
+        self.exists = self.path.exists()
+        self.compatible = True
+        if self.exists:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.compatible = (data.get("version") == MANIFEST_VERSION and data.get("settings") == settings)
+            self.files = data.get("files", {})
+
+    def digest(self) -> str:
+        """清单内容摘要（参数与各文档的内容哈希、分块 ID，不含大小与修改时间），用于校验索引快照"""
+        files = {source: [entry["sha256"], entry["chunk_ids"]] for source, entry in self.files.items()}
+        payload = json.dumps({"settings": self.settings, "files": files}, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def chunk_count(self) -> int:
+        """清单中记录的分块总数"""
+        return sum(len(entry["chunk_ids"]) for entry in self.files.values())
+
+    def changes(self, paths: List[Path], docs_dir: Path) -> Tuple[List[Tuple[Path, str]], List[str]]:
+        """与清单不一致的文档：(大小或修改时间变化 / 新增的文档, 已删除的文档)，不读取文档内容"""
+        changed, present = [], set()
+        for path in paths:
+            source = path.relative_to(docs_dir).as_posix()
+            present.add(source)
+            entry = self.files.get(source)
+            stat = path.stat()
+            if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+                changed.append((path, source))
+        return changed, sorted(set(self.files) - present)
+
+    def save(self):
+        """先写临时文件再原子替换"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "settings": self.settings, "updated": time.time(),
+                       "files": self.files}, f, ensure_ascii=False, indent=1)
+        tmp_path.replace(self.path)
+        self.exists = True
+
+
+def manifest_settings(config: Config) -> dict:
+    """影响分块与向量的参数，任一变化都需要全量重建"""
+    ec = config.embedchain
+    return {
+        "collection": ec.collection_name,
+        "embedder_model": ec.embedder_model,
+        "vector_dimension": ec.vector_dimension,
+        "chunk_size": ec.chunk_size,
+        "chunk_overlap": ec.chunk_overlap,
+    }
+
+
+class DocumentIngestor:
+    """增量导入器：比对清单，只解析与 embedding 变化的文档"""
+
+    def __init__(self, config: Config, collection=None):
+        from utils import get_retrier
+
+        self.config = config
+        self._collection = collection
+        self._client = None
+        self.retrier = get_retrier("embedding", **config.retry.retry_kwargs())
+        self.manifest = Manifest(config.paths.ingest_manifest, manifest_settings(config))
+
+    @property
+    def collection(self):
+        """未传入集合时（命令行导入）直接打开 Chroma 持久化集合，与 embedchain 共用"""
+        if self._collection is None:
+            import chromadb
+
+            client = chromadb.PersistentClient(path=str(self.config.paths.db_dir))
+            self._collection = client.get_or_create_collection(self.config.embedchain.collection_name)
+        return self._collection
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """按 embed_batch_size 分批，并发请求 embedding"""
+        from openai import OpenAI
+
+        if self._client is None:
+            # 重试由 self.retrier 统一负责，关闭 SDK 自带的重试
+            self._client = OpenAI(api_key=self.config.api.openai_api_key,
+                                  base_url=self.config.api.openai_base_url, max_retries=0)
+        ec = self.config.embedchain
+
+        def embed_batch(batch: List[str]) -> List[List[float]]:
+            response = self.retrier.call(self._client.embeddings.create, model=ec.embedder_model,
+                                         input=batch, dimensions=ec.vector_dimension)
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+        batches = [texts[i:i + ec.embed_batch_size] for i in range(0, len(texts), ec.embed_batch_size)]
+        with ThreadPoolExecutor(max_workers=max(1, self.config.ingest.embed_workers)) as pool:
+            return [vector for vectors in pool.map(embed_batch, batches) for vector in vectors]
+
+    def _delete(self, ids: List[str]):
+        for start in range(0, len(ids), _UPSERT_BATCH):
+            self.collection.delete(ids=ids[start:start + _UPSERT_BATCH])
+
+    def _store(self, parsed: dict, path: Path) -> int:
+        """embedding 并写入文档中新出现的分块，删除不再出现的旧分块，返回新写入的分块数"""
+        source = parsed["source"]
+        old_ids = set(self.manifest.files.get(source, {}).get("chunk_ids", []))
+        new = [(i, c) for i, c in zip(parsed["chunk_ids"], parsed["chunks"]) if i not in old_ids]
+        stale = sorted(old_ids - set(parsed["chunk_ids"]))
+        if stale:
+            self._delete(stale)
+        if new:
+            ids, chunks = [i for i, _ in new], [c for _, c in new]
+            vectors = self._embed(chunks)
+            metadata = {"url": source, "data_type": "text_file"}
+            for start in range(0, len(ids), _UPSERT_BATCH):
+                end = start + _UPSERT_BATCH
+                self.collection.upsert(ids=ids[start:end], embeddings=vectors[start:end],
+                                       documents=chunks[start:end], metadatas=[metadata] * len(ids[start:end]))
+        stat = path.stat()
+        self.manifest.files[source] = {"size": stat.st_size, "mtime": stat.st_mtime,
+                                       "sha256": parsed["sha256"], "chunk_ids": parsed["chunk_ids"]}
+        return len(new)
+
+    def _parse_all(self, changed: List[Tuple[Path, str]]) -> Iterator[Tuple[Path, dict]]:
+        """进程池并行解析，按完成顺序产出，解析与 embedding 重叠进行"""
+        ec, ingest = self.config.embedchain, self.config.ingest
+        args = (ec.chunk_size, ec.chunk_overlap, tuple(ingest.encodings))
+        workers = min(ingest.workers or os.cpu_count() or 1, len(changed))
+        if workers <= 1:
+            # 单个文档时省去进程池启动开销
+            for path, source in changed:
+                yield path, parse_document(str(path), source, *args)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(parse_document, str(path), source, *args): path for path, source in changed}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def run(self, rebuild: bool = False) -> dict:
+        """执行一次增量导入，返回各类文档数与新写入的分块数"""
+        stats = {"documents": 0, "unchanged": 0, "touched": 0, "added": 0, "updated": 0, "removed": 0,
+                 "chunks": 0}
+        if rebuild or not self.manifest.compatible:
+            if not self.manifest.compatible:
+                print("分块参数或 embedding 模型已变化，全量重建向量库...")
+            self._reset_collection()
+        elif not self.manifest.exists and self.collection.count() > 0:
+            print(f"向量库已有 {self.collection.count()} 条文档但没有导入清单（旧版导入），跳过增量导入；"
+                  f"如需按目录重建请运行 python main.py ingest --rebuild")
+            return stats
+
+        paths = self.config.get_document_paths()
+        stats["documents"] = len(paths)
+        changed, removed = self.manifest.changes(paths, self.config.paths.documents_dir)
+
+        start = time.perf_counter()
+        try:
+            for source in removed:
+                self._delete(self.manifest.files.pop(source)["chunk_ids"])
+                stats["removed"] += 1
+                print(f"  - 已删除: {source}")
+
+            stats["unchanged"] = len(paths) - len(changed)
+            for path, parsed in self._parse_all(changed):
+                source = parsed["source"]
+                entry = self.manifest.files.get(source)
+                if entry is not None and entry["sha256"] == parsed["sha256"]:
+                    # 内容未变，只更新大小与修改时间
+                    stat = path.stat()
+                    entry.update(size=stat.st_size, mtime=stat.st_mtime)
+                    stats["touched"] += 1
+                    continue
+                written = self._store(parsed, path)
+                stats["updated" if entry is not None else "added"] += 1
+                stats["chunks"] += written
+                print(f"  - {'已更新' if entry is not None else '已导入'}: {source}"
+                      f"（{len(parsed['chunks'])} 个分块，新写入 {written} 个）")
+        finally:
+            # 中断时已完成的文档同样记入清单，下次从未完成的文档继续
+            self.manifest.save()
+
+        print(f"文档导入完成（{time.perf_counter() - start:.1f}s）: 共 {stats['documents']} 个文档，"
+              f"新增 {stats['added']}、更新 {stats['updated']}、删除 {stats['removed']}、"
+              f"未变化 {stats['unchanged'] + stats['touched']}，写入 {stats['chunks']} 个分块")
+        if (stats["added"] or stats["updated"] or stats["removed"]) and self.config.paths.snapshot_file.exists():
+            self._refresh_snapshot()
+        return stats
+
+    def _refresh_snapshot(self):
+        """向量库变化后重新导出索引快照；导出失败时删除旧快照，避免继续使用过期快照"""
+        from .snapshot import export_from_chroma
+
+        print("向量库已变化，重新导出索引快照...")
+        try:
+            export_from_chroma(self.config)
+        except Exception as e:
+            self.config.paths.snapshot_file.unlink(missing_ok=True)
+            print(f"警告: 重新导出索引快照失败（{e}），已删除过期快照，"
+                  f"之后可运行 python main.py export-index 重新导出")
+
+    def _reset_collection(self):
+        """清空集合与清单"""
+        ids = self.collection.get(include=[])["ids"]
+        if ids:
+            self._delete(ids)
+        self.manifest.files = {}
+        self.manifest.compatible = True
+
+
+def ingest_documents(config: Config, collection=None, rebuild: bool = False) -> dict:
+    """增量导入 documents_dir 下的全部文档"""
+    config.prepare()
+    return DocumentIngestor(config, collection).run(rebuild=rebuild)
@@ -1,64 +1,172 @@
 """
 LightRAG 方法实现（通过 HTTP API 调用 LightRAG 服务）
+
+请求经共享的异步连接池客户端（lightrag_client）发出，同一道题的答案与上下文两次请求并发执行；
+每个请求都有超时，每道题共享一个总时限；
+可选对冲请求：请求耗时超过历史 p95 时再发一个相同请求，取先返回者，用于压低长尾延迟。
+LightRAG 接口不支持按请求设置 max_tokens，字数限制通过 response_type 写入其生成提示词。
 """
+import asyncio
 import sys
+import time
 from pathlib import Path
-from typing import List
-
-import requests
+from typing import List, Optional, Tuple
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import Config
+from utils import LatencyTracker
 from .base import BaseMethod
+from .lightrag_client import answer_payload, context_payload, get_client
+
+# 请求类型：答案查询 / 仅上下文查询，两者延迟分布差异很大，分开统计
+QUERY_KINDS = ("answer", "context")
 
 
 class LightRAGMethod(BaseMethod):
     """LightRAG 方法（通过 HTTP API）"""
 
     name = "light_rag"
+    concurrent_safe = True  # answer_with_contexts 不依赖实例缓存
 
     def __init__(self, config: Config = None):
         super().__init__(config)
-        self.session = requests.Session()
+        self.client = get_client(self.config)
         self._last_contexts = []  # 缓存最近一次检索的上下文
 
-    def _query_lightrag(self, question: str, only_context: bool = False) -> str:
-        """查询 LightRAG API"""
-        payload = {
-            "query": question,
-            "mode": self.config.lightrag.mode,
-        }
+        # 实际返回耗时（含对冲效果）与单个 HTTP 请求自身耗时，用于报告对冲对长尾的影响
+        # 统计只在客户端事件循环线程中更新
+        self.latency = {kind: LatencyTracker() for kind in QUERY_KINDS}
+        self.request_latency = {kind: LatencyTracker() for kind in QUERY_KINDS}
+        self.hedge_stats = {"fired": 0, "won": 0}
+
+    def _new_deadline(self) -> float:
+        """单题总时限的截止时间点"""
+        return time.monotonic() + self.config.lightrag.question_deadline
+
+    def _timeout(self, deadline: Optional[float]) -> float:
+        """本次请求可用的超时：单请求超时与单题剩余时间取小"""
+        timeout = self.config.lightrag.request_timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"超过单题时限 {self.config.lightrag.question_deadline}s")
+            timeout = min(timeout, remaining)
+        return timeout
+
+    async def _post(self, payload: dict, timeout: float, kind: str) -> str:
+        """发送一次 HTTP 请求并记录其自身耗时
+
+        超时、出错或对冲落败被取消的请求记为删失样本（真实耗时不小于已等待的时间），
+        慢请求不会从触发对冲的延迟分布中消失。
+        """
+        start = time.perf_counter()
+        try:
+            result = await self.client.aquery(payload, timeout)
+        except BaseException:
+            self.request_latency[kind].record(time.perf_counter() - start, censored=True)
+            raise
+        self.request_latency[kind].record(time.perf_counter() - start)
+        return result
+
+    async def _hedged_post(self, payload: dict, timeout: float, kind: str) -> str:
+        """对冲请求：首发请求超过 p95 延迟仍未返回时，再发一个相同请求，取先成功者"""
+        # 以单个请求的耗时分布（不受对冲影响）确定触发延迟
+        delay = self.request_latency[kind].quantile(self.config.lightrag.hedge_quantile)
 
+        primary = asyncio.ensure_future(self._post(payload, timeout, kind))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.hedge_stats["fired"] += 1
+        backup = asyncio.ensure_future(self._post(payload, max(timeout - delay, 0.001), kind))
+
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self.hedge_stats["won"] += 1
+                    # 取消落后的请求，释放连接
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _query_lightrag(self, question: str, only_context: bool = False,
+                              deadline: Optional[float] = None, max_chars: int = 200) -> str:
+        """查询 LightRAG API"""
         if only_context:
-            payload["only_need_context"] = True
-            payload["top_k"] = self.config.lightrag.top_k
-            payload["chunk_top_k"] = self.config.lightrag.chunk_top_k
+            payload = context_payload(self.config, question)
+        else:
+            payload = answer_payload(self.config, question, max_chars)
+
+        kind = "context" if only_context else "answer"
+        lr_config = self.config.lightrag
 
-        response = self.session.post(
-            self.config.api.lightrag_url,
-            json=payload
+        def attempt():
+            # 每次尝试重新计算超时，重试不会超出单题时限
+            timeout = self._timeout(deadline)
+            if lr_config.hedge and len(self.request_latency[kind]) >= lr_config.hedge_min_samples:
+                return self._hedged_post(payload, timeout, kind)
+            return self._post(payload, timeout, kind)
+
+        start = time.perf_counter()
+        result = await self.retrier.acall(attempt, deadline=deadline)
+        self.latency[kind].record(time.perf_counter() - start)
+        return result
+
+    async def _answer(self, question: str, max_chars: int = 200) -> Tuple[str, List[str]]:
+        """并发获取答案与上下文"""
+        deadline = self._new_deadline()
+        answer, context_text = await asyncio.gather(
+            self._query_lightrag(question, only_context=False, deadline=deadline, max_chars=max_chars),
+            self._query_lightrag(question, only_context=True, deadline=deadline),
         )
-        response.raise_for_status()
-        result = response.json()
-        return result.get("response", "")
+        return (answer if answer else "No answer found."), ([context_text] if context_text else [])
 
     def get_answer(self, question: str, max_chars: int = 200) -> str:
         """获取问题的答案"""
-        # 先获取答案
-        answer = self._query_lightrag(question, only_context=False)
+        answer, self._last_contexts = self.client.run(self._answer(question, max_chars))
+        return answer
+
+    def answer_with_contexts(self, question: str, max_chars: int = 200) -> Tuple[str, List[str]]:
+        """同时返回答案与上下文（不经过实例缓存，可并发调用）"""
+        return self.client.run(self._answer(question, max_chars))
+
+    def answer_batch(self, questions: List[str], max_chars: List[int]) -> List[Tuple[str, List[str]]]:
+        """整批问题在事件循环上并发执行，不为每个请求占用线程"""
+        outcomes = self.client.query_many([self._answer(q, n) for q, n in zip(questions, max_chars)])
+        for _, error in outcomes:
+            if error is not None:
+                raise error
+        return [result for result, _ in outcomes]
 
-        # 同时获取上下文并缓存
-        context_text = self._query_lightrag(question, only_context=True)
-        self._last_contexts = [context_text] if context_text else []
+    def retrieve(self, question: str) -> str:
+        """流水线检索阶段：只获取上下文（流水线中两个阶段各自计时限）"""
+        return self.client.run(self._query_lightrag(question, only_context=True, deadline=self._new_deadline()))
 
-        return answer if answer else "No answer found."
+    def generate(self, question: str, retrieved: str, max_chars: int = 200) -> Tuple[str, List[str]]:
+        """流水线生成阶段：获取答案，上下文沿用检索阶段结果"""
+        answer = self.client.run(self._query_lightrag(question, only_context=False, deadline=self._new_deadline(),
+                                                      max_chars=max_chars))
+        return (answer if answer else "No answer found."), ([retrieved] if retrieved else [])
 
     def get_contexts(self, question: str) -> List[str]:
         """获取检索到的上下文"""
         # 返回缓存的上下文（已在 get_answer 中获取）
         return self._last_contexts
 
-    def __del__(self):
-        """关闭 session"""
-        if hasattr(self, 'session'):
-            self.session.close()
+    def run_report(self) -> dict:
+        """延迟、对冲与重试统计：latency 为实际返回耗时，request_latency 为单个 HTTP 请求耗时"""
+        report = super().run_report()
+        for kind in QUERY_KINDS:
+            report[f"{kind}_latency"] = self.latency[kind].summary()
+            if self.config.lightrag.hedge:
+                report[f"{kind}_request_latency"] = self.request_latency[kind].summary()
+        if self.config.lightrag.hedge:
+            report["hedges"] = dict(self.hedge_stats)
+        return report
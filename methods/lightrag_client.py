@@ -0,0 +1,171 @@
+"""
+LightRAG 异步 HTTP 客户端
+
+基于 aiohttp，在独立的事件循环线程上复用一个可配置大小的连接池：
+    - pool_size: 最大并发连接数（requests.Session 默认只有 10 个，并发提问时成为隐性瓶颈）
+    - keepalive_expiry: 空闲长连接的保活时长
+    - http2: 启用 HTTP/2 多路复用（aiohttp 不支持 HTTP/2，此时改用 httpx + h2，未安装时回退为 HTTP/1.1）
+请求在等待期间不占用线程，同步调用方通过 query() 提交，批量调用通过 query_many() 并发执行。
+同一服务地址与连接池参数共用一个客户端实例（get_client），供 LightRAG 方法与上下文回填脚本共享。
+"""
+import asyncio
+import atexit
+import sys
+import threading
+from pathlib import Path
+from typing import Awaitable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+
+_registry: Dict[tuple, "LightRAGClient"] = {}
+_registry_lock = threading.Lock()
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class LightRAGClient:
+    """带连接池的 LightRAG 查询客户端（事件循环运行在后台线程）"""
+
+    def __init__(self, url: str, pool_size: int = 64, keepalive_expiry: float = 30.0,
+                 http2: bool = False, timeout: float = 120.0):
+        self.url = url
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        if http2 and not _h2_available():
+            print("警告: 未安装 h2（pip install 'httpx[http2]'），LightRAG 客户端回退为 HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True, name="lightrag-client")
+        self._thread.start()
+        self._client = self.run(self._open())
+        self._closed = False
+
+    async def _open(self):
+        # 在事件循环线程内创建，连接池绑定到该循环
+        if self.http2:
+            import httpx
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size,
+                                  keepalive_expiry=self.keepalive_expiry)
+            return httpx.AsyncClient(limits=limits, http2=True, timeout=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=0,
+                                         keepalive_timeout=self.keepalive_expiry)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def run(self, coro: Awaitable):
+        """在客户端事件循环上执行协程并阻塞等待结果（不可在事件循环线程内调用）"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def aquery(self, payload: dict, timeout: Optional[float] = None) -> str:
+        """发送一次查询，返回 response 字段"""
+        timeout = self.timeout if timeout is None else timeout
+        if self.http2:
+            response = await self._client.post(self.url, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response.json().get("response", "")
+        async with self._client.post(self.url, json=payload,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        return data.get("response", "")
+
+    def query(self, payload: dict, timeout: Optional[float] = None) -> str:
+        """同步查询"""
+        return self.run(self.aquery(payload, timeout))
+
+    def query_many(self, coros: List[Awaitable]) -> List[Tuple[Optional[object], Optional[Exception]]]:
+        """并发执行一批协程，按顺序返回 (结果, 异常)"""
+        async def gather():
+            return await asyncio.gather(*coros, return_exceptions=True)
+
+        return [(None, r) if isinstance(r, Exception) else (r, None) for r in self.run(gather())]
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.run(self._client.aclose() if self.http2 else self._client.close())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+
+def get_client(config: Config) -> LightRAGClient:
+    """获取与当前配置对应的共享客户端（服务地址与连接池参数相同则复用）"""
+    lr = config.lightrag
+    key = (config.api.lightrag_url, lr.pool_size, lr.keepalive_expiry, lr.http2)
+    with _registry_lock:
+        client = _registry.get(key)
+        if client is None or client.closed:
+            client = LightRAGClient(config.api.lightrag_url, pool_size=lr.pool_size,
+                                    keepalive_expiry=lr.keepalive_expiry, http2=lr.http2,
+                                    timeout=lr.request_timeout)
+            _registry[key] = client
+        return client
+
+
+def _query_payload(config: Config, question: str) -> dict:
+    """答案与上下文请求共用的检索参数，保证两者基于相同的检索结果"""
+    lr = config.lightrag
+    return {
+        "query": question,
+        "mode": lr.mode,
+        "top_k": lr.top_k,
+        "chunk_top_k": lr.chunk_top_k,
+    }
+
+
+def answer_payload(config: Config, question: str, max_chars: int = 200) -> dict:
+    """答案查询的请求体（启用长度预算时字数限制写入 response_type）"""
+    payload = _query_payload(config, question)
+    budget = config.budget
+    if budget.enabled:
+        payload["response_type"] = budget.lightrag_response_type.format(max_chars=max_chars)
+    return payload
+
+
+def context_payload(config: Config, question: str) -> dict:
+    """仅获取上下文的查询请求体"""
+    return dict(_query_payload(config, question), only_need_context=True)
+
+
+def fetch_contexts(config: Config, questions: List[str]) -> List[List[str]]:
+    """批量并发获取上下文（供上下文回填使用），失败的题目返回空列表"""
+    client = get_client(config)
+    outcomes = client.query_many([client.aquery(context_payload(config, q)) for q in questions])
+    contexts = []
+    for question, (text, error) in zip(questions, outcomes):
+        if error is not None:
+            print(f"Error retrieving context for '{question}': {error}")
+        contexts.append([text] if text else [])
+    return contexts
+
+
+@atexit.register
+def _close_all():
+    for client in list(_registry.values()):
+        try:
+            client.close()
+        except Exception:
+            pass
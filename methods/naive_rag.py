@@ -1,15 +1,42 @@
 """
 Naive RAG 方法实现（基于 Embedchain）
+
+存在索引快照（main.py export-index 导出）且无需导入文档时，
+直接使用内存映射快照检索 + OpenAI 兼容接口生成，跳过 embedchain / Chroma 的初始化。
+快照头部记录了导出时的分块参数、导入清单摘要与分块数，与当前知识库不一致（文档修改后未导入、
+导入后未重新导出等）时提示原因并回到 embedchain 通路（会先增量导入文档）。
+只有快照通路直接调用 OpenAI 兼容接口生成；embedchain 通路仍由 app.query 检索并生成。
+两条通路使用同一问答模板（embedchain 默认模板 + 字数提示行），字数提示只写入模板、不改动问题，
+检索不受影响；按测试集字数限制换算的 max_tokens（config.budget）与模板经每次调用传入的
+llm 配置生效。记录的上下文即生成时实际使用的分块（embedchain 通路取自 app.query 的 citations）。
+app.query 不返回用量，该通路的生成调用不计入运行报告的 token 用量与截断统计。
 """
 import os
 import sys
+import threading
 from pathlib import Path
-from typing import List
+from string import Template
+from typing import List, Optional, Tuple
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import Config
 from .base import BaseMethod
 
+# embedchain 默认问答模板 + 字数提示行（$length_hint 在生成前替换，为空时与默认模板一致），两条通路共用
+ANSWER_PROMPT = """You are a Q&A expert system. Your responses must always be rooted in the context provided for each query. Here are some guidelines to follow:
+
+1. Refrain from explicitly mentioning the context provided in your response.
+2. The context should silently guide your answers without being directly acknowledged.
+3. Do not use phrases such as 'According to the context provided', 'Based on the context, ...' etc.
+
+Context information:
+----------------------
+$context
+----------------------
+
+Query: $query
+${length_hint}Answer:"""
+
 
 class NaiveRAGMethod(BaseMethod):
     """Naive RAG 方法（基于 Embedchain）"""
@@ -19,8 +46,44 @@ class NaiveRAGMethod(BaseMethod):
     def __init__(self, config: Config = None):
         super().__init__(config)
         self.app = None
+        self.snapshot = None
+        self.client = None
         self._last_contexts = []  # 缓存最近一次检索的上下文
-        self._init_app()
+        self._prefetched = {}  # 问题 -> 预先批量检索到的分块
+        self._llm_configs = {}  # 字数限制 -> embedchain 单次调用的 llm 配置
+        # app.query 传入 config 时会临时替换实例上的 llm 配置，同一时刻只允许一个调用
+        self._app_lock = threading.Lock()
+
+        snapshot_file = self.config.paths.snapshot_file
+        if not (self.config.embedchain.use_snapshot and snapshot_file.exists() and self._init_snapshot()):
+            self._init_app()
+        self._init_client()
+
+    def _init_snapshot(self) -> bool:
+        """打开内存映射索引快照；快照与当前知识库不一致时返回 False"""
+        from .snapshot import IndexSnapshot, snapshot_staleness
+
+        snapshot = IndexSnapshot(self.config.paths.snapshot_file)
+        reason = snapshot_staleness(self.config, snapshot.header)
+        if reason is None and snapshot.dim != self.config.embedchain.vector_dimension:
+            reason = f"快照维度 {snapshot.dim} 与配置 {self.config.embedchain.vector_dimension} 不一致"
+        if reason is not None:
+            snapshot.close()
+            print(f"警告: 索引快照已过期（{reason}），改用 embedchain 通路；"
+                  f"导入完成后可运行 python main.py export-index 重新导出")
+            return False
+        self.snapshot = snapshot
+        print(f"已加载索引快照: {self.config.paths.snapshot_file}（{len(self.snapshot)} 个分块）")
+        return True
+
+    def _init_client(self):
+        """初始化直连的生成与 embedding 客户端（快照通路与批量预检索使用）"""
+        from openai import OpenAI
+
+        if self.client is None:
+            # 重试由 self.retrier 统一负责，关闭 SDK 自带的重试
+            self.client = OpenAI(api_key=self.config.api.openai_api_key,
+                                 base_url=self.config.api.openai_base_url, max_retries=0)
 
     def _init_app(self):
         """初始化 Embedchain App"""
@@ -41,40 +104,102 @@ class NaiveRAGMethod(BaseMethod):
         self._ensure_documents_loaded()
 
     def _ensure_documents_loaded(self):
-        """确保文档已加载到向量数据库"""
-        from embedchain import App
+        """增量导入知识库目录下新增或修改的文档（未变化时只比对文件大小与修改时间）"""
+        from .ingest import ingest_documents
 
-        doc_path = self.config.get_document_path()
+        ingest_documents(self.config, collection=self.app.db.collection)
         db_count = self.app.db.count()
-
+        print(f"向量数据库当前共 {db_count} 条文档。")
         if db_count == 0:
-            print(f"向量数据库为空（{db_count} 条），正在重置并导入文档: {doc_path} ...")
-            if doc_path.exists():
-                self.app.reset()
-                # reset 后需要重新初始化 App
-                db_path = str(self.config.paths.db_dir)
-                ec_config = self.config.embedchain.to_dict(db_path)
-                self.app = App.from_config(config=ec_config)
-                self.app.add(str(doc_path))
-                new_count = self.app.db.count()
-                print(f"文档导入完成！当前文档数: {new_count}")
-                if new_count == 0:
-                    print("警告: 导入后文档数仍为 0，请检查 OPENAI_API_KEY 和 embedding API 是否可用。")
-            else:
-                print(f"错误: 找不到文件 {doc_path}，请确保文件存在。")
-        else:
-            print(f"向量数据库已有 {db_count} 条文档，跳过导入。")
+            print("警告: 向量数据库为空，请检查 documents_dir 下是否有文档，以及 embedding API 是否可用。")
+
+    def _embed(self, texts: List[str]):
+        """调用 embedding 接口获取向量，按服务商允许的最大批量分批请求"""
+        import numpy as np
+
+        ec = self.config.embedchain
+        vectors = []
+        for start in range(0, len(texts), ec.embed_batch_size):
+            response = self.retrier.call(self.client.embeddings.create, model=ec.embedder_model,
+                                         input=texts[start:start + ec.embed_batch_size],
+                                         dimensions=ec.vector_dimension)
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+        return np.array(vectors, dtype=np.float32)
+
+    def _retrieve(self, questions: List[str]) -> List[List[str]]:
+        """快照批量检索：问题矩阵一次 embedding，一次矩阵检索，每题取生成所用的 number_documents 个分块"""
+        query_vectors = self._embed(questions)
+        indices, _ = self.snapshot.search(query_vectors, top_k=self.config.embedchain.number_documents)
+        return [[self.snapshot.text(int(i)) for i in row] for row in indices]
+
+    def _prompt_template(self, max_chars: int) -> Template:
+        """字数限制对应的问答模板（保留 $context / $query 占位符）"""
+        budget = self.config.budget
+        hint = budget.length_hint.format(max_chars=max_chars) + "\n" if budget.enabled else ""
+        return Template(Template(ANSWER_PROMPT).safe_substitute(length_hint=hint.replace("$", "$$")))
+
+    def _llm_config(self, max_chars: int):
+        """字数限制对应的 embedchain llm 配置（模板与 max_tokens，按字数限制缓存）"""
+        from embedchain.config import BaseLlmConfig
+
+        if max_chars not in self._llm_configs:
+            ec = self.config.embedchain
+            ec_config = ec.to_dict(str(self.config.paths.db_dir), max_tokens=self.max_tokens(max_chars))
+            self._llm_configs[max_chars] = BaseLlmConfig(**ec_config["llm"]["config"],
+                                                         prompt=self._prompt_template(max_chars),
+                                                         number_documents=ec.number_documents)
+        return self._llm_configs[max_chars]
+
+    def _query_app(self, question: str, max_chars: int) -> Tuple[str, List[str]]:
+        """embedchain 通路：由 app.query 检索并生成，返回答案与生成时实际使用的分块"""
+        with self._app_lock:
+            answer, sources = self.retrier.call(self.app.query, question, config=self._llm_config(max_chars),
+                                                citations=True)
+        return answer, [text for text, _ in sources]
+
+    def _generate(self, question: str, chunks: List[str], max_chars: int = 200) -> str:
+        """快照通路：以同一问答模板基于检索分块生成答案，生成长度受字数预算约束"""
+        ec = self.config.embedchain
+        prompt = self._prompt_template(max_chars).substitute(context=" | ".join(chunks), query=question)
+        response = self.retrier.call(
+            self.client.chat.completions.create,
+            model=ec.llm_model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=ec.llm_temperature,
+            max_tokens=self.max_tokens(max_chars),
+            top_p=1,
+        )
+        self._record_usage(response)
+        return response.choices[0].message.content
+
+    def prefetch(self, questions: List[str]):
+        """批量 embedding 一批待答问题，并一次性完成检索（仅快照通路；embedchain 通路由 app.query 检索）"""
+        if not self.config.embedchain.prefetch_embeddings or self.snapshot is None or not questions:
+            return
+        questions = list(dict.fromkeys(questions))
+        print(f"正在批量检索 {len(questions)} 个问题"
+              f"（每批 {self.config.embedchain.embed_batch_size} 条 embedding）...")
+        # 流式处理时按块多次调用，检索结果在使用时弹出
+        self._prefetched.update(zip(questions, self._retrieve(questions)))
 
     def get_answer(self, question: str, max_chars: int = 200) -> str:
-        """获取问题的答案"""
-        answer = self.app.query(question)
-
-        # 同时获取上下文并缓存
-        search_results = self.app.search(question, num_documents=5)
-        self._last_contexts = [r["context"] for r in search_results if "context" in r]
-
+        """获取问题的答案（快照通路一次检索同时得到生成所用分块与记录的上下文）"""
+        answer, self._last_contexts = self.generate(question, self.retrieve(question), max_chars)
         return answer
 
+    def retrieve(self, question: str) -> Optional[List[str]]:
+        """流水线检索阶段：快照通路优先使用预取结果，否则单独 embedding 并检索；embedchain 通路无独立检索"""
+        if self.snapshot is None:
+            return None
+        chunks = self._prefetched.pop(question, None)
+        return chunks if chunks is not None else self._retrieve([question])[0]
+
+    def generate(self, question: str, retrieved: Optional[List[str]], max_chars: int = 200) -> Tuple[str, List[str]]:
+        """流水线生成阶段：快照通路基于检索分块直接生成（可并发），embedchain 通路经 app.query 逐个检索并生成"""
+        if self.snapshot is None:
+            return self._query_app(question, max_chars)
+        return self._generate(question, retrieved, max_chars), retrieved
+
     def get_contexts(self, question: str) -> List[str]:
         """获取检索到的上下文"""
         # 返回缓存的上下文（已在 get_answer 中获取）
@@ -0,0 +1,154 @@
+"""
+检索 / 生成两阶段流水线
+
+检索阶段与生成阶段各自拥有独立的工作线程，中间通过有界队列衔接：
+队列满时检索阶段阻塞（背压），生成阶段完成的结果按输入顺序依次产出。
+已领取但尚未产出的题目数不超过 max_in_flight：某一题生成较慢时，后续已完成的结果在重排缓冲中等待，
+检索阶段在名额释放（该题产出）前不再领取新题，缓冲与并发中的工作量都有上限。
+这样第 i+1 题的检索可以与第 i 题的生成重叠，整体吞吐接近最慢阶段的吞吐。
+输入可以是长度未知的迭代器（如流式读取的测试集），由检索线程按需拉取。
+消费方提前退出或出错时，清空队列并放入结束标记唤醒阻塞在队列上的线程，等待全部线程退出后才返回。
+"""
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+_DONE = object()
+
+
+class _Failed:
+    """检索阶段的异常，原样传递给输出"""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def run_pipeline(items: Iterable[Any],
+                 retrieve: Callable[[Any], Any],
+                 generate: Callable[[Any, Any], Any],
+                 retrieval_workers: int = 1,
+                 generation_workers: int = 1,
+                 queue_size: int = 8,
+                 max_in_flight: Optional[int] = None) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+    """按输入顺序产出 (item, 生成结果, 异常)，任一阶段出错时结果为 None、异常非空
+
+    max_in_flight 为已领取未产出题目数的上限，默认 queue_size + 两阶段线程数。
+    """
+    if hasattr(items, "__len__"):
+        if len(items) == 0:
+            return
+        retrieval_workers = min(retrieval_workers, len(items))
+        generation_workers = min(generation_workers, len(items))
+    retrieval_workers = max(1, retrieval_workers)
+    generation_workers = max(1, generation_workers)
+
+    handoff: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    # 领取题目前取得名额，题目按序产出时归还
+    slots = threading.Semaphore(max(1, max_in_flight or queue_size + retrieval_workers + generation_workers))
+    stop = threading.Event()
+    next_input = iter(enumerate(items))
+    input_lock = threading.Lock()
+    finished = {}
+    finished_cond = threading.Condition()
+    retrievers_left = [retrieval_workers]
+    taken = [0]
+    total = [None]  # 输入耗尽后才知道总数
+    input_error = []
+
+    def retrieval_worker():
+        while not stop.is_set():
+            if not slots.acquire(timeout=0.05):
+                continue
+            with input_lock:
+                try:
+                    entry = next(next_input, None)
+                except Exception as e:
+                    # 读取输入出错（如测试集文件损坏）：已领取的题目照常完成，之后向消费方抛出
+                    input_error.append(e)
+                    entry = None
+                if entry is None:
+                    slots.release()
+                    with finished_cond:
+                        if total[0] is None:
+                            total[0] = taken[0]
+                        finished_cond.notify_all()
+                    break
+                taken[0] += 1
+            idx, item = entry
+            try:
+                retrieved = retrieve(item)
+            except Exception as e:
+                retrieved = _Failed(e)
+            handoff.put((idx, item, retrieved))
+        # 最后一个退出的检索线程通知所有生成线程结束
+        with input_lock:
+            retrievers_left[0] -= 1
+            if retrievers_left[0] == 0:
+                for _ in range(generation_workers):
+                    handoff.put(_DONE)
+
+    def generation_worker():
+        while True:
+            entry = handoff.get()
+            if entry is _DONE or stop.is_set():
+                break
+            idx, item, retrieved = entry
+            if isinstance(retrieved, _Failed):
+                outcome = (item, None, retrieved.error)
+            else:
+                try:
+                    outcome = (item, generate(item, retrieved), None)
+                except Exception as e:
+                    outcome = (item, None, e)
+            with finished_cond:
+                finished[idx] = outcome
+                finished_cond.notify_all()
+
+    threads = [threading.Thread(target=retrieval_worker, daemon=True, name=f"retrieve-{i}")
+               for i in range(retrieval_workers)]
+    threads += [threading.Thread(target=generation_worker, daemon=True, name=f"generate-{i}")
+                for i in range(generation_workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        idx = 0
+        while True:
+            with finished_cond:
+                while idx not in finished and (total[0] is None or idx < total[0]):
+                    finished_cond.wait()
+                if idx not in finished:
+                    break
+                outcome = finished.pop(idx)
+            slots.release()
+            yield outcome
+            idx += 1
+        if input_error:
+            raise input_error[0]
+    finally:
+        # 消费方提前退出（如 Ctrl+C）时停止领取新任务，并回收全部线程
+        stop.set()
+        _shutdown(handoff, threads, retrieval_workers)
+
+
+def _shutdown(handoff: "queue.Queue", threads: list, retrieval_workers: int, poll: float = 0.05):
+    """回收流水线线程：清空队列使阻塞在 put 上的检索线程返回；检索线程全部退出后，
+    放入结束标记唤醒阻塞在 get 上的生成线程。正在执行检索 / 生成调用的线程会等当前调用结束（受请求超时约束）。
+    """
+    retrievers, generators = threads[:retrieval_workers], threads[retrieval_workers:]
+    while True:
+        alive = [thread for thread in threads if thread.is_alive()]
+        if not alive:
+            return
+        while True:
+            try:
+                handoff.get_nowait()
+            except queue.Empty:
+                break
+        if not any(thread.is_alive() for thread in retrievers):
+            for _ in generators:
+                try:
+                    handoff.put_nowait(_DONE)
+                except queue.Full:
+                    break
+        alive[0].join(poll)
@@ -16,6 +16,7 @@ class PureLLMMethod(BaseMethod):
     """纯 LLM 方法"""
 
     name = "pure_llm"
+    concurrent_safe = True  # OpenAI 客户端线程安全，且没有实例级状态
 
     def __init__(self, config: Config = None):
         super().__init__(config)
@@ -27,9 +28,11 @@ class PureLLMMethod(BaseMethod):
         if not api_key:
             raise RuntimeError("请设置环境变量 OPENAI_API_KEY")
 
+        # 重试由 self.retrier 统一负责，关闭 SDK 自带的重试
         self.client = OpenAI(
             api_key=api_key,
-            base_url=self.config.api.openai_base_url
+            base_url=self.config.api.openai_base_url,
+            max_retries=0
         )
 
     def _build_prompt(self, question: str, max_chars: int) -> str:
@@ -44,15 +47,18 @@ class PureLLMMethod(BaseMethod):
         """获取问题的答案"""
         prompt = self._build_prompt(question, max_chars)
 
-        response = self.client.chat.completions.create(
+        response = self.retrier.call(
+            self.client.chat.completions.create,
             model=self.config.api.model_name,
             messages=[
                 {"role": "system", "content": "你需要扮演一个果园病虫害的专家"},
                 {"role": "user", "content": prompt},
             ],
             temperature=0.0,
+            max_tokens=self.max_tokens(max_chars),
             stream=False,
         )
+        self._record_usage(response)
         return response.choices[0].message.content
 
     def get_contexts(self, question: str) -> List[str]:
@@ -0,0 +1,204 @@
+"""
+Naive RAG 向量索引快照
+
+将 Chroma 向量库中的分块文本、元数据与向量导出为单个版本化的二进制文件，
+读取时通过 mmap 零拷贝打开（毫秒级），多个进程共享 OS 页缓存，
+检索为一次归一化向量矩阵乘法，无需加载 embedchain / chromadb。
+头部记录导出时的分块参数、导入清单摘要与集合分块数，snapshot_staleness 据此判断快照是否仍与知识库一致。
+
+文件布局（小端序）：
+    magic(8) | version(uint32) | header_len(uint32) | header(JSON, 补齐到 64 字节对齐)
+    vectors(float32, count × dim, 已 L2 归一化)
+    text_offsets(uint64, count + 1) | texts(UTF-8)
+    meta_offsets(uint64, count + 1) | metas(每条一个 JSON, UTF-8)
+"""
+import json
+import mmap
+import struct
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"RAGSNAP\0"
+VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+_ALIGN = 64
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _blob(items: List[str]) -> Tuple[np.ndarray, bytes]:
+    """将字符串列表编码为 (偏移数组, 拼接字节)"""
+    encoded = [s.encode("utf-8") for s in items]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def write_snapshot(path: Path, texts: List[str], vectors: np.ndarray, metadatas: List[dict] = None,
+                   info: dict = None):
+    """写出快照文件（先写临时文件再原子替换）"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(texts):
+        raise ValueError(f"向量形状 {vectors.shape} 与文本数量 {len(texts)} 不匹配")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+
+    metadatas = metadatas or [{} for _ in texts]
+    text_offsets, text_bytes = _blob(texts)
+    meta_offsets, meta_bytes = _blob([json.dumps(m or {}, ensure_ascii=False) for m in metadatas])
+
+    count, dim = vectors.shape
+    # 先计算各段位置，再写入头部
+    sections = {}
+    header = {"count": count, "dim": dim, "created": time.time(), **(info or {})}
+    header_bytes = b""
+    while True:  # 头部长度影响各段偏移，迭代到头部长度稳定为止
+        pos = _align(_PREFIX.size + len(header_bytes))
+        sections["vectors"] = pos
+        pos = _align(pos + vectors.nbytes)
+        sections["text_offsets"] = pos
+        pos += text_offsets.nbytes
+        sections["texts"] = pos
+        pos = _align(pos + len(text_bytes))
+        sections["meta_offsets"] = pos
+        pos += meta_offsets.nbytes
+        sections["metas"] = pos
+        header["sections"] = dict(sections)
+        encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        encoded += b" " * (_align(_PREFIX.size + len(encoded)) - _PREFIX.size - len(encoded))
+        if len(encoded) == len(header_bytes):
+            header_bytes = encoded
+            break
+        header_bytes = encoded
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, data in [("vectors", vectors.tobytes()), ("text_offsets", text_offsets.tobytes()),
+                           ("texts", text_bytes), ("meta_offsets", meta_offsets.tobytes()),
+                           ("metas", meta_bytes)]:
+            f.write(b"\0" * (sections[name] - f.tell()))
+            f.write(data)
+    tmp_path.replace(path)
+
+
+class IndexSnapshot:
+    """只读的内存映射索引快照"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_len = _PREFIX.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"不是有效的索引快照文件: {self.path}")
+        if version != VERSION:
+            raise ValueError(f"不支持的快照版本 {version}（当前支持 {VERSION}），请重新导出")
+        self.header = json.loads(bytes(self._mmap[_PREFIX.size:_PREFIX.size + header_len]))
+
+        count, dim = self.header["count"], self.header["dim"]
+        sec = self.header["sections"]
+        self.vectors = np.frombuffer(self._mmap, dtype="<f4", count=count * dim,
+                                     offset=sec["vectors"]).reshape(count, dim)
+        self._text_offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=sec["text_offsets"])
+        self._meta_offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=sec["meta_offsets"])
+        self._texts_start = sec["texts"]
+        self._metas_start = sec["metas"]
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    @property
+    def dim(self) -> int:
+        return self.header["dim"]
+
+    def text(self, i: int) -> str:
+        start = self._texts_start + int(self._text_offsets[i])
+        end = self._texts_start + int(self._text_offsets[i + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def metadata(self, i: int) -> dict:
+        start = self._metas_start + int(self._meta_offsets[i])
+        end = self._metas_start + int(self._meta_offsets[i + 1])
+        return json.loads(self._mmap[start:end].decode("utf-8"))
+
+    def search(self, query_vectors: np.ndarray, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """余弦相似度检索，query_vectors 形状为 (q, dim)，返回 (下标, 分数)，形状均为 (q, top_k)"""
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1)
+        scores = queries @ self.vectors.T
+        top_k = min(top_k, len(self))
+        idx = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        part = np.take_along_axis(scores, idx, axis=1)
+        order = np.argsort(-part, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+    def close(self):
+        # 仍有 numpy 视图引用 mmap 时无法关闭，交给垃圾回收处理
+        self.vectors = self._text_offsets = self._meta_offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+
+def snapshot_staleness(config, header: dict) -> Optional[str]:
+    """快照与当前配置、导入清单及知识库文档不一致的原因，一致时返回 None（只比对文件大小与修改时间）"""
+    from .ingest import Manifest, manifest_settings
+
+    settings = manifest_settings(config)
+    if header.get("settings") != settings:
+        return "分块参数、集合或 embedding 模型与快照不一致"
+    manifest = Manifest(config.paths.ingest_manifest, settings)
+    if not manifest.exists or not manifest.compatible:
+        return "没有与当前配置一致的导入清单"
+    if header.get("manifest") != manifest.digest():
+        return "导出快照后向量库重新导入过文档"
+    if header.get("collection_count") != manifest.chunk_count():
+        return f"快照的分块数 {header.get('collection_count')} 与导入清单 {manifest.chunk_count()} 不一致"
+    changed, removed = manifest.changes(config.get_document_paths(), config.paths.documents_dir)
+    if changed or removed:
+        return f"知识库有 {len(changed) + len(removed)} 个文档新增、修改或删除后尚未导入"
+    return None
+
+
+def export_from_chroma(config) -> Path:
+    """从 Naive RAG 的 Chroma 向量库导出快照"""
+    import chromadb
+
+    from .ingest import Manifest, manifest_settings
+
+    ec = config.embedchain
+    client = chromadb.PersistentClient(path=str(config.paths.db_dir))
+    collection = client.get_collection(ec.collection_name)
+    data = collection.get(include=["documents", "metadatas", "embeddings"])
+
+    texts = data["documents"] or []
+    if not texts:
+        raise RuntimeError(f"向量库 {config.paths.db_dir} 中没有可导出的文档")
+
+    settings = manifest_settings(config)
+    manifest = Manifest(config.paths.ingest_manifest, settings)
+    if not manifest.exists or not manifest.compatible:
+        print("警告: 没有与当前配置一致的导入清单，导出的快照不会被使用；请先运行 python main.py ingest")
+
+    path = config.paths.snapshot_file
+    write_snapshot(path, texts, np.asarray(data["embeddings"], dtype=np.float32), data["metadatas"], info={
+        "ids": data["ids"],
+        "settings": settings,
+        "manifest": manifest.digest() if manifest.exists else None,
+        "collection_count": len(texts),
+    })
+    print(f"已导出 {len(texts)} 个分块至索引快照: {path}")
+    return path
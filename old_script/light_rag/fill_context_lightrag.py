@@ -1,43 +1,20 @@
-import requests
 import json
 import os
-from tqdm import tqdm
-
-# LightRAG 服务地址
-URL = "http://127.0.0.1:9621/query"
-
+import sys
+from pathlib import Path
 
-def get_lightrag_context(question, session):
-    """
-    调用 LightRAG API 获取检索到的上下文 (Context)。
-    通过设置 'only_need_context': True 来获取原始检索内容。
-    """
-    payload = {
-        "query": question,
-        "mode": "mix",  # 保持和你生成答案时一致的模式 (mix/local/global)
-        "only_need_context": True,
-        "top_k":5,
-        "chunk_top_k":5
-    }
-
-    try:
-        response = session.post(URL, json=payload)
-        response.raise_for_status()
-        result = response.json()
+from tqdm import tqdm
 
-        # LightRAG 返回的 context 通常是一个拼接好的长字符串
-        # 为了适配 Ragas，我们需要将其放入列表
-        context_text = result.get("response", "")
-        if not context_text:
-            return []
-        return [context_text]
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from config import Config
+from methods.lightrag_client import fetch_contexts
 
-    except Exception as e:
-        print(f"Error retrieving context for '{question}': {e}")
-        return []
+# LightRAG 服务地址、检索模式与 top_k 取自 Config().api / Config().lightrag
+# 每批并发请求的题目数（共享客户端的连接池负责限流）
+BATCH_SIZE = 32
 
 
-def process_file(file_path):
+def process_file(file_path, config):
     print(f"正在处理文件: {file_path}")
 
     if not os.path.exists(file_path):
@@ -47,20 +24,17 @@ def process_file(file_path):
     with open(file_path, "r", encoding="utf-8") as f:
         data = json.load(f)
 
-    # 使用 Session 提高 HTTP 请求效率
-    with requests.Session() as session:
-        for item in tqdm(data, desc="Fetching Contexts"):
-            # 如果已经有 contexts 且不为空，跳过
-            if "contexts" in item and item["contexts"]:
-                continue
-
-            question = item.get("question", "")
-            if not question:
-                continue
+    # 如果已经有 contexts 且不为空，跳过
+    pending = [item for item in data if item.get("question") and not item.get("contexts")]
 
-            # 获取 Context 并回填
-            contexts = get_lightrag_context(question, session)
-            item["contexts"] = contexts
+    # 与 LightRAG 方法共用同一个异步连接池客户端，按批并发获取 Context 并回填
+    with tqdm(total=len(pending), desc="Fetching Contexts") as pbar:
+        for start in range(0, len(pending), BATCH_SIZE):
+            batch = pending[start:start + BATCH_SIZE]
+            contexts = fetch_contexts(config, [item["question"] for item in batch])
+            for item, ctx in zip(batch, contexts):
+                item["contexts"] = ctx
+            pbar.update(len(batch))
 
     # 覆盖保存
     with open(file_path, "w", encoding="utf-8") as f:
@@ -77,5 +51,6 @@ if __name__ == "__main__":
         "testset/output_B.json"
     ]
 
+    config = Config()
     for fp in files_to_process:
-        process_file(fp)
\ No newline at end of file
+        process_file(fp, config)
\ No newline at end of file
@@ -0,0 +1 @@
+from .server import MethodBatcher, RAGServer, serve
@@ -0,0 +1,180 @@
+"""
+常驻服务模式（main.py serve）
+
+在一个进程内初始化各方法（Embedchain App、OpenAI 客户端、LightRAG 连接池）并常驻复用，
+通过本地 HTTP API 对外提供查询：
+
+    GET  /health                      -> 服务状态与已加载的方法
+    POST /query                       -> {"method": "naive_rag", "question": "...", "max_chars": 200}
+                                         或以 "test_type": "A" 代替 max_chars
+
+同一方法的并发请求在短时间窗口内合并为一批，交给 BaseMethod.answer_batch 处理。
+"""
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+
+
+class MethodBatcher:
+    """将同一方法的并发请求按时间窗口合并为批次"""
+
+    def __init__(self, method, max_batch: int = 8, batch_window_ms: int = 10):
+        self.method = method
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name=f"batcher-{method.name}")
+        self._thread.start()
+
+    def submit(self, question: str, max_chars: int) -> Future:
+        """提交一个请求，返回结果 Future（结果为 (answer, contexts, work_ms)）"""
+        future = Future()
+        self._queue.put((question, max_chars, future))
+        return future
+
+    def _collect(self) -> List[tuple]:
+        """阻塞等待首个请求，再在时间窗口内尽量凑满一批"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            questions = [item[0] for item in batch]
+            max_chars = [item[1] for item in batch]
+            start = time.perf_counter()
+            try:
+                results = self.method.answer_batch(questions, max_chars)
+            except Exception:
+                # 整批失败时逐条重试，只让真正出错的请求返回错误
+                results = None
+            work_ms = (time.perf_counter() - start) * 1000
+
+            if results is not None:
+                for (_, _, future), (answer, contexts) in zip(batch, results):
+                    future.set_result((answer, contexts, work_ms))
+                continue
+
+            for question, chars, future in batch:
+                start = time.perf_counter()
+                try:
+                    answer, contexts = self.method.answer_with_contexts(question, chars)
+                    future.set_result((answer, contexts, (time.perf_counter() - start) * 1000))
+                except Exception as e:
+                    future.set_exception(e)
+
+
+class RAGServer:
+    """持有常驻的方法实例与批处理器"""
+
+    def __init__(self, config: Config, method_names: List[str]):
+        from methods import get_method
+
+        self.config = config
+        self.batchers: Dict[str, MethodBatcher] = {}
+        for name in method_names:
+            print(f"正在加载方法: {name} ...")
+            try:
+                method = get_method(name, config)
+            except Exception as e:
+                print(f"警告: 方法 {name} 初始化失败，已跳过: {e}")
+                continue
+            self.batchers[name] = MethodBatcher(method, config.serve.max_batch, config.serve.batch_window_ms)
+        print(f"已加载方法: {list(self.batchers.keys())}")
+
+    def query(self, payload: dict) -> dict:
+        """处理一次查询请求"""
+        method = payload.get("method")
+        question = (payload.get("question") or "").strip()
+        if method not in self.batchers:
+            raise KeyError(f"未加载的方法: {method}。可用方法: {list(self.batchers.keys())}")
+        if not question:
+            raise ValueError("question 不能为空")
+
+        if "max_chars" in payload:
+            max_chars = int(payload["max_chars"])
+        else:
+            max_chars = self.config.get_max_chars(payload.get("test_type", "A"))
+
+        received = time.perf_counter()
+        answer, contexts, work_ms = self.batchers[method].submit(question, max_chars).result()
+        total_ms = (time.perf_counter() - received) * 1000
+        return {
+            "method": method,
+            "question": question,
+            "answer": answer,
+            "contexts": contexts,
+            "work_ms": round(work_ms, 1),
+            "queue_ms": round(max(total_ms - work_ms, 0.0), 1),
+        }
+
+
+def _make_handler(server: RAGServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, data: dict):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok", "methods": list(server.batchers.keys())})
+            else:
+                self._send_json(404, {"error": f"未知路径: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/query":
+                self._send_json(404, {"error": f"未知路径: {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                self._send_json(200, server.query(payload))
+            except (KeyError, ValueError) as e:
+                self._send_json(400, {"error": str(e)})
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(config: Config, method_names: List[str] = None, host: str = None, port: int = None):
+    """启动常驻 HTTP 服务（阻塞，Ctrl+C 退出）"""
+    method_names = method_names or config.methods
+    host = host or config.serve.host
+    port = port or config.serve.port
+
+    rag_server = RAGServer(config, method_names)
+    httpd = ThreadingHTTPServer((host, port), _make_handler(rag_server))
+    httpd.daemon_threads = True
+    print(f"服务已启动: http://{host}:{port}  (POST /query, GET /health)")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
@@ -0,0 +1 @@
+from .engine import Sweep, iter_points, parse_space, run_sweep
@@ -0,0 +1,324 @@
+"""
+RAG 配置参数扫描（main.py sweep）
+
+搜索空间为 {配置路径: 候选值列表}，如 {"embedchain.chunk_size": [500, 1000], "lightrag.mode": ["mix", "local"]}，
+支持网格搜索与随机搜索（不展开整个网格，直接按下标抽样）。
+    - 参数只作用于相关的方法：embedchain.* 只影响 naive_rag，lightrag.* 只影响 light_rag，
+      其余参数（如 budget.*）作用于全部方法；投影后相同的配置点只运行一次
+    - Naive RAG 每种分块设置构建一个独立索引（增量导入 + 导出快照），
+      只有查询期参数不同的配置点共用同一个索引
+    - 各配置点并发运行，回答写入各自的目录；目录名由应用参数后的方法相关配置（含模型与长度预算）哈希得到，
+      已完成且无失败回答的配置点直接复用
+    - 汇总表（results.csv）按配置点与测试集给出本地指标与检索指标（Recall@k / MRR）均值、
+      失败数、耗时与 token 用量，
+      --judge 时额外给出 LLM Judge 评分均值
+LightRAG 的分块在服务端完成，只能扫描查询期参数（mode / top_k / chunk_top_k 等）。
+"""
+import copy
+import hashlib
+import itertools
+import json
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+
+# 只影响某一个方法的配置段
+METHOD_SECTIONS = {"naive_rag": "embedchain", "light_rag": "lightrag"}
+
+
+def parse_value(text: str) -> Any:
+    """命令行取值：能按 JSON 解析的（数字、布尔）按 JSON，否则为字符串"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def parse_space(params: List[str] = None, space_file: Path = None) -> Dict[str, list]:
+    """由 --space 文件与 --param key=v1,v2 构造搜索空间（后者覆盖前者）"""
+    space = {}
+    if space_file:
+        with open(space_file, "r", encoding="utf-8") as f:
+            space.update({k: v if isinstance(v, list) else [v] for k, v in json.load(f).items()})
+    for item in params or []:
+        key, sep, values = item.partition("=")
+        if not sep or not values:
+            raise ValueError(f"参数格式应为 key=v1,v2: {item}")
+        space[key.strip()] = [parse_value(v.strip()) for v in values.split(",")]
+    return space
+
+
+def set_param(config: Config, key: str, value: Any):
+    """按 "段.字段" 路径修改配置，字段不存在时报错"""
+    *parents, name = key.split(".")
+    target = config
+    for part in parents:
+        target = getattr(target, part)
+    if not hasattr(target, name):
+        raise ValueError(f"未知的配置项: {key}")
+    setattr(target, name, value)
+
+
+def relevant(method: str, key: str) -> bool:
+    """参数是否作用于该方法"""
+    section = key.split(".", 1)[0]
+    owner = next((m for m, s in METHOD_SECTIONS.items() if s == section), None)
+    return owner is None or owner == method
+
+
+def iter_points(space: Dict[str, list], samples: Optional[int] = None, seed: int = 0) -> List[Dict[str, Any]]:
+    """网格搜索返回全部组合；samples 给定时从网格中无放回随机抽取（按混合进制下标解码）"""
+    keys = list(space)
+    sizes = [len(space[k]) for k in keys]
+    total = 1
+    for size in sizes:
+        total *= size
+    if samples is None or samples >= total:
+        return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    points = []
+    for index in sorted(random.Random(seed).sample(range(total), samples)):
+        point = {}
+        for key, size in zip(reversed(keys), reversed(sizes)):
+            index, i = divmod(index, size)
+            point[key] = space[key][i]
+        points.append({k: point[k] for k in keys})
+    return points
+
+
+def _digest(data) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+
+def run_fingerprint(method: str, config: Config) -> dict:
+    """决定方法回答的配置（应用扫描参数之后）：方法配置段、长度预算与所用模型 / 服务地址（不含密钥与路径）
+
+    基础配置变化（如更换模型、调整默认分块）时运行目录随之改变，不会复用旧配置点的回答。
+    """
+    api = config.api
+    fingerprint = {
+        "method": method,
+        "budget": asdict(config.budget),
+        "api": {"base_url": api.openai_base_url, "model": api.model_name},
+    }
+    section = METHOD_SECTIONS.get(method)
+    if section:
+        fingerprint[section] = asdict(getattr(config, section))
+    if method == "light_rag":
+        fingerprint["api"]["lightrag_url"] = api.lightrag_url
+    return fingerprint
+
+
+@dataclass
+class SweepRun:
+    """一个方法在一个配置点上的运行"""
+    method: str
+    params: Dict[str, Any]
+    config: Config
+    run_dir: Path
+    index_dir: Optional[Path] = None
+    rows: List[dict] = field(default_factory=list)
+
+
+class Sweep:
+    """参数扫描：构建索引、并发运行配置点、汇总结果"""
+
+    def __init__(self, config: Config, space: Dict[str, list], methods: List[str], test_types: List[str],
+                 samples: Optional[int] = None, jobs: Optional[int] = None, force: bool = False,
+                 judge: bool = False):
+        self.config = config
+        self.space = space
+        self.methods = methods
+        self.test_types = test_types
+        self.jobs = max(1, jobs or config.sweep.jobs)
+        self.force = force
+        self.judge = judge
+        self.sweep_dir = config.paths.sweep_dir
+        self.points = iter_points(space, samples, config.sweep.seed)
+        self.runs = self._plan()
+
+    def _plan(self) -> List[SweepRun]:
+        """为每个方法投影配置点并去重，分配运行目录与索引目录"""
+        from methods.ingest import manifest_settings
+
+        runs, seen = [], set()
+        for method in self.methods:
+            for point in self.points:
+                params = {k: v for k, v in point.items() if relevant(method, k)}
+                config = copy.deepcopy(self.config)
+                for key, value in params.items():
+                    set_param(config, key, value)
+                run_id = _digest(run_fingerprint(method, config))
+                if run_id in seen:
+                    continue
+                seen.add(run_id)
+                config.methods = [method]
+                config.test_types = list(self.test_types)
+                run_dir = self.sweep_dir / "runs" / method / run_id
+                config.paths.results_dir = run_dir
+                config.paths.output_dir = run_dir
+
+                index_dir = None
+                if method == "naive_rag":
+                    # 分块设置相同（只有查询期参数不同）的配置点共用索引
+                    index_dir = self.sweep_dir / "indexes" / _digest(manifest_settings(config))
+                    config.paths.db_dir = index_dir / "db"
+                    config.paths.ingest_manifest = index_dir / "db" / "ingest_manifest.json"
+                    config.paths.snapshot_file = index_dir / "naive_rag.snapshot"
+                    config.embedchain.use_snapshot = True
+                runs.append(SweepRun(method, params, config, run_dir, index_dir))
+        return runs
+
+    def _build_index(self, run: SweepRun):
+        """增量导入文档并导出快照（未变化时只比对文件状态）"""
+        from methods.ingest import ingest_documents
+        from methods.snapshot import IndexSnapshot, export_from_chroma, snapshot_staleness
+
+        print(f"[索引] {run.index_dir.name}: chunk_size={run.config.embedchain.chunk_size}, "
+              f"chunk_overlap={run.config.embedchain.chunk_overlap}")
+        ingest_documents(run.config)
+        stale = True
+        if run.config.paths.snapshot_file.exists():
+            snapshot = IndexSnapshot(run.config.paths.snapshot_file)
+            stale = snapshot_staleness(run.config, snapshot.header) is not None
+            snapshot.close()
+        if stale:
+            export_from_chroma(run.config)
+
+    def _cached(self, run: SweepRun, test_type: str) -> Optional[List[dict]]:
+        """已完成且无失败回答的输出"""
+        from methods import ERROR_ANSWER
+        from utils import load_results
+
+        output_path = run.config.get_output_path(run.method, test_type)
+        if self.force or not output_path.exists():
+            return None
+        records = load_results(run.config, output_path)
+        if any(r.get("answer") == ERROR_ANSWER for r in records):
+            return None
+        return records
+
+    def _execute(self, run: SweepRun):
+        """运行一个配置点的全部测试集"""
+        from methods import ERROR_ANSWER, get_method
+        from utils import load_results
+
+        run.run_dir.mkdir(parents=True, exist_ok=True)
+        with open(run.run_dir / "params.json", "w", encoding="utf-8") as f:
+            json.dump({"method": run.method, "params": run.params,
+                       "config": run_fingerprint(run.method, run.config)}, f, ensure_ascii=False, indent=2)
+        stats_file = run.run_dir / "run_stats.json"
+        previous = {}
+        if stats_file.exists():
+            with open(stats_file, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+
+        method = None
+        run_stats = {}
+        for test_type in self.test_types:
+            records = self._cached(run, test_type)
+            if records is not None:
+                stats = dict(previous.get(test_type, {}), cached=True)
+            else:
+                if method is None:
+                    method = get_method(run.method, run.config)
+                before = dict(method.usage)
+                start = time.perf_counter()
+                records = load_results(run.config, method.process_testset(test_type, verbose=False))
+                stats = {
+                    "seconds": round(time.perf_counter() - start, 2),
+                    "completion_tokens": method.usage["completion_tokens"] - before["completion_tokens"],
+                    "cached": False,
+                }
+            stats["questions"] = len(records)
+            stats["errors"] = sum(r.get("answer") == ERROR_ANSWER for r in records)
+            run_stats[test_type] = stats
+            run.rows.append(self._row(run, test_type, records, stats))
+        with open(stats_file, "w", encoding="utf-8") as f:
+            json.dump(run_stats, f, ensure_ascii=False, indent=2)
+
+        if self.judge:
+            self._judge(run)
+        print(f"[完成] {run.method} {run.params}")
+
+    def _row(self, run: SweepRun, test_type: str, records: List[dict], stats: dict) -> dict:
+        """汇总表的一行：参数、运行统计与本地指标均值"""
+        import numpy as np
+        from evaluation.local_metrics import compute_local_metrics
+        from evaluation.retrieval_metrics import compute_retrieval_metrics, load_handbook, summarize
+
+        row = {"method": run.method, "run_id": run.run_dir.name, "test_type": test_type}
+        row.update({key: run.params.get(key) for key in self.space})
+        row.update({k: stats.get(k) for k in ("questions", "errors", "seconds", "completion_tokens", "cached")})
+        if records:
+            for col, values in compute_local_metrics(records).items():
+                row[col] = round(float(np.nanmean(values)), 4) if not np.all(np.isnan(values)) else None
+            # 检索指标只对有上下文的方法有意义
+            handbook = load_handbook(self.config)
+            summary = summarize(compute_retrieval_metrics(records, handbook, self.config.retrieval_metrics))
+            if summary.get("Scored"):
+                row.update({k: v for k, v in summary.items() if k != "Gold_Passages"})
+        return row
+
+    def _judge(self, run: SweepRun):
+        """LLM Judge 评分（进度与评分缓存保存在配置点目录中）"""
+        from evaluation import Evaluator
+        from evaluation.score_table import SCORE_COLS, records_to_frame
+
+        results = Evaluator(run.config).evaluate_all()
+        if not results:
+            return
+        means = records_to_frame(results).groupby("Type", observed=True)[SCORE_COLS].mean()
+        for row in run.rows:
+            if row["test_type"] in means.index:
+                row.update({col: round(float(means.loc[row["test_type"], col]), 2) for col in SCORE_COLS})
+
+    def run(self) -> Path:
+        """构建所需索引、并发运行全部配置点并写出汇总表，返回汇总表路径"""
+        import pandas as pd
+
+        print(f"参数扫描: {len(self.points)} 个配置点，{len(self.runs)} 次方法运行，并发 {self.jobs}")
+        self.config.prepare()
+
+        indexes = {}
+        for run in self.runs:
+            if run.index_dir is not None:
+                indexes.setdefault(run.index_dir, run)
+        if indexes:
+            print(f"需要 {len(indexes)} 个 Naive RAG 索引")
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                list(pool.map(self._build_index, indexes.values()))
+
+        def execute(run: SweepRun):
+            try:
+                self._execute(run)
+            except Exception as e:
+                print(f"[失败] {run.method} {run.params}: {e}")
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            list(pool.map(execute, self.runs))
+
+        rows = [row for run in self.runs for row in run.rows]
+        table_path = self.sweep_dir / "results.csv"
+        table_path.parent.mkdir(parents=True, exist_ok=True)
+        df = pd.DataFrame(rows)
+        df.to_csv(table_path, index=False, encoding="utf-8-sig")
+        if not df.empty:
+            sort_col = "Local_CharF1" if "Local_CharF1" in df.columns else "method"
+            print("\n" + df.sort_values(["test_type", sort_col], ascending=[True, False]).to_string(index=False))
+        print(f"\n汇总表已保存至: {table_path}")
+        return table_path
+
+
+def run_sweep(config: Config, space: Dict[str, list], methods: List[str], test_types: List[str],
+              **kwargs) -> Path:
+    """执行一次参数扫描"""
+    if not space:
+        raise ValueError("搜索空间为空，请通过 --param 或 --space 指定")
+    return Sweep(config, space, methods, test_types, **kwargs).run()
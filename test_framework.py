@@ -32,7 +32,7 @@ def test_config():
         print(f"  - 测试集目录: {config.paths.testset_dir}")
         print(f"  - 输出目录: {config.paths.output_dir}")
         print(f"  - 测试集 A 路径存在: {config.get_testset_path('A').exists()}")
-        print(f"  - 知识库文档存在: {config.get_document_path().exists()}")
+        print(f"  - 知识库文档数: {len(config.get_document_paths())}")
         return config
     except Exception as e:
         print(f"✗ 配置初始化失败: {e}")
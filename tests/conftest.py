@@ -0,0 +1,25 @@
+import sys
+from dataclasses import fields
+from pathlib import Path
+
+import pytest
+
+# 测试直接导入项目根目录下的模块
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import Config  # noqa: E402
+
+
+@pytest.fixture
+def config(tmp_path):
+    """所有路径都指向 tmp_path 的配置（不触碰仓库中的数据与输出）"""
+    from config.config import PROJECT_ROOT
+
+    config = Config()
+    for f in fields(config.paths):
+        path = getattr(config.paths, f.name)
+        setattr(config.paths, f.name, tmp_path / path.relative_to(PROJECT_ROOT))
+    config.api.judge_api_key = "test"
+    config.methods = ["m1", "m2"]
+    config.test_types = ["A"]
+    return config
@@ -0,0 +1,109 @@
+"""序贯提前停止评测：配对差值置信区间的停止规则与 evaluate_adaptive 的提前停止"""
+import json
+import re
+
+import numpy as np
+import pytest
+
+from evaluation.adaptive import critical_value, is_settled, pair_decisions, system_bounds
+from evaluation.evaluator import Evaluator
+
+Z = critical_value(0.95, 3)
+
+
+def _scores(values):
+    return {f"q{i}": (v, v, v) for i, v in enumerate(values)}
+
+
+def _decisions(known, sampled, unknown, tolerance=0.5, min_pairs=5):
+    return {d["decision"] for d in pair_decisions(known, sampled, unknown, Z, tolerance, min_pairs)}
+
+
+def test_critical_value_grows_with_comparisons():
+    assert critical_value(0.95, 1) == pytest.approx(1.96, abs=0.01)
+    assert critical_value(0.95, 30) > critical_value(0.95, 3) > critical_value(0.95, 1)
+
+
+def test_clear_difference_settles_after_min_pairs():
+    rng = np.random.default_rng(0)
+    questions = {f"q{i}" for i in range(100)}
+    a = _scores(8 + rng.integers(-1, 2, size=100))
+    b = _scores(4 + rng.integers(-1, 2, size=100))
+    unknown = {"A": questions, "B": questions}
+    known = {"A": {}, "B": {}}
+
+    def drawn(scores, n):
+        return {f"q{i}": scores[f"q{i}"] for i in range(n)}
+
+    # 配对样本不足 min_pairs 时不做判断
+    assert _decisions(known, {"A": drawn(a, 4), "B": drawn(b, 4)}, unknown) == {"open"}
+    decisions = pair_decisions(known, {"A": drawn(a, 10), "B": drawn(b, 10)}, unknown, Z, 0.5, 5)
+    assert is_settled(decisions) and {d["decision"] for d in decisions} == {"A>B"}
+    assert all(d["n_pairs"] == 10 and d["n_unknown"] == 100 for d in decisions)
+
+
+def test_noisy_equal_systems_stay_open_until_exhausted():
+    rng = np.random.default_rng(1)
+    questions = {f"q{i}" for i in range(60)}
+    a = _scores(rng.integers(0, 11, size=60))
+    b = _scores(rng.integers(0, 11, size=60))
+    unknown = {"A": questions, "B": questions}
+    half = {s: {f"q{i}": v[f"q{i}"] for i in range(30)} for s, v in (("A", a), ("B", b))}
+    assert not is_settled(pair_decisions({"A": {}, "B": {}}, half, unknown, Z, 0.5, 5))
+    # 全部评完后区间收缩为一点，必然可以判断
+    assert is_settled(pair_decisions({"A": {}, "B": {}}, {"A": a, "B": b}, unknown, Z, 0.5, 5))
+
+
+def test_identical_scores_are_a_tie_and_known_scores_are_exact():
+    same = _scores([5, 6, 7, 8] * 5)
+    known = {"A": same, "B": dict(same)}
+    assert _decisions(known, {}, {}) == {"tie"}
+    bounds = system_bounds(known, {}, {}, Z)
+    assert all(b["ci_low"] == b["ci_high"] == b["mean"] == 6.5 for b in bounds)
+
+
+def _write_outputs(config, n):
+    for method in config.methods:
+        path = config.get_output_path(method, "A")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        items = [{"question": f"问题{i}", "answer": f"{method}-回答{i}", "standard_answer": f"标准{i}",
+                  "contexts": []} for i in range(n)]
+        path.write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+
+
+def _evaluator(config):
+    evaluator = Evaluator(config)
+    evaluator.calls = 0
+
+    def judge(prompt):
+        evaluator.calls += 1
+        i = int(re.search(r"m\d-回答(\d+)", prompt).group(1))
+        score = (8 if "m1-回答" in prompt else 4) + i % 3 - 1
+        return {"faithfulness_score": score, "comprehensiveness_score": score, "relevance_score": score,
+                "reason": "ok"}
+
+    evaluator._judge = judge
+    return evaluator
+
+
+def test_evaluate_adaptive_stops_early(config):
+    config.adaptive.batch_size, config.adaptive.min_pairs = 5, 10
+    _write_outputs(config, 200)
+    evaluator = _evaluator(config)
+    report = evaluator.evaluate_adaptive()
+
+    info = report["types"]["A"]
+    assert info["settled"]
+    assert {d["decision"] for d in info["decisions"]} == {"A>B"}
+    assert report["pending"] == 400
+    assert 20 <= evaluator.calls == report["judged"] < 400
+    assert report["avoided"] == 400 - evaluator.calls
+
+
+def test_evaluate_adaptive_respects_budget(config):
+    config.adaptive.min_pairs = 10
+    _write_outputs(config, 200)
+    evaluator = _evaluator(config)
+    report = evaluator.evaluate_adaptive(budget=7)
+    assert evaluator.calls == report["judged"] == 7
+    assert not report["types"]["A"]["settled"]
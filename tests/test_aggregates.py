@@ -0,0 +1,109 @@
+"""增量汇总：Welford 增删与合并、快照按偏移续读与进度文件改写检测"""
+import json
+import math
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from evaluation.aggregates import RunningStat, ScoreAggregates
+from evaluation.score_table import SCORE_COLS
+
+
+def _stat(values):
+    stat = RunningStat()
+    for x in values:
+        stat.add(x)
+    return stat
+
+
+def _assert_matches(stat, values):
+    assert stat.n == len(values)
+    assert stat.mean == pytest.approx(np.mean(values))
+    assert stat.variance == pytest.approx(np.var(values, ddof=1))
+    expected = pd.Series(values, dtype=float).describe()
+    for key, value in stat.describe().items():
+        assert value == pytest.approx(expected[key]), key
+
+
+def test_add_remove_merge_match_numpy():
+    rng = random.Random(0)
+    values = [rng.randint(0, 10) for _ in range(200)]
+    stat = _stat(values)
+    _assert_matches(stat, values)
+
+    for x in values[:150:3]:
+        stat.remove(x)
+        values.remove(x)
+    _assert_matches(stat, values)
+
+    other = [rng.randint(0, 10) for _ in range(37)]
+    _assert_matches(stat.merge(_stat(other)), values + other)
+    _assert_matches(RunningStat().merge(stat), values)
+
+
+def test_remove_last_sample_resets():
+    stat = _stat([7])
+    stat.remove(7)
+    assert stat.n == 0 and stat.mean == 0 and not stat.counts
+    assert math.isnan(stat.describe()["mean"])
+
+
+def _record(system, question, score, test_type="A"):
+    return {"System": system, "Type": test_type, "Question": question,
+            **{col: score for col in SCORE_COLS}}
+
+
+def _write(path, records, mode="a"):
+    with open(path, mode, encoding="utf-8") as f:
+        f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+
+
+def test_update_replaces_previous_score():
+    aggregates = ScoreAggregates.from_records([_record("s", "q1", 4), _record("s", "q2", 8),
+                                               _record("s", "q1", 10)])
+    assert len(aggregates) == 2
+    assert aggregates.means("s", "A") == {col: 9 for col in SCORE_COLS}
+
+
+def test_snapshot_resumes_from_offset(tmp_path):
+    progress = tmp_path / "evaluation_progress.jsonl"
+    snapshot = tmp_path / "evaluation_aggregates.json"
+    first = [_record("s", f"q{i}", i % 10) for i in range(20)]
+    _write(progress, first)
+    ScoreAggregates.load(snapshot, progress).save(snapshot)
+
+    # 快照之后追加的记录（含对旧问题的重评）只需续读
+    later = [_record("s", "q0", 9), _record("t", "q1", 3)]
+    _write(progress, later)
+    loaded = ScoreAggregates.load(snapshot, progress)
+    assert loaded.offset == progress.stat().st_size
+    assert loaded.summary() == ScoreAggregates.from_records(first + later).summary()
+
+    # 未写完的末行不推进偏移，补全后再读入
+    with open(progress, "a", encoding="utf-8") as f:
+        f.write('{"System": "t", "Type": "A", "Question": "q2"')
+    partial = ScoreAggregates.load(snapshot, progress)
+    assert len(partial) == len(loaded)
+    with open(progress, "a", encoding="utf-8") as f:
+        f.write(', "Score_Faithfulness": 5}\n')
+    partial.catch_up(progress)
+    assert len(partial) == len(loaded) + 1
+
+
+def test_rewritten_progress_file_is_rebuilt(tmp_path):
+    progress = tmp_path / "evaluation_progress.jsonl"
+    snapshot = tmp_path / "evaluation_aggregates.json"
+    _write(progress, [_record("s", f"q{i}", 5) for i in range(10)])
+    ScoreAggregates.load(snapshot, progress).save(snapshot)
+
+    # 同样长度但内容不同：偏移仍有效，指纹不一致，应全量重建而不是续读
+    rewritten = [_record("s", f"q{i}", 7) for i in range(10)]
+    _write(progress, rewritten, mode="w")
+    loaded = ScoreAggregates.load(snapshot, progress)
+    assert loaded.means("s", "A") == {col: 7 for col in SCORE_COLS}
+
+    # 文件变短（偏移越界）同样重建
+    _write(progress, rewritten[:3], mode="w")
+    assert len(ScoreAggregates.load(snapshot, progress)) == 3
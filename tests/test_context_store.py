@@ -0,0 +1,90 @@
+"""上下文存储：引用写出与还原的往返、文档版本固定与存储缺失时的报错"""
+import json
+
+import pytest
+
+from config import Config
+from utils import context_store
+from utils.context_store import ContextStore, load_results, save_results
+
+HANDBOOK = ("苹果腐烂病：春季刮除病斑，涂抹甲基硫菌灵糊剂，并剪除病枝集中烧毁。\n"
+            "梨黑星病：发芽前喷洒石硫合剂，落花后每隔十五天喷一次多菌灵。\n")
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setattr(context_store, "_registry", {})
+    docs = tmp_path / "documents"
+    docs.mkdir()
+    (docs / "handbook.txt").write_text(HANDBOOK, encoding="utf-8")
+    config = Config()
+    config.paths.documents_dir = docs
+    config.paths.context_store_dir = tmp_path / "contexts"
+    return config
+
+
+def _records():
+    return [
+        {"question": "苹果腐烂病怎么治？", "answer": "刮除病斑", "contexts": [
+            HANDBOOK.splitlines()[0],  # 整段出自手册
+            "实体: 苹果腐烂病\n" + HANDBOOK.splitlines(keepends=True)[1] + "关系: 防治",  # 拼接文本
+        ]},
+        {"question": "梨黑星病？", "answer": "喷药", "contexts": ["实体: 苹果腐烂病\n短行", ""]},
+        {"question": "无检索", "answer": "x"},
+    ]
+
+
+def test_store_round_trip(tmp_path):
+    doc = tmp_path / "handbook.txt"
+    doc.write_text(HANDBOOK, encoding="utf-8")
+    store = ContextStore(tmp_path / "store", [doc], min_span=8)
+    texts = [HANDBOOK.splitlines()[0], HANDBOOK, "实体: 苹果\n" + HANDBOOK, "短", ""]
+    refs = [store.intern(t) for t in texts]
+    assert refs[0].startswith("@") and " " not in refs[0]
+    assert refs[1].startswith("@") and " " not in refs[1]  # 首尾相接的原文片段合并为一个引用
+    store.flush()
+    assert store.resolve_many(refs) == texts
+    store.close()
+
+    # 文档修改后，旧引用仍指向存储中的原版本
+    doc.write_text("完全不同的内容", encoding="utf-8")
+    reopened = ContextStore(tmp_path / "store", [doc], min_span=8)
+    assert reopened.resolve_many(refs) == texts
+    reopened.close()
+
+
+def test_results_round_trip_when_enabled(config, tmp_path):
+    config.context_store.enabled = True
+    path = tmp_path / "results.json"
+    assert save_results(config, path, iter(_records())) == 3
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert all("contexts" not in r for r in saved)
+    assert load_results(config, path) == _records()
+    assert load_results(config, path, resolve=False) == saved
+
+
+def test_disabled_by_default_keeps_full_text(config, tmp_path):
+    path = tmp_path / "results.json"
+    save_results(config, path, _records())
+    assert json.loads(path.read_text(encoding="utf-8")) == _records()
+    assert not config.paths.context_store_dir.exists()
+
+
+def test_missing_store_raises_a_clear_error(config, tmp_path, monkeypatch):
+    path = tmp_path / "results.json"
+    save_results(config, path, _records(), intern=True)
+
+    moved = Config()
+    moved.paths.documents_dir = config.paths.documents_dir
+    moved.paths.context_store_dir = tmp_path / "elsewhere"
+    with pytest.raises(FileNotFoundError, match="elsewhere"):
+        load_results(moved, path)
+
+    # 存储存在但缺少片段
+    monkeypatch.setattr(context_store, "_registry", {})
+    store = ContextStore(config.paths.context_store_dir)
+    with store._conn:
+        store._conn.execute("DELETE FROM blobs")
+    store.close()
+    with pytest.raises(FileNotFoundError, match="缺少片段"):
+        load_results(config, path)
@@ -0,0 +1,96 @@
+"""评分缓存键：评分模型 / Prompt / 评分输入变化时失效，命中时不调用 LLM Judge"""
+import json
+
+import pytest
+
+from evaluation.evaluator import Evaluator, judge_key, prompt_version, read_progress
+
+ITEM = {"question": "苹果腐烂病怎么治？", "answer": "刮除病斑", "standard_answer": "刮除病斑并涂药",
+        "contexts": ["苹果腐烂病：春季刮除病斑，涂抹药剂。"]}
+
+
+def test_key_depends_on_model_prompt_and_inputs():
+    base = judge_key("glm", ITEM, prompt_version("full"))
+    assert judge_key("glm", dict(ITEM), prompt_version("full")) == base
+    assert judge_key("other", ITEM, prompt_version("full")) != base
+    assert judge_key("glm", ITEM, prompt_version("none")) != base
+    assert judge_key("glm", dict(ITEM, answer="喷药"), prompt_version("full")) != base
+    assert judge_key("glm", dict(ITEM, contexts=[]), prompt_version("full")) != base
+
+
+def _write_outputs(config, answers):
+    path = config.get_output_path("m1", "A")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    items = [dict(ITEM, question=f"q{i}", answer=a) for i, a in enumerate(answers)]
+    path.write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+
+
+def _evaluator(config):
+    evaluator = Evaluator(config)
+    evaluator.calls = []
+
+    def judge(prompt):
+        evaluator.calls.append(prompt)
+        return {"faithfulness_score": 7, "comprehensiveness_score": 6, "relevance_score": 5, "reason": "ok"}
+
+    evaluator._judge = judge
+    return evaluator
+
+
+@pytest.fixture
+def config(config):
+    config.methods = ["m1"]
+    return config
+
+
+def test_cache_hit_skips_the_judge(config):
+    _write_outputs(config, ["a", "b"])
+    evaluator = _evaluator(config)
+    evaluator.evaluate_all()
+    assert len(evaluator.calls) == 2
+
+    # 未变化的记录不重评
+    evaluator = _evaluator(config)
+    evaluator.evaluate_all()
+    assert evaluator.calls == []
+
+    # 回答变化后重评；改回原回答时命中缓存
+    _write_outputs(config, ["a2", "b"])
+    evaluator = _evaluator(config)
+    evaluator.evaluate_all()
+    assert len(evaluator.calls) == 1
+    _write_outputs(config, ["a", "b"])
+    evaluator = _evaluator(config)
+    results = evaluator.evaluate_all()
+    assert evaluator.calls == []
+    assert {r["Question"]: r["Method"] for r in results} == {"q0": "LLM_Judge", "q1": "LLM_Judge"}
+
+
+def test_prompt_or_model_change_invalidates_the_cache(config):
+    _write_outputs(config, ["a", "b"])
+    _evaluator(config).evaluate_all()
+
+    config.judge.reason = "none" if config.judge.reason != "none" else "full"
+    evaluator = _evaluator(config)
+    evaluator.evaluate_all()
+    assert len(evaluator.calls) == 2
+
+    config.api.judge_model_name = "another-judge"
+    evaluator = _evaluator(config)
+    evaluator.evaluate_all()
+    assert len(evaluator.calls) == 2
+
+
+def test_keyless_history_is_backfilled_but_not_reused(config):
+    _write_outputs(config, ["a"])
+    progress = config.paths.output_dir / "evaluation_progress.jsonl"
+    progress.parent.mkdir(parents=True, exist_ok=True)
+    progress.write_text(json.dumps({"System": "m1", "Type": "A", "Question": "q0", "Method": "LLM_Judge",
+                                    "Score_Faithfulness": 9, "Score_Comprehensiveness": 9,
+                                    "Score_Relevance": 9}) + "\n", encoding="utf-8")
+    evaluator = _evaluator(config)
+    evaluator.evaluate_all()
+    assert evaluator.calls == []  # 回答未变化，沿用旧评分
+    latest, cache = read_progress(progress)
+    assert latest[("m1", "A", "q0")]["Legacy"] is True
+    assert cache == {}  # 旧版记录不作为评分缓存
@@ -0,0 +1,66 @@
+"""延迟统计：删失样本（超时 / 被取消的请求）参与分位数估计"""
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from methods.light_rag import LightRAGMethod
+from utils.latency import LatencyTracker
+
+
+def test_uncensored_quantiles_match_numpy():
+    rng = np.random.default_rng(0)
+    values = rng.exponential(size=500)
+    tracker = LatencyTracker()
+    for v in values:
+        tracker.record(float(v))
+    assert tracker.quantile(0.95) == pytest.approx(np.quantile(values, 0.95))
+
+
+def test_censored_slow_requests_keep_the_tail():
+    tracker = LatencyTracker()
+    for _ in range(90):
+        tracker.record(0.1)
+    for _ in range(10):
+        tracker.record(5.0, censored=True)  # 超时的请求：至少 5 秒
+    # 丢弃删失样本时 p95 为 0.1；计入后 p95 落在尾部（以观测到的最大耗时为下界）
+    assert tracker.quantile(0.95) == 5.0
+    assert tracker.quantile(0.5) == pytest.approx(0.1)
+    assert tracker.summary()["censored"] == 10
+
+
+def test_early_censoring_only_shrinks_the_risk_set():
+    tracker = LatencyTracker()
+    for v in (1.0, 2.0, 3.0, 4.0):
+        tracker.record(v)
+    tracker.record(0.5, censored=True)  # 对冲落败、很早被取消的请求不拉低分位数
+    assert tracker.quantile(0.5) == 2.0
+    assert tracker.quantile(1.0) == 4.0
+
+
+class _SlowClient:
+    async def aquery(self, payload, timeout):
+        await asyncio.sleep(timeout)
+        raise asyncio.TimeoutError()
+
+
+def test_timed_out_and_cancelled_requests_are_recorded():
+    method = LightRAGMethod.__new__(LightRAGMethod)
+    method.client = _SlowClient()
+    method.request_latency = {"answer": LatencyTracker()}
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await method._post({}, 0.01, "answer")
+        task = asyncio.ensure_future(method._post({}, 10, "answer"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    assert time.perf_counter() - start < 1
+    tracker = method.request_latency["answer"]
+    assert len(tracker) == 2 and tracker.summary()["censored"] == 2
@@ -0,0 +1,15 @@
+"""LightRAG 请求体：答案与上下文请求使用相同的检索参数"""
+from methods.lightrag_client import answer_payload, context_payload
+
+
+def test_answer_and_context_share_retrieval_params(config):
+    config.lightrag.mode, config.lightrag.top_k, config.lightrag.chunk_top_k = "local", 17, 9
+    answer = answer_payload(config, "q", max_chars=80)
+    context = context_payload(config, "q")
+    for payload in (answer, context):
+        assert (payload["mode"], payload["top_k"], payload["chunk_top_k"]) == ("local", 17, 9)
+    assert context["only_need_context"] is True and "only_need_context" not in answer
+    assert answer["response_type"] == config.budget.lightrag_response_type.format(max_chars=80)
+
+    config.budget.enabled = False
+    assert "response_type" not in answer_payload(config, "q")
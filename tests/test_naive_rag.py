@@ -0,0 +1,52 @@
+"""Naive RAG 快照通路：字数提示只写入问答模板，记录的上下文即生成所用分块"""
+from types import SimpleNamespace
+
+from methods.base import BaseMethod
+from methods.naive_rag import NaiveRAGMethod
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="答案"), finish_reason="stop")],
+                               usage=None)
+
+
+def _method(config, retrieved):
+    method = NaiveRAGMethod.__new__(NaiveRAGMethod)
+    BaseMethod.__init__(method, config)
+    method.snapshot = object()
+    method._prefetched = {}
+    method.queries = []
+
+    def retrieve(questions):
+        method.queries.extend(questions)
+        return [retrieved for _ in questions]
+
+    method._retrieve = retrieve
+    completions = FakeCompletions()
+    method.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return method, completions
+
+
+def test_length_hint_goes_into_prompt_not_query(config):
+    config.embedchain.number_documents = 2
+    method, completions = _method(config, ["c1", "c2"])
+    answer, contexts = method.generate("问题?", method.retrieve("问题?"), max_chars=80)
+
+    assert answer == "答案"
+    assert method.queries == ["问题?"]  # 检索用原始问题
+    assert contexts == ["c1", "c2"]  # 记录的上下文即生成所用分块
+    prompt = completions.calls[0]["messages"][0]["content"]
+    assert "c1 | c2" in prompt
+    assert "Query: 问题?\n" + config.budget.length_hint.format(max_chars=80) + "\nAnswer:" in prompt
+
+
+def test_prompt_without_budget_matches_embedchain_default(config):
+    config.budget.enabled = False
+    method, completions = _method(config, ["c1"])
+    method.generate("q", ["c1"], max_chars=80)
+    assert completions.calls[0]["messages"][0]["content"].endswith("Query: q\nAnswer:")
@@ -0,0 +1,72 @@
+"""检索 / 生成流水线：按输入顺序产出、在途题目数有上限、提前退出时回收线程"""
+import random
+import threading
+import time
+
+from methods.pipeline import run_pipeline
+
+
+def _alive_workers():
+    return [t for t in threading.enumerate() if t.name.startswith(("retrieve-", "generate-"))]
+
+
+def test_outputs_follow_input_order_with_errors():
+    rng = random.Random(0)
+
+    def retrieve(item):
+        time.sleep(rng.random() / 500)
+        if item == 5:
+            raise ValueError("retrieve failed")
+        return item * 10
+
+    def generate(item, retrieved):
+        time.sleep(rng.random() / 200)
+        if item == 7:
+            raise RuntimeError("generate failed")
+        return retrieved + 1
+
+    outcomes = list(run_pipeline(iter(range(40)), retrieve, generate, retrieval_workers=3,
+                                 generation_workers=4, queue_size=2))
+    assert [item for item, _, _ in outcomes] == list(range(40))
+    for item, result, error in outcomes:
+        if item in (5, 7):
+            assert result is None and error is not None
+        else:
+            assert result == item * 10 + 1 and error is None
+
+
+def test_in_flight_items_are_bounded_behind_a_slow_item():
+    lock = threading.Lock()
+    taken, yielded, peak = [0], [0], [0]
+
+    def retrieve(item):
+        with lock:
+            taken[0] += 1
+            peak[0] = max(peak[0], taken[0] - yielded[0])
+        return item
+
+    def generate(item, retrieved):
+        if item == 0:
+            time.sleep(0.3)  # 队首题目很慢，后续结果只能在重排缓冲中等待
+        return retrieved
+
+    outputs = []
+    for item, result, _ in run_pipeline(range(200), retrieve, generate, retrieval_workers=2,
+                                        generation_workers=4, queue_size=2, max_in_flight=5):
+        with lock:
+            yielded[0] += 1
+        outputs.append(result)
+    assert outputs == list(range(200))
+    assert peak[0] <= 5
+
+
+def test_early_exit_joins_all_threads():
+    def generate(item, retrieved):
+        time.sleep(0.001)
+        return item
+
+    pipeline = run_pipeline(iter(range(1000)), lambda item: item, generate, retrieval_workers=2,
+                            generation_workers=3, queue_size=1)
+    assert [next(pipeline)[0] for _ in range(3)] == [0, 1, 2]
+    pipeline.close()
+    assert _alive_workers() == []
@@ -0,0 +1,103 @@
+"""检索指标：向量化实现与逐条暴力计算的定义一致"""
+import math
+import random
+
+import numpy as np
+import pytest
+
+from config.config import RetrievalMetricConfig
+from evaluation import retrieval_metrics
+from evaluation.local_metrics import _NON_WORD
+from evaluation.retrieval_metrics import Handbook, compute_retrieval_metrics
+
+ALPHABET = "苹果梨桃树叶病虫害防治药剂喷洒腐烂"
+
+
+def _bigrams(text: str) -> set:
+    text = _NON_WORD.sub("", text or "")
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _coverage(part: set, whole: set) -> float:
+    return len(part & whole) / len(whole) if whole else 0.0
+
+
+def brute_force(entry: dict, passages: list, rm) -> dict:
+    """按模块文档中的定义逐条计算"""
+    reference = _bigrams(entry["standard_answer"])
+    terms = (reference - _bigrams(entry["question"])) or reference
+    passage_bigrams = [_bigrams(p) for p in passages]
+
+    coverage = [_coverage(b, terms) for b in passage_bigrams]
+    gold = [i for i, c in enumerate(coverage) if c >= rm.gold_threshold]
+    if not gold and coverage and max(coverage) >= rm.min_gold_coverage:
+        gold = [coverage.index(max(coverage))]
+
+    contexts = [c for c in entry["contexts"] if c][:max(rm.ks)]
+    context_bigrams = [_bigrams(c) for c in contexts]
+    hits = [{i for i in gold if _coverage(passage_bigrams[i] & b, passage_bigrams[i]) >= rm.hit_threshold}
+            for b in context_bigrams]
+    relevant = [bool(h) or _coverage(b, terms) >= rm.gold_threshold for h, b in zip(hits, context_bigrams)]
+
+    metrics = {}
+    for k in rm.ks:
+        found = set().union(*hits[:k])
+        metrics[f"Recall@{k}"] = len(found) / len(gold) if gold and contexts else math.nan
+    metrics["MRR"] = (1 / (relevant.index(True) + 1) if True in relevant else 0.0) if contexts else math.nan
+    for k in rm.ks:
+        metrics[f"Precision@{k}"] = sum(relevant[:k]) / min(k, len(contexts)) if contexts else math.nan
+    metrics["Gold_Passages"] = float(len(gold))
+    return metrics
+
+
+def _text(rng, low, high):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(low, high)))
+
+
+def _dataset(seed: int, n: int):
+    rng = random.Random(seed)
+    passages = [_text(rng, 15, 40) for _ in range(25)]
+    entries = []
+    for _ in range(n):
+        source = rng.choice(passages)
+        start = rng.randrange(len(source) - 8)
+        answer = source[start:start + rng.randint(6, 12)] + "，" + _text(rng, 0, 4)
+        contexts = []
+        for _ in range(rng.randint(0, 6)):
+            choice = rng.random()
+            if choice < 0.3:
+                contexts.append(source)
+            elif choice < 0.5:
+                contexts.append(rng.choice(passages))
+            elif choice < 0.6:
+                contexts.append("")
+            else:
+                contexts.append(_text(rng, 5, 30))
+        entries.append({"question": _text(rng, 4, 10) + "？", "standard_answer": answer, "contexts": contexts})
+    return passages, entries
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_brute_force(seed, monkeypatch):
+    # 小批量使多批拼接的路径也被覆盖
+    monkeypatch.setattr(retrieval_metrics, "_BLOCK", 16)
+    rm = RetrievalMetricConfig(ks=(1, 2, 4))
+    passages, entries = _dataset(seed, 60)
+    metrics = compute_retrieval_metrics(entries, Handbook(passages), rm)
+    for i, entry in enumerate(entries):
+        expected = brute_force(entry, passages, rm)
+        for col, value in expected.items():
+            np.testing.assert_allclose(metrics[col][i], value, err_msg=f"{col} of record {i}")
+
+
+def test_hand_checked_example():
+    passages = ["苹果腐烂病刮除病斑后涂药", "梨树黑星病喷洒杀菌剂", "桃树流胶病"]
+    entry = {"question": "苹果腐烂病怎么治？", "standard_answer": "刮除病斑后涂药",
+             "contexts": ["梨树黑星病喷洒杀菌剂", "苹果腐烂病刮除病斑后涂药"]}
+    metrics = compute_retrieval_metrics([entry], Handbook(passages), RetrievalMetricConfig(ks=(1, 2)))
+    assert metrics["Gold_Passages"][0] == 1
+    assert metrics["Recall@1"][0] == 0 and metrics["Recall@2"][0] == 1
+    assert metrics["MRR"][0] == 0.5
+    assert metrics["Precision@2"][0] == 0.5
+    assert math.isnan(compute_retrieval_metrics([dict(entry, contexts=[])], Handbook(passages),
+                                                RetrievalMetricConfig())["MRR"][0])
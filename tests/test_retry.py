@@ -0,0 +1,24 @@
+"""Retrier 注册表：按端点 + 配置共享，统计可按运行清零"""
+import pytest
+
+from utils.retry import get_retrier
+
+
+def test_registry_keyed_on_config():
+    a = get_retrier("test-endpoint", max_attempts=2, base_delay=0.0)
+    b = get_retrier("test-endpoint", max_attempts=5, base_delay=0.0)
+    assert a is not b
+    assert (a.max_attempts, b.max_attempts) == (2, 5)
+    assert get_retrier("test-endpoint", base_delay=0.0, max_attempts=2) is a
+
+
+def test_reset_stats():
+    retrier = get_retrier("test-reset", max_attempts=2, base_delay=0.0, jitter=False)
+    with pytest.raises(TimeoutError):
+        retrier.call(lambda: (_ for _ in ()).throw(TimeoutError()))
+    stats = retrier.stats()
+    assert stats["calls"] == 1 and stats["retries"] == 1 and stats["failed"] == 1
+    retrier.reset_stats()
+    stats = retrier.stats()
+    assert (stats["calls"], stats["retries"], stats["failed"]) == (0, 0, 0)
+    assert "errors" not in stats
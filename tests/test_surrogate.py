@@ -0,0 +1,110 @@
+"""评分代理模型：训练 / 保存 / 加载 / 预测往返，以及用旧版进度文件训练后直接用于评测"""
+import json
+
+import numpy as np
+import pytest
+
+from evaluation.evaluator import Evaluator, read_progress
+from evaluation.surrogate import (FEATURE_NAMES, SURROGATE_METHOD, JudgeSurrogate, load_surrogate,
+                                  train_surrogate)
+
+
+def test_fit_save_load_predict_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(80, len(FEATURE_NAMES)))
+    y = np.clip(5 + 2 * x[:, :3] + rng.normal(scale=0.3, size=(80, 3)), 1, 10)
+    model, report = JudgeSurrogate.fit(x, y, folds=4, meta={"judge_model": "j"})
+    assert report["records"] == 80 and set(report["mae"]) == set(report["coverage"])
+
+    path = tmp_path / "surrogate.json"
+    model.save(path)
+    loaded = JudgeSurrogate.load(path)
+    assert loaded.meta == {"judge_model": "j"}
+    for a, b in zip(model.predict(x[:5]), loaded.predict(x[:5])):
+        np.testing.assert_allclose(a, b)
+
+
+def test_load_rejects_feature_mismatch(tmp_path):
+    path = tmp_path / "surrogate.json"
+    path.write_text(json.dumps({"version": 1, "features": ["other"]}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        JudgeSurrogate.load(path)
+
+
+N = 40
+
+
+def _write_legacy_history(config):
+    """旧版流程的产物：结果文件 + 多行缩进格式、无缓存键的进度文件"""
+    items = []
+    for i in range(N):
+        good = i % 2 == 0
+        reference = f"第{i}题：冬季清园，刮除病斑并涂抹石硫合剂，春季喷施杀菌剂"
+        answer = reference if good else f"第{i}题：不清楚"
+        items.append({"question": f"问题{i}", "answer": answer, "standard_answer": reference,
+                      "contexts": [reference]})
+    output_path = config.get_output_path("m1", "A")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+
+    progress = config.paths.output_dir / "evaluation_progress.jsonl"
+    progress.write_text("".join(
+        json.dumps({"System": "m1", "Type": "A", "Question": f"问题{i}", "Method": "LLM_Judge",
+                    "Score_Faithfulness": 9 if i % 2 == 0 else 2, "Score_Comprehensiveness": 9 if i % 2 == 0 else 2,
+                    "Score_Relevance": 9 if i % 2 == 0 else 3, "Reason": "旧版评分"},
+                   ensure_ascii=False, indent=2) + "\n" for i in range(N)), encoding="utf-8")
+    return items, progress
+
+
+@pytest.fixture
+def config(config):
+    config.methods = ["m1"]
+    config.surrogate.min_train = 20
+    config.surrogate.folds = 4
+    return config
+
+
+def test_train_on_migrated_legacy_progress_then_score(config):
+    items, progress = _write_legacy_history(config)
+
+    # 加载进度：多行格式迁移为 JSONL，旧版记录按当前输出补写缓存键并标记 Legacy
+    Evaluator(config).load_progress()
+    latest, cache = read_progress(progress)
+    assert len(latest) == N and all(r["Legacy"] for r in latest.values()) and cache == {}
+
+    # 默认不用旧版记录训练
+    model, report = train_surrogate(config)
+    assert model is None and report["records"] == 0
+
+    config.surrogate.include_legacy = True
+    model, report = train_surrogate(config)
+    assert report["records"] == N and model.meta["legacy_records"] == N
+
+    # 评测时无需再次开启 include_legacy，模型直接可用
+    config.surrogate.include_legacy = False
+    config.surrogate.max_width = 100.0
+    assert load_surrogate(config) is not None
+
+    # 回答变化后的记录由代理模型评分，不调用 LLM Judge
+    items[0] = dict(items[0], answer=items[0]["answer"] + "。")
+    items[1] = dict(items[1], answer="不清楚")
+    config.get_output_path("m1", "A").write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+    config.surrogate.enabled = True
+    evaluator = Evaluator(config)
+
+    def judge(prompt):
+        raise AssertionError("不应调用 LLM Judge")
+
+    evaluator._judge = judge
+    results = {r["Question"]: r for r in evaluator.evaluate_all()}
+    for question in ("问题0", "问题1"):
+        assert results[question]["Method"] == SURROGATE_METHOD
+    assert results["问题0"]["Score_Faithfulness"] > results["问题1"]["Score_Faithfulness"]
+
+
+def test_prompt_change_disables_the_model(config):
+    _write_legacy_history(config)
+    config.surrogate.include_legacy = True
+    assert train_surrogate(config)[0] is not None
+    config.judge.reason = "none" if config.judge.reason != "none" else "full"
+    assert load_surrogate(config) is None
@@ -0,0 +1,162 @@
+"""任务队列：租约到期与重新领取、接手后的迟到提交、后续任务入队与续租"""
+import json
+import time
+
+import pytest
+
+from workers.task_queue import DONE, FAILED, LEASED, PENDING, TaskQueue
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(**kwargs):
+        queue = TaskQueue(tmp_path / "tasks.sqlite3", **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def _row(queue, key):
+    status, owner, payload = queue._conn.execute(
+        "SELECT status, owner, payload FROM tasks WHERE key = ?", (key,)).fetchone()
+    return status, owner, json.loads(payload)
+
+
+def test_enqueue_is_idempotent(make_queue):
+    queue = make_queue()
+    assert queue.enqueue("answer", {"a": {"q": 1}, "b": {"q": 2}}) == 2
+    assert queue.enqueue("answer", {"a": {"q": 1}}) == 0
+    assert queue.counts() == {"answer": {PENDING: 2}}
+
+
+def test_lease_is_exclusive(make_queue):
+    queue = make_queue()
+    queue.enqueue("answer", {"a": {}})
+    assert len(queue.lease("w1")) == 1
+    assert queue.lease("w2") == []
+
+
+def test_expired_lease_is_taken_over_and_late_complete_is_dropped(make_queue):
+    queue = make_queue(lease_seconds=0.05)
+    queue.enqueue("answer", {"a": {"q": 1}})
+    [stale] = queue.lease("w1")
+    time.sleep(0.1)
+
+    [task] = queue.lease("w2")
+    assert task.id == stale.id and task.attempts == 2
+    assert queue.complete(stale, "w1", {"answer": "late"}) is False
+    assert _row(queue, "a")[:2] == (LEASED, "w2")
+
+    assert queue.complete(task, "w2", {"answer": "ok"}) is True
+    with queue.merging("answer") as rows:
+        assert rows == [("a", {"q": 1}, {"answer": "ok"})]
+
+
+def test_follow_up_does_not_steal_a_leased_task(make_queue):
+    queue = make_queue()
+    queue.enqueue("answer", {"a": {"q": 1}})
+    queue.enqueue("judge", {"j": {"answer": "old"}})
+    [judge] = queue.lease("w2", kinds=["judge"])
+    [answer] = queue.lease("w1", kinds=["answer"])
+
+    assert queue.complete(answer, "w1", {"answer": "new"},
+                          follow_up={"judge": {"j": {"answer": "new"}, "k": {"answer": "x"}}})
+    # 正在执行的后续任务只更新负载，租约仍归原 worker；新的任务键直接入队
+    assert _row(queue, "j") == (LEASED, "w2", {"answer": "new"})
+    assert _row(queue, "k") == (PENDING, None, {"answer": "x"})
+
+    # 原 worker 按旧负载提交被拒绝，任务回到待执行状态按新负载重做
+    assert queue.complete(judge, "w2", {"score": 1}) is False
+    assert _row(queue, "j") == (PENDING, None, {"answer": "new"})
+    redo = {task.key: task for task in queue.lease("w3", kinds=["judge"], limit=2)}
+    assert redo["j"].payload == {"answer": "new"}
+
+
+def test_keep_alive_renews_the_lease(make_queue):
+    queue = make_queue(lease_seconds=0.2)
+    other = make_queue(lease_seconds=0.2)
+    queue.enqueue("answer", {"a": {}})
+    [task] = queue.lease("w1")
+    with queue.keep_alive(task, "w1", interval=0.05):
+        time.sleep(0.5)
+        assert other.lease("w2") == []
+    assert queue.complete(task, "w1", {"answer": "ok"}) is True
+
+
+def test_fail_retries_until_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.enqueue("answer", {"a": {}})
+    [task] = queue.lease("w1")
+    assert queue.fail(task, "w1", "boom") is False
+    [task] = queue.lease("w1")
+    assert queue.fail(task, "w1", "boom") is True
+    assert _row(queue, "a")[0] == FAILED
+
+    # 失败的任务可以重新入队
+    assert queue.enqueue("answer", {"a": {}}) == 1
+    assert _row(queue, "a")[0] == PENDING
+
+
+def test_merged_task_is_requeued(make_queue):
+    queue = make_queue()
+    queue.enqueue("answer", {"a": {}})
+    [task] = queue.lease("w1")
+    queue.complete(task, "w1", {"answer": "ok"})
+    assert queue.enqueue("answer", {"a": {}}) == 0  # 待合并的结果保持不变
+    with queue.merging("answer") as rows:
+        assert len(rows) == 1
+    assert _row(queue, "a")[0] == DONE
+    assert queue.enqueue("answer", {"a": {}}) == 1
+    assert not queue.has_work(["judge"]) and queue.has_work(["answer"])
+
+
+def test_merging_does_not_hold_the_write_lock(make_queue):
+    queue = make_queue()
+    other = make_queue()
+    queue.enqueue("answer", {"a": {"q": 1}, "b": {"q": 2}})
+    [task] = queue.lease("w1")
+    queue.complete(task, "w1", {"answer": "old"})
+
+    with queue.merging("answer") as rows:
+        assert [key for key, _, _ in rows] == ["a"]
+        # 合并期间其他 worker 照常领取、提交与入队
+        [b] = other.lease("w2")
+        assert other.complete(b, "w2", {"answer": "b"}) is True
+        # 合并期间结果被替换的任务不会被标记为已合并
+        other._conn.execute("UPDATE tasks SET result = ? WHERE key = 'a'", (json.dumps({"answer": "new"}),))
+    with queue.merging("answer") as rows:
+        assert rows == [("a", {"q": 1}, {"answer": "new"}), ("b", {"q": 2}, {"answer": "b"})]
+    with queue.merging("answer") as rows:
+        assert rows == []
+
+
+def test_concurrent_merges_run_one_at_a_time(make_queue):
+    import threading
+
+    queue = make_queue()
+    queue.enqueue("answer", {"a": {}})
+    [task] = queue.lease("w1")
+    queue.complete(task, "w1", {"answer": "ok"})
+
+    seen = []
+
+    def merge():
+        other = TaskQueue(queue.path)
+        with other.merging("answer") as rows:
+            seen.append(len(rows))
+        other.close()
+
+    with queue.merging("answer") as rows:
+        thread = threading.Thread(target=merge)
+        thread.start()
+        time.sleep(0.5)
+        # 另一个合并在等待合并锁，尚未读取
+        assert seen == [] and thread.is_alive()
+        seen.append(len(rows))
+    thread.join(timeout=5)
+    assert seen == [1, 0]
@@ -0,0 +1,85 @@
+"""测试集流式读取：.json 数组增量解析、.jsonl 逐行读取与字段映射"""
+import json
+
+import pytest
+
+import utils.testset as testset
+from utils.testset import FieldMapping, iter_chunks, iter_testset, open_testset
+
+RECORDS = [{"问题": f"问题{i}，含逗号, 与括号]", "标准答案": f"答案{i}"} for i in range(20)]
+EXPECTED = [(r["问题"], r["标准答案"]) for r in RECORDS]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # 块远小于单条记录，元素必然跨块
+    monkeypatch.setattr(testset, "_CHUNK_SIZE", 7)
+
+
+def test_json_array_elements_span_chunks(tmp_path, small_chunks):
+    path = tmp_path / "A.json"
+    path.write_text(json.dumps(RECORDS, ensure_ascii=False, indent=2), encoding="utf-8")
+    assert list(iter_testset(path)) == EXPECTED
+
+
+def test_json_array_is_read_incrementally(tmp_path, small_chunks):
+    # 截断的文件：前面完整的元素在读到末尾之前就已产出
+    path = tmp_path / "A.json"
+    text = json.dumps(RECORDS, ensure_ascii=False)
+    path.write_text(text[:len(text) // 2], encoding="utf-8")
+    items = iter_testset(path)
+    assert next(items) == EXPECTED[0]
+    with pytest.raises((ValueError, json.JSONDecodeError)):
+        list(items)
+
+
+def test_json_top_level_must_be_array(tmp_path):
+    path = tmp_path / "A.json"
+    path.write_text(json.dumps({"问题": "q"}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_testset(path))
+
+
+def test_jsonl_skips_blank_and_invalid_lines(tmp_path, capsys):
+    path = tmp_path / "A.jsonl"
+    lines = [json.dumps(r, ensure_ascii=False) for r in RECORDS[:3]]
+    path.write_text("\n".join([lines[0], "", "{broken", lines[1], lines[2]]) + "\n", encoding="utf-8")
+    assert list(iter_testset(path)) == EXPECTED[:3]
+    assert "第 3 行" in capsys.readouterr().out
+
+
+def test_field_mapping_nested_and_missing():
+    mapping = FieldMapping(question="q.text", standard_answer="meta.answer")
+    assert mapping({"q": {"text": "问"}, "meta": {"answer": 42}}) == ("问", "42")
+    assert mapping({"q": "不是对象"}) == ("", "")
+
+
+def test_remapped_fields_and_empty_questions_skipped(tmp_path):
+    path = tmp_path / "A.jsonl"
+    rows = [{"query": {"text": "q1"}, "gold": "a1"}, {"query": {"text": ""}, "gold": "a2"}, [1, 2],
+            {"query": {"text": "q3"}}]
+    path.write_text("\n".join(json.dumps(r) for r in rows), encoding="utf-8")
+    mapping = FieldMapping(question="query.text", standard_answer="gold")
+    assert list(iter_testset(path, mapping)) == [("q1", "a1"), ("q3", "")]
+    assert list(iter_testset(path, lambda r: (r.get("gold", ""), "x"))) == [("a1", "x"), ("a2", "x")]
+
+
+def test_open_testset_uses_config(config):
+    config.paths.testset_dir.mkdir(parents=True, exist_ok=True)
+    with pytest.raises(FileNotFoundError):
+        open_testset(config, "A")
+
+    (config.paths.testset_dir / "A.json").write_text(json.dumps([{"Q": "json", "A": "1"}]), encoding="utf-8")
+    config.testset.question_field, config.testset.answer_field = "Q", "A"
+    assert list(open_testset(config, "A")) == [("json", "1")]
+
+    # 同名 .jsonl 优先；自定义映射优先于字段名
+    (config.paths.testset_dir / "A.jsonl").write_text(json.dumps({"Q": "jsonl", "A": "2"}), encoding="utf-8")
+    assert list(open_testset(config, "A")) == [("jsonl", "2")]
+    config.testset.mapping = lambda r: (r["A"], r["Q"])
+    assert list(open_testset(config, "A")) == [("2", "jsonl")]
+
+
+def test_iter_chunks():
+    assert list(iter_chunks(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_chunks(iter([]), 3)) == []
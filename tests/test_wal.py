@@ -0,0 +1,55 @@
+"""组提交日志：组提交、关闭刷盘与未写完末行的恢复"""
+import json
+
+from utils.wal import GroupCommitLog, log_fingerprint, read_log
+
+
+def _log(path, **kwargs):
+    # 关闭定时刷盘的影响，只由条数阈值与 close() 触发提交
+    return GroupCommitLog(path, flush_interval_ms=60_000, fsync=False, **kwargs)
+
+
+def test_group_commit_and_close(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    log = _log(path, flush_every=2)
+    log.append({"i": 0})
+    assert not path.exists() or path.read_text(encoding="utf-8") == ""
+    log.append({"i": 1})
+    log.append({"i": 2})
+    assert [r["i"] for r in read_log(path)] == [0, 1]
+    log.close()
+    assert [r["i"] for r in read_log(path)] == [0, 1, 2]
+
+
+def test_torn_last_line_is_skipped_and_not_joined(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    path.write_text(json.dumps({"i": 0}) + "\n" + '{"i": 1, "answ', encoding="utf-8")
+    assert [r["i"] for r in read_log(path)] == [0]
+
+    with _log(path) as log:
+        log.append({"i": 2})
+        log.append({"i": 3})
+    assert [r["i"] for r in read_log(path)] == [0, 2, 3]
+    assert path.read_text(encoding="utf-8").endswith("\n")
+
+
+def test_reopen_without_torn_tail_adds_no_blank_line(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    with _log(path) as log:
+        log.append({"i": 0})
+    with _log(path) as log:
+        log.append({"i": 1})
+    assert path.read_text(encoding="utf-8").splitlines() == ['{"i": 0}', '{"i": 1}']
+
+
+def test_fingerprint_detects_rewrite(tmp_path):
+    path = tmp_path / "progress.jsonl"
+    path.write_text('{"i": 0}\n{"i": 1}\n', encoding="utf-8")
+    offset = path.stat().st_size
+    before = log_fingerprint(path, offset)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"i": 2}\n')
+    assert log_fingerprint(path, offset) == before
+    path.write_text('{"i": 9}\n{"i": 1}\n{"i": 2}\n', encoding="utf-8")
+    assert log_fingerprint(path, offset) != before
+    assert log_fingerprint(path, 0) == ""
@@ -0,0 +1,18 @@
+import importlib
+
+from .wal import GroupCommitLog, get_log, log_fingerprint, migrate_pretty_log, read_log
+from .retry import CircuitOpenError, ResponseParseError, Retrier, classify_error, get_retrier
+from .testset import FieldMapping, iter_chunks, iter_testset, open_testset
+from .context_store import ContextStore, compact_results, get_context_store, load_results, save_results
+
+# 延迟导出：延迟统计依赖 numpy，只有 LightRAG 等需要时才导入
+_LAZY_EXPORTS = {
+    "LatencyTracker": ".latency",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        module = importlib.import_module(_LAZY_EXPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
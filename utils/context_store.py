@@ -0,0 +1,256 @@
+"""
+内容寻址的上下文存储
+
+结果文件中的检索上下文不再保存全文，而是保存引用（context_refs），每个上下文为空格分隔的片段引用：
+    - @<文档ID>:<字节偏移>:<字节长度>  知识库文档中的一段原文（文档按内容哈希固定版本，内存映射读取）
+    - #<片段ID>                        其余文本（按行切分、按内容哈希去重，存放在 SQLite 中）
+Naive RAG 的分块通常整段出自手册，只需一个文档引用；LightRAG 上下文中反复出现的实体 / 关系行只存一份。
+全文只在需要时（评分、计算指标）由 load_results 还原，只读问题的场景可跳过还原。
+默认不启用（config.context_store.enabled），启用后结果文件离开存储目录（不随仓库提交）无法还原上下文，
+拷贝结果文件时需一并拷贝存储目录；存储缺失或不完整时 load_results 报错并给出存储目录。
+"""
+import hashlib
+import json
+import mmap
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+_registry: Dict[Path, "ContextStore"] = {}
+_registry_lock = threading.Lock()
+
+
+def _digest(data: bytes, length: int) -> str:
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def _missing(store_dir: Path, what: str) -> FileNotFoundError:
+    return FileNotFoundError(f"上下文存储 {store_dir} 中缺少{what}，无法还原结果文件中的 context_refs；"
+                             f"请将生成结果时的上下文存储目录一并拷贝至 paths.context_store_dir")
+
+
+class ContextStore:
+    """上下文片段存储：文档原文引用 + 去重的文本片段"""
+
+    def __init__(self, store_dir: Path, documents: Iterable[Path] = (), min_span: int = 32):
+        self.dir = Path(store_dir)
+        self.min_span = min_span
+        (self.dir / "docs").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.dir / "blobs.sqlite3"), timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS blobs (id TEXT PRIMARY KEY, text TEXT NOT NULL)")
+
+        self._docs: Dict[str, mmap.mmap] = {}  # 文档ID -> 内存映射
+        self._searchable: List[str] = []  # 当前知识库文档（可被引用）
+        self._pieces: Dict[str, str] = {}  # 片段文本 -> 引用
+        self._pending: Dict[str, str] = {}  # 待写入的新片段
+        for path in documents:
+            self._add_document(Path(path))
+
+    def _add_document(self, path: Path):
+        """将文档按内容哈希复制进存储（文档之后被修改，旧引用仍指向原版本）"""
+        data = path.read_bytes()
+        if not data:
+            return
+        doc_id = _digest(data, 12)
+        target = self.dir / "docs" / f"{doc_id}.txt"
+        if not target.exists():
+            tmp_path = target.with_suffix(".tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(target)
+        self._searchable.append(doc_id)
+
+    def _doc(self, doc_id: str) -> mmap.mmap:
+        if doc_id not in self._docs:
+            try:
+                with open(self.dir / "docs" / f"{doc_id}.txt", "rb") as f:
+                    self._docs[doc_id] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                raise _missing(self.dir, f"文档 {doc_id}") from None
+        return self._docs[doc_id]
+
+    def _span(self, text: str) -> Optional[str]:
+        """在知识库文档中查找原文，返回文档引用"""
+        data = text.encode("utf-8")
+        for doc_id in self._searchable:
+            pos = self._doc(doc_id).find(data)
+            if pos >= 0:
+                return f"@{doc_id}:{pos}:{len(data)}"
+        return None
+
+    def _blob(self, text: str) -> str:
+        blob_id = _digest(text.encode("utf-8"), 16)
+        self._pending[blob_id] = text
+        return f"#{blob_id}"
+
+    def _piece(self, text: str) -> str:
+        ref = self._pieces.get(text)
+        if ref is None:
+            ref = (self._span(text) if len(text) >= self.min_span else None) or self._blob(text)
+            self._pieces[text] = ref
+        return ref
+
+    def intern(self, text: str) -> str:
+        """将一个上下文转换为引用（新片段在 flush 时写入）"""
+        with self._lock:
+            if len(text) >= self.min_span:
+                whole = self._span(text)
+                if whole:
+                    return whole
+            parts = text.split("\n")
+            segments = [p + "\n" for p in parts[:-1]] + ([parts[-1]] if parts[-1] else [])
+            refs = []
+            for segment in segments:
+                ref = self._piece(segment)
+                # 同一文档中首尾相接的原文片段合并为一个引用
+                if refs and ref[0] == "@" and refs[-1][0] == "@":
+                    doc, pos, length = refs[-1][1:].split(":")
+                    doc2, pos2, length2 = ref[1:].split(":")
+                    if doc == doc2 and int(pos) + int(length) == int(pos2):
+                        refs[-1] = f"@{doc}:{pos}:{int(length) + int(length2)}"
+                        continue
+                refs.append(ref)
+            return " ".join(refs)
+
+    def flush(self):
+        """写入新片段"""
+        with self._lock:
+            if not self._pending:
+                return
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO blobs (id, text) VALUES (?, ?)",
+                                       list(self._pending.items()))
+            self._pending.clear()
+
+    def resolve_many(self, refs: List[str]) -> List[str]:
+        """还原一批上下文全文（片段一次性批量读取）"""
+        with self._lock:
+            blob_ids = {piece[1:] for ref in refs for piece in ref.split() if piece[0] == "#"}
+            blobs = {k: v for k, v in self._pending.items() if k in blob_ids}
+            missing = list(blob_ids - blobs.keys())
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                rows = self._conn.execute(f"SELECT id, text FROM blobs WHERE id IN ({','.join('?' * len(batch))})",
+                                          batch).fetchall()
+                blobs.update(rows)
+
+            texts = []
+            for ref in refs:
+                parts = []
+                for piece in ref.split():
+                    if piece[0] == "#":
+                        if piece[1:] not in blobs:
+                            raise _missing(self.dir, f"片段 {piece}")
+                        parts.append(blobs[piece[1:]])
+                    else:
+                        doc_id, pos, length = piece[1:].split(":")
+                        start = int(pos)
+                        parts.append(self._doc(doc_id)[start:start + int(length)].decode("utf-8"))
+                texts.append("".join(parts))
+            return texts
+
+    def intern_record(self, record: dict) -> dict:
+        """将一条记录中的 contexts 替换为 context_refs（已是引用的记录保持不变，新片段在 flush 时写入）"""
+        if "contexts" not in record:
+            return record
+        contexts = record["contexts"] or []
+        record = {k: v for k, v in record.items() if k != "contexts"}
+        record["context_refs"] = [self.intern(c) for c in contexts]
+        return record
+
+    def intern_records(self, records: List[dict]) -> List[dict]:
+        """将记录中的 contexts 替换为 context_refs"""
+        interned = [self.intern_record(record) for record in records]
+        self.flush()
+        return interned
+
+    def resolve_records(self, records: List[dict]) -> List[dict]:
+        """将记录中的 context_refs 还原为 contexts"""
+        refs = [ref for record in records for ref in record.get("context_refs", [])]
+        texts = iter(self.resolve_many(refs))
+        resolved = []
+        for record in records:
+            if "context_refs" in record:
+                count = len(record["context_refs"])
+                record = {k: v for k, v in record.items() if k != "context_refs"}
+                record["contexts"] = [next(texts) for _ in range(count)]
+            resolved.append(record)
+        return resolved
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+            for m in self._docs.values():
+                m.close()
+            self._docs.clear()
+
+
+def get_context_store(config) -> ContextStore:
+    """按存储目录复用 ContextStore（多线程共享）"""
+    store_dir = Path(config.paths.context_store_dir).resolve()
+    with _registry_lock:
+        if store_dir not in _registry:
+            _registry[store_dir] = ContextStore(store_dir, config.get_document_paths(),
+                                                config.context_store.min_span)
+        return _registry[store_dir]
+
+
+def save_results(config, path: Path, records: Iterable[dict], intern: Optional[bool] = None) -> int:
+    """逐条写出结果文件（启用上下文存储时 contexts 写为引用），先写临时文件再替换，返回记录数
+
+    records 可以是生成器，写出过程中不在内存中保留全部记录；文件格式与 json.dump(records, indent=2) 相同。
+    intern 为空时按 config.context_store.enabled 决定是否写为引用。
+    """
+    if intern is None:
+        intern = config.context_store.enabled
+    store = get_context_store(config) if intern else None
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for record in records:
+            if store is not None:
+                record = store.intern_record(record)
+            text = json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            f.write(("," if count else "") + "\n  " + text)
+            count += 1
+        f.write("\n]" if count else "]")
+    if store is not None:
+        store.flush()
+    tmp_path.replace(path)
+    return count
+
+
+def load_results(config, path: Path, resolve: bool = True) -> List[dict]:
+    """读取结果文件；resolve 时将 context_refs 还原为 contexts（旧的全文格式原样返回）"""
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    if resolve and any("context_refs" in r for r in records):
+        store_dir = Path(config.paths.context_store_dir)
+        if not (store_dir / "blobs.sqlite3").exists():
+            raise FileNotFoundError(f"结果文件 {path} 引用了上下文存储，但存储目录 {store_dir} 不存在；"
+                                    f"请将生成结果时的上下文存储目录一并拷贝至 paths.context_store_dir")
+        records = get_context_store(config).resolve_records(records)
+    return records
+
+
+def compact_results(config) -> Dict[str, int]:
+    """将已有结果文件中的全文上下文转换为引用（不受 context_store.enabled 限制），返回 {文件: 节省的字节数}"""
+    saved = {}
+    for method in config.methods:
+        for test_type in config.test_types:
+            path = config.get_output_path(method, test_type)
+            if not path.exists():
+                continue
+            records = load_results(config, path, resolve=False)
+            if not any("contexts" in r for r in records):
+                continue
+            before = path.stat().st_size
+            save_results(config, path, records, intern=True)
+            saved[path.name] = before - path.stat().st_size
+    return saved
@@ -0,0 +1,72 @@
+"""
+延迟统计模块
+
+线程安全地记录请求耗时，提供分位数与汇总，用于对冲请求的触发阈值与运行报告。
+超时、出错或对冲落败被取消的请求没有完整耗时，只知道"至少耗时这么久"，作为右删失样本记录；
+存在删失样本时分位数由 Kaplan-Meier 估计给出，慢请求不会因未完成而从样本中消失，
+避免 p95 逐渐偏低、对冲越来越频繁。
+"""
+import threading
+from typing import List, Sequence
+
+
+class LatencyTracker:
+    """记录请求耗时（秒）并计算分位数"""
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._samples: List[float] = []
+        self._censored: List[bool] = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, censored: bool = False):
+        """记录一个样本；censored 表示请求未完成，真实耗时不小于 seconds"""
+        with self._lock:
+            self._samples.append(seconds)
+            self._censored.append(censored)
+            # 只保留最近的样本，使分位数跟随服务端当前状态
+            if len(self._samples) > self.max_samples:
+                del self._samples[:len(self._samples) - self.max_samples]
+                del self._censored[:len(self._censored) - self.max_samples]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def _quantiles(self, qs: Sequence[float]) -> List[float]:
+        """q 分位数列表（调用方需持有锁且有样本）"""
+        import numpy as np
+
+        values = np.array(self._samples)
+        censored = np.array(self._censored)
+        if not censored.any():
+            return [float(v) for v in np.quantile(values, qs)]
+        # Kaplan-Meier：同一时刻先计完成样本再计删失样本，删失样本只减少风险集
+        order = np.lexsort((censored, values))
+        values, censored = values[order], censored[order]
+        at_risk = len(values) - np.arange(len(values))
+        cdf = 1 - np.cumprod(np.where(censored, 1.0, 1 - 1 / at_risk))
+        result = []
+        for q in qs:
+            reached = np.flatnonzero(~censored & (cdf >= q - 1e-12))
+            # 分位数落在最大删失时间之后时，以观测到的最大耗时作为下界
+            result.append(float(values[reached[0]] if len(reached) else values[-1]))
+        return result
+
+    def quantile(self, q: float) -> float:
+        """返回 q 分位数（0-1），无样本时返回 0"""
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            return self._quantiles([q])[0]
+
+    def summary(self) -> dict:
+        """返回样本数、删失样本数与 p50/p95/p99/max（毫秒）"""
+        with self._lock:
+            if not self._samples:
+                return {"n": 0}
+            p50, p95, p99 = (v * 1000 for v in self._quantiles([0.5, 0.95, 0.99]))
+            summary = {"n": len(self._samples), "p50_ms": round(p50, 1), "p95_ms": round(p95, 1),
+                       "p99_ms": round(p99, 1), "max_ms": round(max(self._samples) * 1000, 1)}
+            if any(self._censored):
+                summary["censored"] = sum(self._censored)
+            return summary
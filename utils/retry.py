@@ -0,0 +1,275 @@
+"""
+统一重试模块
+
+所有外部调用（回答生成、Embedding、LightRAG、LLM Judge）共用同一套重试策略：
+    - 错误分类：rate_limit(429) / server(5xx) / timeout / connection / parse 可重试，
+      client(其余 4xx) 与未知异常直接抛出
+    - 指数退避 + 全抖动，服务端返回 Retry-After 时至少等待该时长
+    - 熔断器：连续失败达到阈值后快速失败，冷却期过后放行一次试探调用
+每个调用端点 + 重试配置一个 Retrier（get_retrier 共享），重试与失败次数计入运行报告，
+每次运行开始时 reset_stats 清零，报告只反映本次运行。
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+RETRYABLE = {"rate_limit", "server", "timeout", "connection", "parse"}
+# 计入熔断的错误类别（解析失败说明服务可达，只重试不熔断）
+BREAKER_ERRORS = RETRYABLE - {"parse"}
+
+_registry: Dict[Tuple[str, tuple], "Retrier"] = {}
+_registry_lock = threading.Lock()
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断期间拒绝调用"""
+
+
+class ResponseParseError(ValueError):
+    """响应内容无法解析或缺少必要字段（可重试）"""
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    """从 openai / requests / httpx / aiohttp 的异常中取 HTTP 状态码"""
+    for obj in (exc, getattr(exc, "response", None)):
+        for attr in ("status_code", "status"):
+            status = getattr(obj, attr, None)
+            if isinstance(status, int):
+                return status
+    return None
+
+
+def _headers_of(exc: BaseException):
+    headers = getattr(exc, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+    return headers
+
+
+def classify_error(exc: BaseException) -> str:
+    """将异常归类为 rate_limit / server / client / timeout / connection / parse / circuit_open / other"""
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    status = _status_of(exc)
+    if status is not None:
+        if status == 429:
+            return "rate_limit"
+        if status >= 500 or status == 408:
+            return "server"
+        if status >= 400:
+            return "client"
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    name = type(exc).__name__
+    if "Timeout" in name:
+        return "timeout"
+    if isinstance(exc, ConnectionError) or "Connection" in name or "Disconnected" in name:
+        return "connection"
+    if isinstance(exc, (json.JSONDecodeError, ResponseParseError)):
+        return "parse"
+    return "other"
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），没有时返回 None"""
+    headers = _headers_of(exc)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    except Exception:
+        return None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """连续失败计数熔断器"""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        """是否放行本次调用；冷却期过后只放行一个试探调用"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release(self):
+        """调用结果不说明服务状态（如被取消、未知异常）时，释放试探名额"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                # 试探失败或达到阈值：（重新）进入熔断
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class Retrier:
+    """带退避、Retry-After 与熔断的调用包装"""
+
+    def __init__(self, name: str, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 jitter: bool = True, breaker_threshold: int = 5, breaker_cooldown: float = 30.0):
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+        self._counts = {"calls": 0, "retries": 0, "failed": 0, "rejected": 0}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, error_class: str = None):
+        with self._lock:
+            self._counts[key] += 1
+            if error_class is not None:
+                self._errors[error_class] = self._errors.get(error_class, 0) + 1
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"{self.name} 已熔断（连续失败 {self.breaker.threshold} 次），"
+                                   f"{self.breaker.cooldown:.0f}s 后重试")
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        """第 attempt 次（从 0 计）失败后的等待时间"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        server_delay = retry_after(exc)
+        if server_delay is not None:
+            delay = max(delay, server_delay)
+        return delay
+
+    def _on_error(self, exc: BaseException, attempt: int, deadline: Optional[float]) -> Optional[float]:
+        """记录失败，返回重试前的等待时间；不应重试时返回 None"""
+        error_class = classify_error(exc)
+        # 服务端问题才计入熔断；客户端错误与解析失败说明服务可达
+        if error_class in BREAKER_ERRORS:
+            self.breaker.record_failure()
+        elif error_class in ("client", "parse"):
+            self.breaker.record_success()
+        else:
+            self.breaker.release()
+        delay = self.backoff(attempt, exc)
+        give_up = (error_class not in RETRYABLE
+                   or attempt + 1 >= self.max_attempts
+                   or (deadline is not None and time.monotonic() + delay >= deadline))
+        if give_up:
+            self._count("failed", error_class)
+            return None
+        self._count("retries", error_class)
+        return delay
+
+    def call(self, fn: Callable[..., Any], *args, deadline: Optional[float] = None, **kwargs) -> Any:
+        """同步调用 fn，按策略重试；deadline 为 time.monotonic() 截止时间点"""
+        self._count("calls")
+        attempt = 0
+        while True:
+            self._check_breaker()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # 取消（对冲请求中落后的一方）或 Ctrl+C
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, make_coro: Callable[[], Awaitable], deadline: Optional[float] = None) -> Any:
+        """异步版本，make_coro 每次调用返回一个新的协程"""
+        self._count("calls")
+        attempt = 0
+        while True:
+            self._check_breaker()
+            try:
+                result = await make_coro()
+            except Exception as e:
+                delay = self._on_error(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # 取消（对冲请求中落后的一方）或 Ctrl+C
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        """调用、重试、最终失败、熔断拒绝次数及各类错误计数"""
+        with self._lock:
+            stats = dict(self._counts)
+            if self._errors:
+                stats["errors"] = dict(self._errors)
+        stats["breaker"] = self.breaker.state
+        return stats
+
+    def reset_stats(self):
+        """清零调用与错误计数（熔断状态反映服务当前状况，保留）"""
+        with self._lock:
+            self._counts = dict.fromkeys(self._counts, 0)
+            self._errors = {}
+
+
+def get_retrier(name: str, **kwargs) -> Retrier:
+    """获取指定端点与重试配置共享的 Retrier，同一端点、同一配置的所有调用共用熔断状态与计数
+
+    配置不同（如参数扫描的不同取值点）时各自独立，不会沿用先创建者的参数。
+    """
+    key = (name, tuple(sorted(kwargs.items())))
+    with _registry_lock:
+        retrier = _registry.get(key)
+        if retrier is None:
+            retrier = Retrier(name, **kwargs)
+            _registry[key] = retrier
+        return retrier
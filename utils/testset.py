@@ -0,0 +1,133 @@
+"""
+测试集流式加载模块
+
+支持两种文件格式，均逐条惰性读取，内存占用与测试集大小无关，读到第一条即可开始处理：
+    - .jsonl: 每行一个 JSON 对象
+    - .json:  顶层为对象数组，按块读取并增量解析数组元素
+字段通过 FieldMapping 映射为 (问题, 标准答案)，默认对应 "问题" / "标准答案"，
+支持 "a.b" 形式的嵌套字段，也可传入任意 callable 作为自定义映射。
+"""
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+_CHUNK_SIZE = 1 << 16
+_decoder = json.JSONDecoder()
+
+
+@dataclass
+class FieldMapping:
+    """测试集记录 -> (问题, 标准答案) 的字段映射"""
+    question: str = "问题"
+    standard_answer: str = "标准答案"
+
+    @staticmethod
+    def _get(record: dict, path: str):
+        value = record
+        for part in path.split("."):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+
+    def __call__(self, record: dict) -> Tuple[str, str]:
+        question = self._get(record, self.question)
+        answer = self._get(record, self.standard_answer)
+        return "" if question is None else str(question), "" if answer is None else str(answer)
+
+
+Mapping = Union[FieldMapping, Callable[[dict], Tuple[str, str]]]
+
+
+def _iter_jsonl(path: Path) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"警告: {path.name} 第 {line_no} 行不是合法 JSON，已跳过: {e}")
+
+
+def _iter_json_array(path: Path) -> Iterator[dict]:
+    """增量解析顶层 JSON 数组，每次只在内存中保留当前块与未解析完的尾部"""
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        started = False
+        eof = False
+        while True:
+            if not eof:
+                chunk = f.read(_CHUNK_SIZE)
+                eof = not chunk
+                buffer += chunk
+            pos = 0
+            while True:
+                # 跳过空白与元素间的逗号
+                while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ",")):
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"{path.name} 顶层不是 JSON 数组")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    item, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    break  # 元素跨块，读取下一块后继续
+                yield item
+                pos = end
+            buffer = buffer[pos:]
+            if eof:
+                if buffer.strip():
+                    raise ValueError(f"{path.name} 不是完整的 JSON 数组")
+                return
+
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """按扩展名流式读取原始记录"""
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        return _iter_jsonl(path)
+    return _iter_json_array(path)
+
+
+def iter_testset(path: Path, mapping: Optional[Mapping] = None) -> Iterator[Tuple[str, str]]:
+    """流式产出 (问题, 标准答案)，跳过空问题"""
+    mapping = mapping or FieldMapping()
+    for record in iter_records(path):
+        if not isinstance(record, dict):
+            continue
+        question, standard_answer = mapping(record)
+        if question:
+            yield question, standard_answer
+
+
+def open_testset(config, test_type: str) -> Iterator[Tuple[str, str]]:
+    """按配置（文件路径、字段映射）流式读取指定类型的测试集"""
+    path = config.get_testset_path(test_type)
+    if not path.exists():
+        raise FileNotFoundError(f"测试集文件不存在: {path}")
+    ts = config.testset
+    return iter_testset(path, ts.mapping or FieldMapping(ts.question_field, ts.answer_field))
+
+
+def iter_chunks(items: Iterator, size: int) -> Iterator[List]:
+    """将迭代器按固定大小分块"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
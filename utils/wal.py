@@ -0,0 +1,198 @@
+"""
+组提交预写日志（Group-Commit WAL）模块
+
+评测进度、方法运行日志等所有需要持久化的逐条记录统一通过 GroupCommitLog 写入：
+文件句柄常驻，记录先进入内存缓冲，每满 N 条或每隔 T 毫秒批量写入并 fsync 一次。
+正常退出、close() 以及 Ctrl+C（KeyboardInterrupt 展开栈 + atexit）时都会刷盘。
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import weakref
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+# 所有打开的日志，用于进程退出时统一刷盘
+_open_logs = weakref.WeakSet()
+_registry: Dict[Path, "GroupCommitLog"] = {}
+_registry_lock = threading.Lock()
+
+
+class GroupCommitLog:
+    """带组提交的追加式 JSONL 日志"""
+
+    def __init__(self, path: Path, flush_every: int = 32, flush_interval_ms: int = 200,
+                 fsync: bool = True):
+        self.path = Path(path)
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = max(flush_interval_ms, 1) / 1000
+        self.fsync = fsync
+
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._file = None
+
+        # 后台定时刷盘线程
+        self._wakeup = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True,
+                                         name=f"wal-{self.path.name}")
+        self._flusher.start()
+        _open_logs.add(self)
+
+    def _ensure_open(self):
+        """延迟打开文件句柄，打开后在日志生命周期内保持
+
+        上次写入中断留下未写完的末行时先补一个换行，使其自成一行被读取方跳过，不会与新记录拼接。
+        """
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            torn = False
+            if self.path.exists() and self.path.stat().st_size:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+            self._file = open(self.path, "a", encoding="utf-8")
+            if torn:
+                self._file.write("\n")
+
+    def _flush_loop(self):
+        """每隔 flush_interval 将缓冲区写盘"""
+        while not self._wakeup.wait(self.flush_interval):
+            self.flush()
+
+    def append(self, record: dict):
+        """追加一条记录，缓冲区满时立即组提交"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"日志已关闭: {self.path}")
+            self._buffer.append(line)
+            if len(self._buffer) >= self.flush_every:
+                self._commit_locked()
+
+    def flush(self):
+        """立即提交缓冲区中的所有记录"""
+        with self._lock:
+            self._commit_locked()
+
+    def _commit_locked(self):
+        """一次 write + 一次 fsync 提交整组记录（调用方需持有锁）"""
+        if not self._buffer:
+            return
+        self._ensure_open()
+        self._file.write("".join(self._buffer))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._buffer.clear()
+
+    def close(self):
+        """刷盘并关闭日志"""
+        self._wakeup.set()
+        with self._lock:
+            if self._closed:
+                return
+            self._commit_locked()
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        with _registry_lock:
+            if _registry.get(self.path) is self:
+                del _registry[self.path]
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def get_log(path: Path, **kwargs) -> GroupCommitLog:
+    """获取指定路径共享的日志实例，同一文件的所有写入者共用一条刷盘通路"""
+    path = Path(path).resolve()
+    with _registry_lock:
+        log = _registry.get(path)
+        if log is None or log.closed:
+            log = GroupCommitLog(path, **kwargs)
+            _registry[path] = log
+        return log
+
+
+def read_log(path: Path) -> Iterator[dict]:
+    """逐行读取 JSONL 日志，跳过损坏或未写完的行"""
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def migrate_pretty_log(path: Path) -> int:
+    """将多行缩进的 JSON 对象序列（早期版本写出的进度文件格式）原地改写为 JSONL，返回转换的记录数
+
+    已是 JSONL 的文件不做改动并返回 0。原文件保留为 <文件名>.pretty；无法解析的残缺片段跳过。
+    """
+    path = Path(path)
+    if not path.exists():
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        if f.readline().strip() != "{":
+            return 0
+        text = "{\n" + f.read()
+
+    decoder = json.JSONDecoder()
+    records, pos = [], 0
+    while True:
+        start = text.find("{", pos)
+        if start < 0:
+            break
+        try:
+            record, pos = decoder.raw_decode(text, start)
+            records.append(record)
+        except json.JSONDecodeError:
+            # 残缺的对象：跳到下一个以 { 开头的行
+            next_line = text.find("\n{", start + 1)
+            if next_line < 0:
+                break
+            pos = next_line + 1
+
+    backup = path.with_name(path.name + ".pretty")
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path, backup)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def log_fingerprint(path: Path, offset: int, window: int = 256) -> str:
+    """日志在字节偏移 offset 处的指纹（偏移之前 window 字节的哈希），用于判断日志是否被改写"""
+    if not offset:
+        return ""
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - window))
+        return hashlib.sha256(f.read(min(offset, window))).hexdigest()[:16]
+
+
+@atexit.register
+def _flush_all():
+    """进程退出（含 Ctrl+C 后的正常退出）时刷盘所有日志"""
+    for log in list(_open_logs):
+        try:
+            log.close()
+        except Exception:
+            pass
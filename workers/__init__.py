@@ -0,0 +1,2 @@
+from .task_queue import TaskQueue
+from .worker import Worker, enqueue_answers, enqueue_judging, merge_results, open_queue, print_status
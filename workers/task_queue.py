@@ -0,0 +1,262 @@
+"""
+基于 SQLite 文件的持久化任务队列
+
+多个 worker 进程（可在多台主机上，共享同一队列文件）从队列中领取任务：
+    - 领取（lease）在 BEGIN IMMEDIATE 事务中完成，同一任务同一时刻只会被一个 worker 持有
+    - 租约有超时，worker 崩溃或失联后任务在租约到期后自动回到可领取状态
+    - 完成时只有仍持有租约的 worker 才能提交结果，过期 worker 的迟到结果会被丢弃
+    - 执行期间由后台线程定期续租（keep_alive），耗时超过租约的任务（如多次退避重试）不会被重复领取
+    - 提交结果与后续任务入队在同一事务中完成；后续任务正被其他 worker 执行时只更新负载，
+      该 worker 提交时发现负载已变化，任务回到待执行状态按新负载重做
+    - 已完成的结果由 merge 步骤合并进标准输出与评测进度文件，合并后标记为 merged；
+      合并期间不持有写锁，多个 worker 之间由带过期时间的合并锁（locks 表）互斥
+
+注意：SQLite 依赖文件锁，多主机共享时须使用支持 POSIX 锁的共享文件系统。
+"""
+import json
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    merged INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, kind, id);
+CREATE TABLE IF NOT EXISTS locks (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+# 任务状态
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+# 等待其他 worker 释放合并锁时的轮询间隔（秒）
+LOCK_POLL_INTERVAL = 0.2
+
+
+@dataclass
+class Task:
+    """一个已领取的任务"""
+    id: int
+    kind: str
+    key: str
+    payload: dict
+    attempts: int
+
+
+def worker_id() -> str:
+    """主机名 + 随机后缀，区分不同主机与进程"""
+    return f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+
+class TaskQueue:
+    """SQLite 任务队列"""
+
+    def __init__(self, path: Path, lease_seconds: float = 300.0, max_attempts: int = 3):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None：事务由 _transaction 显式控制
+        conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=60000")
+        return conn
+
+    @contextmanager
+    def _transaction(self, conn: sqlite3.Connection = None) -> Iterator[sqlite3.Connection]:
+        """写事务：BEGIN IMMEDIATE 立即取得写锁，跨进程互斥"""
+        conn = conn or self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, kind: str, items: Dict[str, dict], condition: str) -> int:
+        """插入新任务，已存在的任务键满足 condition 时以新负载重新入队，返回变更数"""
+        before = conn.total_changes
+        conn.executemany(
+            f"""INSERT INTO tasks (kind, key, payload, updated) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET payload = excluded.payload, status = '{PENDING}',
+                    owner = NULL, lease_expires = NULL, attempts = 0, error = NULL, result = NULL,
+                    merged = 0, updated = excluded.updated {condition}""",
+            [(kind, key, json.dumps(payload, ensure_ascii=False), time.time()) for key, payload in items.items()])
+        return conn.total_changes - before
+
+    def enqueue(self, kind: str, items: Dict[str, dict]) -> int:
+        """批量入队 {任务键: 负载}，返回新入队或重新入队的数量
+
+        已存在的任务键：失败的、或已完成且已合并的任务重新入队（调用方只会为输出中缺失的条目入队），
+        待执行、执行中与待合并的任务保持不变。
+        """
+        with self._transaction() as conn:
+            return self._upsert(conn, kind, items, f"WHERE tasks.status = '{FAILED}' "
+                                                   f"OR (tasks.status = '{DONE}' AND tasks.merged = 1)")
+
+    def lease(self, owner: str, kinds: Optional[List[str]] = None, limit: int = 1) -> List[Task]:
+        """领取至多 limit 个可执行任务（待执行或租约已过期）"""
+        now = time.time()
+        kinds = kinds or []
+        kind_filter = f"AND kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"""SELECT id, kind, key, payload, attempts FROM tasks
+                    WHERE (status = ? OR (status = ? AND lease_expires < ?)) {kind_filter}
+                    ORDER BY id LIMIT ?""",
+                (PENDING, LEASED, now, *kinds, limit)).fetchall()
+            tasks = []
+            for task_id, kind, key, payload, attempts in rows:
+                conn.execute("UPDATE tasks SET status = ?, owner = ?, lease_expires = ?, attempts = ?, updated = ? "
+                             "WHERE id = ?", (LEASED, owner, now + self.lease_seconds, attempts + 1, now, task_id))
+                tasks.append(Task(task_id, kind, key, json.loads(payload), attempts + 1))
+        return tasks
+
+    def complete(self, task: Task, owner: str, result: dict,
+                 follow_up: Optional[Dict[str, Dict[str, dict]]] = None) -> bool:
+        """提交结果，并在同一事务中入队后续任务；follow_up 为 {kind: {任务键: 负载}}
+
+        后续任务（如新回答的评分）以新负载重新入队；正被其他 worker 执行的只更新负载，不抢占租约。
+        租约已被其他 worker 接手时返回 False，结果丢弃；执行期间负载被更新（输入已过期）时
+        任务回到待执行状态并返回 False。
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = ?, result = ?, error = NULL, merged = 0, lease_expires = NULL, "
+                "updated = ? WHERE id = ? AND owner = ? AND status = ? AND payload = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), now, task.id, owner, LEASED,
+                 json.dumps(task.payload, ensure_ascii=False)))
+            if cursor.rowcount == 0:
+                conn.execute("UPDATE tasks SET status = ?, owner = NULL, lease_expires = NULL, attempts = 0, "
+                             "updated = ? WHERE id = ? AND owner = ? AND status = ?",
+                             (PENDING, now, task.id, owner, LEASED))
+                return False
+            for kind, items in (follow_up or {}).items():
+                self._upsert(conn, kind, items, f"WHERE tasks.status != '{LEASED}'")
+                conn.executemany(
+                    "UPDATE tasks SET payload = ?, updated = ? WHERE key = ? AND status = ?",
+                    [(json.dumps(payload, ensure_ascii=False), now, key, LEASED) for key, payload in items.items()])
+        return True
+
+    def fail(self, task: Task, owner: str, error: str) -> bool:
+        """记录失败：未达到最大尝试次数时放回队列，否则标记为 failed，返回是否最终失败"""
+        status = FAILED if task.attempts >= self.max_attempts else PENDING
+        with self._transaction() as conn:
+            conn.execute("UPDATE tasks SET status = ?, error = ?, owner = NULL, lease_expires = NULL, updated = ? "
+                         "WHERE id = ? AND owner = ? AND status = ?",
+                         (status, error, time.time(), task.id, owner, LEASED))
+        return status == FAILED
+
+    def extend(self, task: Task, owner: str, conn: sqlite3.Connection = None) -> bool:
+        """续租，返回是否仍持有租约"""
+        with self._transaction(conn) as conn:
+            cursor = conn.execute("UPDATE tasks SET lease_expires = ? WHERE id = ? AND owner = ? AND status = ?",
+                                  (time.time() + self.lease_seconds, task.id, owner, LEASED))
+            return cursor.rowcount > 0
+
+    @contextmanager
+    def keep_alive(self, task: Task, owner: str, interval: Optional[float] = None):
+        """执行任务期间由后台线程每隔 interval（默认租约时长的 1/3）续租一次
+
+        后台线程使用独立的连接（SQLite 连接不能跨线程共享），租约丢失后停止续租。
+        """
+        interval = interval or self.lease_seconds / 3
+        stop = threading.Event()
+
+        def renew():
+            conn = self._connect()
+            try:
+                while not stop.wait(interval):
+                    if not self.extend(task, owner, conn):
+                        break
+            finally:
+                conn.close()
+
+        thread = threading.Thread(target=renew, daemon=True, name=f"lease-{task.id}")
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _acquire_lock(self, name: str, owner: str):
+        """取得命名锁（持有者崩溃时锁在租约时长后过期），被占用时轮询等待"""
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    """INSERT INTO locks (name, owner, expires) VALUES (?, ?, ?)
+                       ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+                       WHERE locks.expires < ?""",
+                    (name, owner, now + self.lease_seconds, now))
+                if cursor.rowcount > 0:
+                    return
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    @contextmanager
+    def merging(self, kind: str) -> Iterator[List[tuple]]:
+        """取出已完成未合并的 (任务键, 负载, 结果)，块正常结束后标记为已合并
+
+        读取与标记各在一个短事务中完成，合并（改写输出文件等）期间不持有写锁，
+        其他 worker 可照常领取与提交任务；多个 worker 同时合并时由合并锁依次进行，
+        输出文件不会被并发改写。合并期间结果被重新提交的任务不标记，留待下次合并。
+        """
+        owner = worker_id()
+        lock = f"merge:{kind}"
+        self._acquire_lock(lock, owner)
+        try:
+            rows = self._conn.execute("SELECT id, key, payload, result FROM tasks WHERE kind = ? AND status = ? "
+                                      "AND merged = 0 ORDER BY id", (kind, DONE)).fetchall()
+            yield [(key, json.loads(payload), json.loads(result)) for _, key, payload, result in rows]
+            with self._transaction() as conn:
+                conn.executemany("UPDATE tasks SET merged = 1 WHERE id = ? AND status = ? AND result = ?",
+                                 [(task_id, DONE, result) for task_id, _, _, result in rows])
+        finally:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (lock, owner))
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """各类任务按状态计数"""
+        counts: Dict[str, Dict[str, int]] = {}
+        for kind, status, n in self._conn.execute("SELECT kind, status, COUNT(*) FROM tasks GROUP BY kind, status"):
+            counts.setdefault(kind, {})[status] = n
+        return counts
+
+    def has_work(self, kinds: Optional[List[str]] = None) -> bool:
+        """是否还有待执行或执行中的任务"""
+        kinds = kinds or []
+        kind_filter = f"AND kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+        row = self._conn.execute(f"SELECT 1 FROM tasks WHERE status IN (?, ?) {kind_filter} LIMIT 1",
+                                 (PENDING, LEASED, *kinds)).fetchone()
+        return row is not None
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,268 @@
+"""
+多 worker 分片运行（main.py worker）
+
+任务分两类，均存放在共享的 SQLite 任务队列中：
+    - answer: (方法, 测试集, 问题) -> 生成回答与上下文；完成后可自动追加对应的 judge 任务
+    - judge:  (方法, 测试集, 回答记录) -> 评分记录（本地自动评分 / 评分缓存 / LLM Judge）
+任意数量的 worker 进程并行领取任务，吞吐随 worker 数量线性扩展。
+完成的结果由 merge_results 合并进标准输出文件（results/*_output_*.json）与评测进度文件，
+后续的 evaluate / plot 无需任何改动。
+"""
+import json
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from utils import load_results, open_testset, save_results
+from .task_queue import Task, TaskQueue, worker_id
+
+ANSWER, JUDGE = "answer", "judge"
+KINDS = (ANSWER, JUDGE)
+
+
+def open_queue(config: Config) -> TaskQueue:
+    """按配置打开共享任务队列"""
+    return TaskQueue(config.paths.queue_file, lease_seconds=config.worker.lease_seconds,
+                     max_attempts=config.worker.max_attempts)
+
+
+def _task_key(kind: str, method: str, test_type: str, question: str) -> str:
+    return json.dumps([kind, method, test_type, question], ensure_ascii=False)
+
+
+def _load_results(config: Config, path: Path, resolve: bool = True) -> list:
+    if not path.exists():
+        return []
+    return load_results(config, path, resolve)
+
+
+def _judge_payload(method: str, test_type: str, record: dict) -> Dict[str, dict]:
+    return {_task_key(JUDGE, method, test_type, record["question"]):
+            {"method": method, "test_type": test_type, "item": record}}
+
+
+def enqueue_answers(config: Config, queue: TaskQueue, methods: List[str], test_types: List[str],
+                    judge: bool = False) -> int:
+    """为输出文件中尚未成功回答的问题创建 answer 任务"""
+    from methods import ERROR_ANSWER
+
+    total = 0
+    for method in methods:
+        for test_type in test_types:
+            try:
+                testset = open_testset(config, test_type)
+            except FileNotFoundError as e:
+                print(f"跳过: {e}")
+                continue
+            answered = {r["question"] for r in _load_results(config, config.get_output_path(method, test_type), resolve=False)
+                        if r.get("answer") != ERROR_ANSWER}
+            items = {}
+            for question, standard_answer in testset:
+                if question not in answered:
+                    items[_task_key(ANSWER, method, test_type, question)] = {
+                        "method": method, "test_type": test_type, "question": question,
+                        "standard_answer": standard_answer, "judge": judge,
+                    }
+            count = queue.enqueue(ANSWER, items)
+            total += count
+            print(f"{method} - {test_type}: 新增 {count} 个 answer 任务")
+    return total
+
+
+def enqueue_judging(config: Config, queue: TaskQueue, methods: List[str], test_types: List[str]) -> int:
+    """为已有输出中待评分（新增或评分输入发生变化）的记录创建 judge 任务"""
+    from evaluation.evaluator import Evaluator
+
+    evaluator = Evaluator(config)
+    _, processed_keys = evaluator.load_progress()
+    total = 0
+    for method in methods:
+        for test_type in test_types:
+            data = _load_results(config, config.get_output_path(method, test_type))
+            pending, _ = evaluator.select_pending(method, test_type, data, processed_keys)
+            items = {}
+            for record in pending:
+                items.update(_judge_payload(method, test_type, record))
+            count = queue.enqueue(JUDGE, items)
+            total += count
+            print(f"{method} - {test_type}: 新增 {count} 个 judge 任务")
+    return total
+
+
+class Worker:
+    """从队列领取并执行任务的 worker"""
+
+    def __init__(self, config: Config, queue: TaskQueue, kinds: Optional[List[str]] = None):
+        self.config = config
+        self.queue = queue
+        self.kinds = list(kinds or KINDS)
+        self.owner = worker_id()
+        self.counts = defaultdict(int)
+        self._methods = {}
+        self._evaluator = None
+
+    def _method(self, name: str):
+        """每个方法在 worker 内只初始化一次"""
+        if name not in self._methods:
+            from methods import get_method
+            self._methods[name] = get_method(name, self.config)
+        return self._methods[name]
+
+    def _get_evaluator(self):
+        if self._evaluator is None:
+            from evaluation.evaluator import Evaluator
+            self._evaluator = Evaluator(self.config)
+            # 载入评分缓存，其他 worker 已评过的相同输入直接复用；
+            # 旧版记录的缓存键已在 enqueue_judging 时补写一次，各 worker 不再重复补写
+            self._evaluator.load_progress(backfill=False)
+        return self._evaluator
+
+    def _answer(self, task: Task) -> Tuple[dict, Optional[dict]]:
+        payload = task.payload
+        method = self._method(payload["method"])
+        answer, contexts = method.answer_with_contexts(payload["question"],
+                                                       self.config.get_max_chars(payload["test_type"]))
+        return self._answer_record(task, answer, contexts)
+
+    def _answer_record(self, task: Task, answer: str, contexts: List[str]) -> Tuple[dict, Optional[dict]]:
+        from methods import TestRecord
+
+        payload = task.payload
+        record = TestRecord(question=payload["question"], answer=answer,
+                            standard_answer=payload["standard_answer"], contexts=contexts).to_dict()
+        follow_up = None
+        if payload.get("judge"):
+            follow_up = {JUDGE: _judge_payload(payload["method"], payload["test_type"], record)}
+        return record, follow_up
+
+    def _judge(self, task: Task) -> Tuple[dict, Optional[dict]]:
+        from evaluation.evaluator import is_failed
+        from evaluation.local_metrics import compute_local_metrics, metrics_for_row
+
+        evaluator = self._get_evaluator()
+        payload = task.payload
+        item = payload["item"]
+        judge_key = evaluator.judge_key_for(item)
+        metrics = (metrics_for_row(compute_local_metrics([item]), 0)
+                   if self.config.local_metrics.enabled else {})
+        record, source = evaluator.score_item(payload["method"], payload["test_type"], item, judge_key, metrics)
+        if is_failed(record):
+            # 评分调用失败：交回队列，由本 worker 或其他 worker 稍后重试
+            raise RuntimeError(record.get("Reason") or "LLM Judge 调用失败")
+        if record["Method"] == "LLM_Judge":
+            evaluator.judge_cache[judge_key] = record
+        self.counts[f"judge_{source}"] += 1
+        return record, None
+
+    def _fallback(self, task: Task, error: Exception) -> Tuple[dict, Optional[dict]]:
+        """达到最大尝试次数后的结果，与单进程运行的行为一致"""
+        if task.kind == ANSWER:
+            from methods import ERROR_ANSWER
+            return self._answer_record(task, ERROR_ANSWER, [])
+        # 评分失败的记录（三项为 0）照常写入进度，下次评测时会重新评分
+        evaluator = self._get_evaluator()
+        item = task.payload["item"]
+        record = evaluator.build_record(task.payload["method"], task.payload["test_type"], item, "LLM_Judge",
+                                        evaluator.error_result(f"Error: {error}"), evaluator.judge_key_for(item), {})
+        return record, None
+
+    def run_task(self, task: Task):
+        handler = self._answer if task.kind == ANSWER else self._judge
+        try:
+            # 执行期间定期续租，退避重试等耗时超过租约时任务不会被其他 worker 重复领取
+            with self.queue.keep_alive(task, self.owner):
+                result, follow_up = handler(task)
+        except Exception as e:
+            if task.attempts < self.queue.max_attempts:
+                self.queue.fail(task, self.owner, str(e))
+                self.counts["retried"] += 1
+                print(f"[{task.kind}] 失败，已交回队列（第 {task.attempts} 次）: {e}")
+                return
+            result, follow_up = self._fallback(task, e)
+            self.counts["failed"] += 1
+            print(f"[{task.kind}] 达到最大尝试次数，记为失败: {e}")
+        if self.queue.complete(task, self.owner, result, follow_up):
+            self.counts[task.kind] += 1
+        else:
+            self.counts["lease_lost"] += 1
+
+    def run(self, exit_when_idle: bool = True, merge: bool = True) -> dict:
+        """循环领取任务；队列中没有待执行与执行中的任务时退出（exit_when_idle=False 则持续等待）"""
+        print(f"worker {self.owner} 已启动，任务类型: {self.kinds}，队列: {self.queue.path}")
+        try:
+            while True:
+                tasks = self.queue.lease(self.owner, self.kinds, limit=1)
+                if tasks:
+                    self.run_task(tasks[0])
+                    continue
+                if exit_when_idle and not self.queue.has_work(self.kinds):
+                    break
+                # 其他 worker 仍持有租约（可能很快产生新的 judge 任务）或等待新任务入队
+                time.sleep(self.config.worker.poll_interval)
+        finally:
+            if merge:
+                merge_results(self.config, self.queue)
+        print(f"worker {self.owner} 结束: {dict(self.counts)}")
+        if self._evaluator is not None:
+            self._evaluator.print_usage()
+        return dict(self.counts)
+
+
+def merge_results(config: Config, queue: TaskQueue) -> Tuple[int, int]:
+    """将已完成未合并的结果并入标准输出文件与评测进度文件，返回 (回答数, 评分数)"""
+    with queue.merging(ANSWER) as rows:
+        groups = defaultdict(dict)
+        for _, payload, record in rows:
+            groups[(payload["method"], payload["test_type"])][record["question"]] = record
+        for (method, test_type), records in groups.items():
+            output_path = config.get_output_path(method, test_type)
+            merged = {r["question"]: r for r in _load_results(config, output_path, resolve=False)}
+            merged.update(records)
+            # 按测试集原顺序整理结果
+            ordered = []
+            try:
+                for question, _ in open_testset(config, test_type):
+                    if question in merged:
+                        ordered.append(merged.pop(question))
+            except FileNotFoundError:
+                pass
+            save_results(config, output_path, ordered + list(merged.values()))
+        answers = len(rows)
+
+    with queue.merging(JUDGE) as rows:
+        if rows:
+            from evaluation.aggregates import load_aggregates
+            from evaluation.evaluator import read_progress
+            from evaluation.score_table import ScoreTable
+            from utils import get_log
+
+            progress_file = config.paths.output_dir / "evaluation_progress.jsonl"
+            log = get_log(progress_file, **config.persist.log_kwargs())
+            for _, _, record in rows:
+                log.append(record)
+            log.close()
+            latest, _ = read_progress(progress_file)
+            score_table = ScoreTable(config.paths.output_dir / "scores")
+            score_table.rebuild(list(latest.values()))
+            score_table.mark_synced(progress_file)
+            load_aggregates(config, save=True)
+        judged = len(rows)
+
+    if answers or judged:
+        print(f"已合并 {answers} 条回答、{judged} 条评分记录")
+    return answers, judged
+
+
+def print_status(queue: TaskQueue):
+    """打印队列中各类任务的状态计数"""
+    counts = queue.counts()
+    if not counts:
+        print(f"队列为空: {queue.path}")
+        return
+    print(f"任务队列: {queue.path}")
+    for kind, by_status in sorted(counts.items()):
+        print(f"  - {kind}: " + ", ".join(f"{status}={n}" for status, n in sorted(by_status.items())))